@@ -1,15 +1,19 @@
 import re
+import threading
 from collections import namedtuple
 from dataclasses import asdict, dataclass, field
 from datetime import datetime
-from typing import Any, List, Mapping, NamedTuple, Sequence, Set, Tuple, Union
+from functools import lru_cache
+from typing import Any, Hashable, List, Mapping, NamedTuple, Sequence, Set, Tuple, Union
 
+from cachetools import LRUCache
 from django.utils.functional import cached_property
 from parsimonious.exceptions import IncompleteParseError
 from parsimonious.expressions import Optional
 from parsimonious.grammar import Grammar, NodeVisitor
 from parsimonious.nodes import Node
 
+from sentry import options
 from sentry.search.events.constants import (
     DURATION_UNITS,
     OPERATOR_NEGATION_MAP,
@@ -31,6 +35,7 @@ from sentry.search.utils import (
     parse_percentage,
     parse_size,
 )
+from sentry.utils import metrics
 from sentry.utils.snuba import (
     Dataset,
     is_duration_measurement,
@@ -292,9 +297,8 @@ def is_negated(node):
     return node.text == "!"
 
 
-def handle_negation(negation, operator):
-    operator = get_operator_value(operator)
-    if is_negated(negation):
+def negate_operator(negated, operator):
+    if negated:
         return OPERATOR_NEGATION_MAP.get(operator, "!=")
     return operator
 
@@ -486,6 +490,8 @@ class SearchVisitor(NodeVisitor):
             config = SearchConfig()
         self.config = config
         self.params = params if params is not None else {}
+        # Set once a relative date has been resolved against the current time.
+        self.is_time_relative = False
         if builder is None:
             # Avoid circular import
             from sentry.search.events.builder import UnresolvedQuery
@@ -542,34 +548,83 @@ class SearchVisitor(NodeVisitor):
         return flatten(remove_space(children[0]))
 
     def visit_boolean_operator(self, node, children):
+        return self.boolean_operator(children[0])
+
+    def visit_free_text_unquoted(self, node, children):
+        return node.text.strip(" ") or None
+
+    def visit_free_text(self, node, children):
+        return self.free_text(children[0])
+
+    def visit_paren_group(self, node, children):
+        children = remove_space(remove_optional_nodes(flatten(children)))
+        return self.paren_group(node.text, flatten(children[1]))
+
+    # The methods below implement the search semantics on top of the parts of
+    # a parsed query as plain values. They are shared by the ``visit_`` methods
+    # of the grammar and by the parser in ``sentry.api.event_search_parser``.
+
+    def boolean_operator(self, operator):
         if not self.config.allow_boolean:
             raise InvalidSearchQuery(
                 'Boolean statements containing "OR" or "AND" are not supported in this search'
             )
 
-        return children[0]
-
-    def visit_free_text_unquoted(self, node, children):
-        return node.text.strip(" ") or None
+        return operator
 
-    def visit_free_text(self, node, children):
-        if not children[0]:
+    def free_text(self, value):
+        if not value:
             return None
-        return SearchFilter(SearchKey(self.config.free_text_key), "=", SearchValue(children[0]))
+        return SearchFilter(SearchKey(self.config.free_text_key), "=", SearchValue(value))
 
-    def visit_paren_group(self, node, children):
+    def paren_group(self, text, children):
         if not self.config.allow_boolean:
             # It's possible to have a valid search that includes parens, so we
             # can't just error out when we find a paren expression.
-            return SearchFilter(SearchKey(self.config.free_text_key), "=", SearchValue(node.text))
+            return SearchFilter(SearchKey(self.config.free_text_key), "=", SearchValue(text))
 
-        children = remove_space(remove_optional_nodes(flatten(children)))
-        children = flatten(children[1])
         if len(children) == 0:
-            return node.text
+            return text
 
         return ParenExpression(children)
 
+    def search_key(self, key):
+        if (
+            self.config.allowed_keys
+            and key not in self.config.allowed_keys
+            or key in self.config.blocked_keys
+        ):
+            raise InvalidSearchQuery(f"Invalid key for this search: {key}")
+        return SearchKey(self.key_mappings_lookup.get(key, key))
+
+    def explicit_tag_key(self, search_key):
+        return SearchKey(f"tags[{search_key.name}]")
+
+    def aggregate_key(self, function_name, args):
+        key = f"{function_name}({', '.join(args)})"
+        return AggregateKey(self.key_mappings_lookup.get(key, key))
+
+    def value(self, text):
+        # A properly quoted value will match the quoted value regex, so any unescaped
+        # quotes are errors.
+        value = text
+        idx = value.find('"')
+        if idx == 0:
+            raise InvalidSearchQuery(
+                f"Invalid quote at '{text}': quotes must enclose text or be escaped."
+            )
+
+        while idx != -1:
+            if value[idx - 1] != "\\":
+                raise InvalidSearchQuery(
+                    f"Invalid quote at '{text}': quotes must enclose text or be escaped."
+                )
+
+            value = value[idx + 1 :]
+            idx = value.find('"')
+
+        return text.replace('\\"', '"')
+
     # --- Start of filter visitors
 
     def _handle_basic_filter(self, search_key, operator, search_value):
@@ -591,8 +646,6 @@ class SearchVisitor(NodeVisitor):
         return SearchFilter(search_key, operator, search_value)
 
     def _handle_numeric_filter(self, search_key, operator, search_value):
-        operator = get_operator_value(operator)
-
         if self.is_numeric_key(search_key.name):
             try:
                 search_value = SearchValue(parse_numeric_value(*search_value))
@@ -604,7 +657,9 @@ class SearchVisitor(NodeVisitor):
 
     def visit_date_filter(self, node, children):
         (search_key, _, operator, search_value) = children
+        return self.date_filter(search_key, operator, search_value)
 
+    def date_filter(self, search_key, operator, search_value):
         if self.is_date_key(search_key.name):
             try:
                 search_value = parse_datetime_string(search_value)
@@ -616,11 +671,13 @@ class SearchVisitor(NodeVisitor):
         return self._handle_basic_filter(search_key, "=", SearchValue(search_value))
 
     def visit_specific_date_filter(self, node, children):
+        (search_key, _, date_value) = children
+        return self.specific_date_filter(search_key, date_value)
+
+    def specific_date_filter(self, search_key, date_value):
         # If we specify a specific date, it means any event on that day, and if
         # we specify a specific datetime then it means a few minutes interval
         # on either side of that datetime
-        (search_key, _, date_value) = children
-
         if not self.is_date_key(search_key.name):
             return self._handle_basic_filter(search_key, "=", SearchValue(date_value))
 
@@ -640,12 +697,15 @@ class SearchVisitor(NodeVisitor):
 
     def visit_rel_date_filter(self, node, children):
         (search_key, _, value) = children
+        return self.rel_date_filter(search_key, value.text)
 
+    def rel_date_filter(self, search_key, value):
         if self.is_date_key(search_key.name):
             try:
-                from_val, to_val = parse_datetime_range(value.text)
+                from_val, to_val = parse_datetime_range(value)
             except InvalidQuery as exc:
                 raise InvalidSearchQuery(str(exc))
+            self.is_time_relative = True
 
             # TODO: Handle negations
             if from_val is not None:
@@ -656,14 +716,17 @@ class SearchVisitor(NodeVisitor):
                 search_value = to_val[0]
             return SearchFilter(search_key, operator, SearchValue(search_value))
 
-        return self._handle_basic_filter(search_key, "=", SearchValue(value.text))
+        return self._handle_basic_filter(search_key, "=", SearchValue(value))
 
     def visit_duration_filter(self, node, children):
         (negation, search_key, _, operator, search_value) = children
+        return self.duration_filter(
+            is_negated(negation), search_key, get_operator_value(operator), search_value
+        )
+
+    def duration_filter(self, negated, search_key, operator, search_value):
         if self.is_duration_key(search_key.name) or self.is_numeric_key(search_key.name):
-            operator = handle_negation(negation, operator)
-        else:
-            operator = get_operator_value(operator)
+            operator = negate_operator(negated, operator)
         if self.is_duration_key(search_key.name):
             try:
                 search_value = parse_duration(*search_value)
@@ -677,16 +740,19 @@ class SearchVisitor(NodeVisitor):
 
         search_value = "".join(search_value)
         search_value = operator + search_value if operator not in ("=", "!=") else search_value
-        operator = "!=" if is_negated(negation) else "="
+        operator = "!=" if negated else "="
         return self._handle_basic_filter(search_key, operator, SearchValue(search_value))
 
     def visit_size_filter(self, node, children):
         (negation, search_key, _, operator, search_value) = children
+        return self.size_filter(
+            is_negated(negation), search_key, get_operator_value(operator), search_value
+        )
+
+    def size_filter(self, negated, search_key, operator, search_value):
         # The only size keys we have are custom measurements right now
         if self.is_size_key(search_key.name):
-            operator = handle_negation(negation, operator)
-        else:
-            operator = get_operator_value(operator)
+            operator = negate_operator(negated, operator)
 
         if self.is_size_key(search_key.name):
             try:
@@ -697,34 +763,36 @@ class SearchVisitor(NodeVisitor):
 
         search_value = "".join(search_value)
         search_value = operator + search_value if operator not in ("=", "!=") else search_value
-        operator = "!=" if is_negated(negation) else "="
+        operator = "!=" if negated else "="
         return self._handle_basic_filter(search_key, operator, SearchValue(search_value))
 
     def visit_boolean_filter(self, node, children):
         (negation, search_key, sep, search_value) = children
-        negated = is_negated(negation)
+        return self.boolean_filter(is_negated(negation), search_key, search_value.text)
 
+    def boolean_filter(self, negated, search_key, value):
         # Numeric and boolean filters overlap on 1 and 0 values.
         if self.is_numeric_key(search_key.name):
-            return self._handle_numeric_filter(
-                search_key, "!=" if negated else "=", [search_value.text, ""]
-            )
+            return self._handle_numeric_filter(search_key, "!=" if negated else "=", [value, ""])
 
         if self.is_boolean_key(search_key.name):
-            if search_value.text.lower() in ("true", "1"):
+            if value.lower() in ("true", "1"):
                 search_value = SearchValue(0 if negated else 1)
-            elif search_value.text.lower() in ("false", "0"):
+            elif value.lower() in ("false", "0"):
                 search_value = SearchValue(1 if negated else 0)
             else:
                 raise InvalidSearchQuery(f"Invalid boolean field: {search_key}")
             return SearchFilter(search_key, "=", search_value)
 
-        search_value = SearchValue(search_value.text)
+        search_value = SearchValue(value)
         return self._handle_basic_filter(search_key, "=" if not negated else "!=", search_value)
 
     def visit_numeric_in_filter(self, node, children):
         (negation, search_key, _, search_value) = children
-        operator = handle_negation(negation, "IN")
+        return self.numeric_in_filter(is_negated(negation), search_key, search_value)
+
+    def numeric_in_filter(self, negated, search_key, search_value):
+        operator = negate_operator(negated, "IN")
 
         if self.is_numeric_key(search_key.name):
             try:
@@ -738,13 +806,16 @@ class SearchVisitor(NodeVisitor):
 
     def visit_numeric_filter(self, node, children):
         (negation, search_key, _, operator, search_value) = children
+        return self.numeric_filter(
+            is_negated(negation), search_key, get_operator_value(operator), search_value
+        )
+
+    def numeric_filter(self, negated, search_key, operator, search_value):
         if (
             self.is_numeric_key(search_key.name)
             or search_key.name in self.config.text_operator_keys
         ):
-            operator = handle_negation(negation, operator)
-        else:
-            operator = get_operator_value(operator)
+            operator = negate_operator(negated, operator)
 
         if self.is_numeric_key(search_key.name):
             return self._handle_numeric_filter(search_key, operator, search_value)
@@ -754,12 +825,17 @@ class SearchVisitor(NodeVisitor):
             search_value = search_value._replace(raw_value=f"{operator}{search_value.raw_value}")
 
         if search_key.name not in self.config.text_operator_keys:
-            operator = "!=" if is_negated(negation) else "="
+            operator = "!=" if negated else "="
         return self._handle_basic_filter(search_key, operator, search_value)
 
     def visit_aggregate_duration_filter(self, node, children):
         (negation, search_key, _, operator, search_value) = children
-        operator = handle_negation(negation, operator)
+        return self.aggregate_duration_filter(
+            is_negated(negation), search_key, get_operator_value(operator), search_value
+        )
+
+    def aggregate_duration_filter(self, negated, search_key, operator, search_value):
+        operator = negate_operator(negated, operator)
 
         try:
             # Even if the search value matches duration format, only act as
@@ -785,7 +861,12 @@ class SearchVisitor(NodeVisitor):
 
     def visit_aggregate_size_filter(self, node, children):
         (negation, search_key, _, operator, search_value) = children
-        operator = handle_negation(negation, operator)
+        return self.aggregate_size_filter(
+            is_negated(negation), search_key, get_operator_value(operator), search_value
+        )
+
+    def aggregate_size_filter(self, negated, search_key, operator, search_value):
+        operator = negate_operator(negated, operator)
 
         try:
             aggregate_value = parse_size(*search_value)
@@ -798,7 +879,12 @@ class SearchVisitor(NodeVisitor):
 
     def visit_aggregate_percentage_filter(self, node, children):
         (negation, search_key, _, operator, search_value) = children
-        operator = handle_negation(negation, operator)
+        return self.aggregate_percentage_filter(
+            is_negated(negation), search_key, get_operator_value(operator), search_value
+        )
+
+    def aggregate_percentage_filter(self, negated, search_key, operator, search_value):
+        operator = negate_operator(negated, operator)
 
         aggregate_value = None
 
@@ -822,7 +908,12 @@ class SearchVisitor(NodeVisitor):
 
     def visit_aggregate_numeric_filter(self, node, children):
         (negation, search_key, _, operator, search_value) = children
-        operator = handle_negation(negation, operator)
+        return self.aggregate_numeric_filter(
+            is_negated(negation), search_key, get_operator_value(operator), search_value
+        )
+
+    def aggregate_numeric_filter(self, negated, search_key, operator, search_value):
+        operator = negate_operator(negated, operator)
 
         try:
             aggregate_value = parse_numeric_value(*search_value)
@@ -833,7 +924,12 @@ class SearchVisitor(NodeVisitor):
 
     def visit_aggregate_date_filter(self, node, children):
         (negation, search_key, _, operator, search_value) = children
-        operator = handle_negation(negation, operator)
+        return self.aggregate_date_filter(
+            is_negated(negation), search_key, get_operator_value(operator), search_value
+        )
+
+    def aggregate_date_filter(self, negated, search_key, operator, search_value):
+        operator = negate_operator(negated, operator)
         is_date_aggregate = any(key in search_key.name for key in self.config.date_keys)
         if is_date_aggregate:
             try:
@@ -848,13 +944,19 @@ class SearchVisitor(NodeVisitor):
 
     def visit_aggregate_rel_date_filter(self, node, children):
         (negation, search_key, _, operator, search_value) = children
-        operator = handle_negation(negation, operator)
+        return self.aggregate_rel_date_filter(
+            is_negated(negation), search_key, get_operator_value(operator), search_value.text
+        )
+
+    def aggregate_rel_date_filter(self, negated, search_key, operator, search_value):
+        operator = negate_operator(negated, operator)
         is_date_aggregate = any(key in search_key.name for key in self.config.date_keys)
         if is_date_aggregate:
             try:
-                from_val, to_val = parse_datetime_range(search_value.text)
+                from_val, to_val = parse_datetime_range(search_value)
             except InvalidQuery as exc:
                 raise InvalidSearchQuery(str(exc))
+            self.is_time_relative = True
 
             if from_val is not None:
                 operator = ">="
@@ -866,25 +968,29 @@ class SearchVisitor(NodeVisitor):
             return AggregateFilter(search_key, operator, SearchValue(search_value))
 
         # Invalid formats fall back to text match
-        search_value = operator + search_value.text if operator != "=" else search_value
+        search_value = operator + search_value if operator != "=" else search_value
         return AggregateFilter(search_key, "=", SearchValue(search_value))
 
     def visit_has_filter(self, node, children):
         # the key is has here, which we don't need
         negation, _, _, _, (search_key,) = children
+        return self.has_filter(is_negated(negation), search_key)
 
+    def has_filter(self, negated, search_key):
         # if it matched search value instead, it's not a valid key
         if isinstance(search_key, SearchValue):
             raise InvalidSearchQuery(
                 'Invalid format for "has" search: was expecting a field or tag instead'
             )
 
-        operator = "=" if is_negated(negation) else "!="
+        operator = "=" if negated else "!="
         return SearchFilter(search_key, operator, SearchValue(""))
 
     def visit_is_filter(self, node, children):
         negation, _, _, _, search_value = children
+        return self.is_filter(is_negated(negation), search_value)
 
+    def is_filter(self, negated, search_value):
         translators = self.config.is_filter_translation
 
         if not translators:
@@ -901,7 +1007,7 @@ class SearchVisitor(NodeVisitor):
 
         search_key, search_value = translators[search_value.raw_value]
 
-        operator = "!=" if is_negated(negation) else "="
+        operator = "!=" if negated else "="
         search_key = SearchKey(search_key)
         search_value = SearchValue(search_value)
 
@@ -909,20 +1015,26 @@ class SearchVisitor(NodeVisitor):
 
     def visit_text_in_filter(self, node, children):
         (negation, search_key, _, search_value) = children
-        operator = "IN"
-        search_value = SearchValue(search_value)
-
-        operator = handle_negation(negation, operator)
+        return self.text_in_filter(is_negated(negation), search_key, search_value)
 
-        return self._handle_basic_filter(search_key, operator, search_value)
+    def text_in_filter(self, negated, search_key, search_value):
+        operator = negate_operator(negated, "IN")
+        return self._handle_basic_filter(search_key, operator, SearchValue(search_value))
 
     def visit_text_filter(self, node, children):
         (negation, search_key, _, operator, search_value) = children
-        operator = get_operator_value(operator)
+        return self.text_filter(
+            is_negated(negation),
+            search_key,
+            get_operator_value(operator),
+            search_value,
+            node.children[4].text,
+        )
 
-        # XXX: We check whether the text in the node itself is actually empty, so
+    def text_filter(self, negated, search_key, operator, search_value, value_text):
+        # XXX: We check whether the text of the value itself is actually empty, so
         # we can tell the difference between an empty quoted string and no string
-        if not search_value.raw_value and not node.children[4].text:
+        if not search_value.raw_value and not value_text:
             raise InvalidSearchQuery(f"Empty string after '{search_key.name}:'")
 
         if operator not in ("=", "!=") and search_key.name not in self.config.text_operator_keys:
@@ -931,7 +1043,7 @@ class SearchVisitor(NodeVisitor):
             search_value = search_value._replace(raw_value=f"{operator}{search_value.raw_value}")
             operator = "="
 
-        operator = handle_negation(negation, operator)
+        operator = negate_operator(negated, operator)
 
         return self._handle_text_filter(search_key, operator, search_value)
 
@@ -952,7 +1064,7 @@ class SearchVisitor(NodeVisitor):
         return children[1].text
 
     def visit_explicit_tag_key(self, node, children):
-        return SearchKey(f"tags[{children[2].name}]")
+        return self.explicit_tag_key(children[2])
 
     def visit_aggregate_key(self, node, children):
         children = remove_optional_nodes(children)
@@ -960,13 +1072,12 @@ class SearchVisitor(NodeVisitor):
 
         if len(children) == 3:
             (function_name, open_paren, close_paren) = children
-            args = ""
+            args = []
         else:
             (function_name, open_paren, args, close_paren) = children
-            args = ", ".join(args[0])
+            args = args[0]
 
-        key = "".join([function_name, open_paren, args, close_paren])
-        return AggregateKey(self.key_mappings_lookup.get(key, key))
+        return self.aggregate_key(function_name, args)
 
     def visit_function_args(self, node, children):
         return process_list(children[0], children[1])
@@ -983,38 +1094,13 @@ class SearchVisitor(NodeVisitor):
         return f'"{value}"'
 
     def visit_search_key(self, node, children):
-        key = children[0]
-        if (
-            self.config.allowed_keys
-            and key not in self.config.allowed_keys
-            or key in self.config.blocked_keys
-        ):
-            raise InvalidSearchQuery(f"Invalid key for this search: {key}")
-        return SearchKey(self.key_mappings_lookup.get(key, key))
+        return self.search_key(children[0])
 
     def visit_text_key(self, node, children):
         return children[0]
 
     def visit_value(self, node, children):
-        # A properly quoted value will match the quoted value regex, so any unescaped
-        # quotes are errors.
-        value = node.text
-        idx = value.find('"')
-        if idx == 0:
-            raise InvalidSearchQuery(
-                f"Invalid quote at '{node.text}': quotes must enclose text or be escaped."
-            )
-
-        while idx != -1:
-            if value[idx - 1] != "\\":
-                raise InvalidSearchQuery(
-                    f"Invalid quote at '{node.text}': quotes must enclose text or be escaped."
-                )
-
-            value = value[idx + 1 :]
-            idx = value.find('"')
-
-        return node.text.replace('\\"', '"')
+        return self.value(node.text)
 
     def visit_quoted_value(self, node, children):
         value = "".join(node.text for node in flatten(children[1]))
@@ -1137,14 +1223,73 @@ default_config = SearchConfig(
 )
 
 
+# Number of query strings whose parse trees and search filters are kept per process.
+PARSE_CACHE_SIZE = 1000
+
+_parsed_query_cache: LRUCache = LRUCache(maxsize=PARSE_CACHE_SIZE)
+_parsed_query_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_tree(query: str) -> Node:
+    # Visitors only read the tree, so the same one can be visited by every request.
+    return event_search_grammar.parse(query)
+
+
+def _get_parsed_query_cache_key(query, config, config_overrides) -> Hashable:
+    """
+    Search filters only depend on the query, the config and the builder. The
+    params are only passed on to the default builder, which does not resolve
+    anything from them, so queries without a builder are cached by query and
+    config.
+
+    Configs are compared by identity, cached filters keep a reference to
+    their config so that its id cannot be reused while they are cached.
+    Returns ``None`` if the overrides cannot be hashed.
+    """
+    overrides: Tuple[Tuple[str, Any], ...] = ()
+    if config_overrides:
+        overrides = tuple(sorted(config_overrides.items()))
+        try:
+            hash(overrides)
+        except TypeError:
+            return None
+    return (query, id(config), overrides)
+
+
 def parse_search_query(
     query, config=None, params=None, builder=None, config_overrides=None
 ) -> Sequence[SearchFilter]:
+    """
+    Parses a search query into a list of search filters.
+
+    Queries parsed without a builder are cached, unless they contain relative
+    dates. Cached filters are shared between callers, the returned list is a
+    copy but the filters in it must not be modified.
+    """
     if config is None:
         config = default_config
 
+    cache_key = None
+    if builder is None:
+        cache_key = _get_parsed_query_cache_key(query, config, config_overrides)
+    if cache_key is not None:
+        with _parsed_query_cache_lock:
+            cached = _parsed_query_cache.get(cache_key)
+        if cached is not None and cached[0] is config:
+            metrics.incr("event_search.parsed_query_cache", tags={"result": "hit"})
+            return list(cached[1])
+        metrics.incr("event_search.parsed_query_cache", tags={"result": "miss"})
+
+    # The hand-written parser accepts the same syntax, see sentry.api.event_search_parser.
+    use_parser = options.get("api.event-search.hand-written-parser")
     try:
-        tree = event_search_grammar.parse(query)
+        if use_parser:
+            from sentry.api.event_search_parser import parse_search_terms
+
+            parsed = parse_search_terms(query)
+        else:
+            parsed = _parse_tree(query)
     except IncompleteParseError as e:
         idx = e.column()
         prefix = query[max(0, idx - 5) : idx]
@@ -1156,6 +1301,19 @@ def parse_search_query(
             )
         )
 
+    search_config = config
     if config_overrides:
-        config = SearchConfig.create_from(config, **config_overrides)
-    return SearchVisitor(config, params=params, builder=builder).visit(tree)
+        search_config = SearchConfig.create_from(config, **config_overrides)
+    visitor = SearchVisitor(search_config, params=params, builder=builder)
+    if use_parser:
+        from sentry.api.event_search_parser import visit_search_terms
+
+        search_filters = visit_search_terms(visitor, parsed)
+    else:
+        search_filters = visitor.visit(parsed)
+
+    if cache_key is not None and not visitor.is_time_relative:
+        with _parsed_query_cache_lock:
+            _parsed_query_cache[cache_key] = (config, tuple(search_filters))
+
+    return search_filters
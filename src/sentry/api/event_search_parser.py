@@ -0,0 +1,577 @@
+"""
+A hand-written parser for the search syntax of ``sentry.api.event_search``.
+
+It accepts the same language as ``event_search_grammar`` and produces the same
+search filters, but matches each token with a single regular expression in one
+left-to-right pass. The PEG grammar instead allocates a node for every
+character of quoted values and ``IN`` lists, and rescans the rest of an ``IN``
+list value for every character it consumes, which makes it slow for long
+queries.
+
+Like the grammar, parsing happens in two steps: ``parse_search_terms`` checks
+the syntax of the whole query and returns its terms, then
+``visit_search_terms`` turns the terms into search filters with the methods a
+``SearchVisitor`` shares with the grammar visitor. Terms keep their parts in
+the order of the grammar, so errors are raised in the same order as when the
+parse tree is visited.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from parsimonious.exceptions import IncompleteParseError
+
+from sentry.api.event_search import (
+    PARSE_CACHE_SIZE,
+    SearchValue,
+    SearchVisitor,
+    event_search_grammar,
+)
+from sentry.exceptions import InvalidSearchQuery
+
+END_VALUE = r"(?=[\t\n )]|$)"
+NUMERIC = r"[0-9]+(?:\.[0-9]*)?"
+
+SPACES_RE = re.compile(r" *")
+COMMA_RE = re.compile(r" *,")
+END_VALUE_RE = re.compile(r"[\t\n )]|$")
+BOOLEAN_OPERATOR_RE = re.compile(rf"(?:OR|AND){END_VALUE}", re.IGNORECASE)
+FREE_TEXT_RE = re.compile(r"[^()\n ]+")
+OPERATOR_RE = re.compile(r">=|<=|>|<|=|!=")
+
+KEY_RE = re.compile(r"[a-zA-Z0-9_.-]+")
+QUOTED_KEY_RE = re.compile(r'"([a-zA-Z0-9_.:-]+)"')
+RAW_AGGREGATE_PARAM_RE = re.compile(r'[^()\t\n, "]+')
+# An escaped quote is always consumed as a pair, so these never backtrack into
+# treating its backslash as a character of its own.
+QUOTED_AGGREGATE_PARAM_RE = re.compile(r'"(?:\\"|\\(?!")|[^\t\n"\\])*"')
+QUOTED_VALUE_RE = re.compile(r'"((?:\\"|\\(?!")|[^"\\])*)"')
+VALUE_RE = re.compile(r"[^()\t\n ]*")
+IN_VALUE_RE = re.compile(r"[^(), ]+")
+
+NUMERIC_VALUE_RE = re.compile(rf"(-?{NUMERIC})([kmb]?)(?=[\t\n ),\]]|$)")
+BOOLEAN_VALUE_RE = re.compile(rf"(?:true|1|false|0){END_VALUE}", re.IGNORECASE)
+ISO_8601_DATE_RE = re.compile(
+    r"\d{4}-\d{2}-\d{2}(?:T\d{2}:\d{2}:\d{2}(?:\.\d{1,6})?)?(?:Z|[+-]\d{2}:\d{2})?" + END_VALUE
+)
+REL_DATE_RE = re.compile(rf"[+-][0-9]+[wdhm]{END_VALUE}")
+DURATION_RE = re.compile(rf"({NUMERIC})(ms|s|min|m|hr|h|day|d|wk|w){END_VALUE}")
+SIZE_RE = re.compile(
+    rf"({NUMERIC})(bit|nb|bytes|kb|mb|gb|tb|pb|eb|zb|yb|kib|mib|gib|tib|pib|eib|zib|yib){END_VALUE}"
+)
+PERCENTAGE_RE = re.compile(rf"({NUMERIC})%")
+
+
+class Part:
+    """
+    A part of a term that is resolved by the visitor, such as a key that has to
+    be checked against the allowed keys of the search.
+    """
+
+    __slots__ = ()
+
+    def visit(self, visitor: SearchVisitor) -> Any:
+        raise NotImplementedError
+
+
+class Key(Part):
+    __slots__ = ("name",)
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def visit(self, visitor: SearchVisitor) -> Any:
+        return visitor.search_key(self.name)
+
+
+class TagKey(Key):
+    __slots__ = ()
+
+    def visit(self, visitor: SearchVisitor) -> Any:
+        return visitor.explicit_tag_key(visitor.search_key(self.name))
+
+
+class FunctionKey(Part):
+    __slots__ = ("function_name", "args")
+
+    def __init__(self, function_name: str, args: Sequence[Optional[str]]) -> None:
+        self.function_name = function_name
+        self.args = args
+
+    def visit(self, visitor: SearchVisitor) -> Any:
+        if None in self.args:
+            raise InvalidSearchQuery("Lists should not have empty values")
+        return visitor.aggregate_key(self.function_name, self.args)
+
+
+class Value(Part):
+    __slots__ = ("text",)
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def visit(self, visitor: SearchVisitor) -> Any:
+        return SearchValue(visitor.value(self.text))
+
+
+class ValueList(Part):
+    __slots__ = ("values",)
+
+    def __init__(self, values: Sequence[Any]) -> None:
+        self.values = values
+
+    def visit(self, visitor: SearchVisitor) -> Any:
+        if None in self.values:
+            raise InvalidSearchQuery("Lists should not have empty values")
+        return list(self.values)
+
+
+class Term:
+    __slots__ = ()
+
+    def visit(self, visitor: SearchVisitor) -> Any:
+        raise NotImplementedError
+
+
+class BooleanOperator(Term):
+    __slots__ = ("operator",)
+
+    def __init__(self, operator: str) -> None:
+        self.operator = operator
+
+    def visit(self, visitor: SearchVisitor) -> Any:
+        return visitor.boolean_operator(self.operator)
+
+
+class ParenGroup(Term):
+    __slots__ = ("text", "terms")
+
+    def __init__(self, text: str, terms: Sequence[Term]) -> None:
+        self.text = text
+        self.terms = terms
+
+    def visit(self, visitor: SearchVisitor) -> Any:
+        return visitor.paren_group(self.text, visit_search_terms(visitor, self.terms))
+
+
+class FreeText(Term):
+    __slots__ = ("value",)
+
+    def __init__(self, value: Optional[str]) -> None:
+        self.value = value
+
+    def visit(self, visitor: SearchVisitor) -> Any:
+        return visitor.free_text(self.value)
+
+
+class Filter(Term):
+    """
+    A key:value filter, resolved by calling the ``handler`` method of the
+    visitor with ``args``. Parts in ``args`` are resolved first, after
+    ``checked_key`` which is only validated.
+    """
+
+    __slots__ = ("handler", "args", "checked_key")
+
+    def __init__(self, handler: str, args: Sequence[Any], checked_key: Optional[Key] = None):
+        self.handler = handler
+        self.args = args
+        self.checked_key = checked_key
+
+    def visit(self, visitor: SearchVisitor) -> Any:
+        if self.checked_key is not None:
+            self.checked_key.visit(visitor)
+        args = [arg.visit(visitor) if isinstance(arg, Part) else arg for arg in self.args]
+        return getattr(visitor, self.handler)(*args)
+
+
+Match = Optional[Tuple[int, Any]]
+
+
+class SearchQueryParser:
+    """
+    Recursive descent parser with one method per rule of the grammar. Like
+    parsimonious, results are memoized per position so that backtracking out
+    of nested parentheses stays linear.
+    """
+
+    def __init__(self, query: str) -> None:
+        self.query = query
+        self._terms: Dict[int, Match] = {}
+        self._filters: Dict[int, Match] = {}
+        self._free_texts: Dict[int, Match] = {}
+
+    def parse(self) -> List[Term]:
+        end, terms = self._match_terms(self._spaces(0))
+        if end < len(self.query):
+            raise IncompleteParseError(self.query, end, event_search_grammar.default_rule)
+        return terms
+
+    def _spaces(self, pos: int) -> int:
+        return SPACES_RE.match(self.query, pos).end()
+
+    def _match_terms(self, pos: int) -> Tuple[int, List[Term]]:
+        terms = []
+        while True:
+            match = self._term(pos)
+            if match is None:
+                return pos, terms
+            pos, term = match
+            terms.append(term)
+
+    def _term(self, pos: int) -> Match:
+        try:
+            return self._terms[pos]
+        except KeyError:
+            pass
+
+        match = (
+            self._boolean_operator(pos)
+            or self._paren_group(pos)
+            or self._filter(pos)
+            or self._free_text(pos)
+        )
+        if match is not None:
+            match = (self._spaces(match[0]), match[1])
+        self._terms[pos] = match
+        return match
+
+    def _boolean_operator(self, pos: int) -> Match:
+        match = BOOLEAN_OPERATOR_RE.match(self.query, pos)
+        if match is None:
+            return None
+        return match.end(), BooleanOperator(match.group().upper())
+
+    def _paren_group(self, pos: int) -> Match:
+        if not self.query.startswith("(", pos):
+            return None
+        end, terms = self._match_terms(self._spaces(pos + 1))
+        if not terms or not self.query.startswith(")", end):
+            return None
+        return end + 1, ParenGroup(self.query[pos : end + 1], terms)
+
+    def _free_text(self, pos: int) -> Match:
+        try:
+            return self._free_texts[pos]
+        except KeyError:
+            pass
+
+        match = QUOTED_VALUE_RE.match(self.query, pos)
+        if match is not None:
+            result: Match = (match.end(), FreeText(match.group(1).replace('\\"', '"')))
+        else:
+            end = pos
+            while not (self._filter(end) or BOOLEAN_OPERATOR_RE.match(self.query, end)):
+                word_end = self._free_parens(end)
+                if word_end is None:
+                    match = FREE_TEXT_RE.match(self.query, end)
+                    if match is None:
+                        break
+                    word_end = match.end()
+                end = self._spaces(word_end)
+
+            result = None
+            if end > pos:
+                result = (end, FreeText(self.query[pos:end].strip(" ") or None))
+
+        self._free_texts[pos] = result
+        return result
+
+    def _free_parens(self, pos: int) -> Optional[int]:
+        if not self.query.startswith("(", pos):
+            return None
+        match = self._free_text(pos + 1)
+        end = match[0] if match is not None else pos + 1
+        if not self.query.startswith(")", end):
+            return None
+        return end + 1
+
+    def _filter(self, pos: int) -> Match:
+        try:
+            return self._filters[pos]
+        except KeyError:
+            pass
+
+        match = self._match_filter(pos)
+        self._filters[pos] = match
+        return match
+
+    def _match_filter(self, pos: int) -> Match:
+        query = self.query
+        negated = query.startswith("!", pos)
+        key_pos = pos + 1 if negated else pos
+
+        search_key = self._search_key(key_pos)
+        if search_key is not None and query.startswith(":", search_key[0]):
+            match = self._search_key_filter(negated, search_key[1], search_key[0] + 1)
+            if match is not None:
+                return match
+
+        aggregate_key = self._aggregate_key(key_pos)
+        if aggregate_key is not None and query.startswith(":", aggregate_key[0]):
+            match = self._aggregate_filter(negated, aggregate_key[1], aggregate_key[0] + 1)
+            if match is not None:
+                return match
+
+        if search_key is not None and query.startswith(("has:", "is:"), key_pos):
+            value_pos = search_key[0] + 1
+            if query.startswith("has:", key_pos):
+                end, value = self._search_key(value_pos) or self._search_value(value_pos)
+                return end, Filter("has_filter", (negated, value), checked_key=search_key[1])
+            end, value = self._search_value(value_pos)
+            return end, Filter("is_filter", (negated, value), checked_key=search_key[1])
+
+        text_key = self._explicit_tag_key(key_pos) or search_key
+        if text_key is not None and query.startswith(":", text_key[0]):
+            return self._text_filter(negated, text_key[1], text_key[0] + 1)
+
+        return None
+
+    def _operator(self, pos: int) -> Tuple[int, str]:
+        match = OPERATOR_RE.match(self.query, pos)
+        if match is None:
+            return pos, "="
+        return match.end(), match.group()
+
+    def _search_key_filter(self, negated: bool, key: Key, pos: int) -> Match:
+        query = self.query
+
+        # Date filters do not support negation.
+        if not negated:
+            operator = OPERATOR_RE.match(query, pos)
+            if operator is not None:
+                match = ISO_8601_DATE_RE.match(query, operator.end())
+                if match is not None:
+                    return match.end(), Filter(
+                        "date_filter", (key, operator.group(), match.group())
+                    )
+
+            match = ISO_8601_DATE_RE.match(query, pos)
+            if match is not None:
+                return match.end(), Filter("specific_date_filter", (key, match.group()))
+
+            match = REL_DATE_RE.match(query, pos)
+            if match is not None:
+                return match.end(), Filter("rel_date_filter", (key, match.group()))
+
+        value_pos, operator = self._operator(pos)
+
+        match = DURATION_RE.match(query, value_pos)
+        if match is not None:
+            return match.end(), Filter(
+                "duration_filter", (negated, key, operator, list(match.groups()))
+            )
+
+        match = SIZE_RE.match(query, value_pos)
+        if match is not None:
+            return match.end(), Filter(
+                "size_filter", (negated, key, operator, list(match.groups()))
+            )
+
+        match = BOOLEAN_VALUE_RE.match(query, pos)
+        if match is not None:
+            return match.end(), Filter("boolean_filter", (negated, key, match.group()))
+
+        values = self._list(pos, self._numeric_value)
+        if values is not None:
+            return values[0], Filter("numeric_in_filter", (negated, key, values[1]))
+
+        value = self._numeric_value(value_pos)
+        if value is not None:
+            return value[0], Filter("numeric_filter", (negated, key, operator, value[1]))
+
+        return None
+
+    def _aggregate_filter(self, negated: bool, key: FunctionKey, pos: int) -> Match:
+        query = self.query
+        value_pos, operator = self._operator(pos)
+
+        match = DURATION_RE.match(query, value_pos)
+        if match is not None:
+            return match.end(), Filter(
+                "aggregate_duration_filter", (negated, key, operator, list(match.groups()))
+            )
+
+        match = PERCENTAGE_RE.match(query, value_pos)
+        if match is not None:
+            return match.end(), Filter(
+                "aggregate_percentage_filter", (negated, key, operator, match.group(1))
+            )
+
+        value = self._numeric_value(value_pos)
+        if value is not None:
+            return value[0], Filter("aggregate_numeric_filter", (negated, key, operator, value[1]))
+
+        match = SIZE_RE.match(query, value_pos)
+        if match is not None:
+            return match.end(), Filter(
+                "aggregate_size_filter", (negated, key, operator, list(match.groups()))
+            )
+
+        match = ISO_8601_DATE_RE.match(query, value_pos)
+        if match is not None:
+            return match.end(), Filter(
+                "aggregate_date_filter", (negated, key, operator, match.group())
+            )
+
+        match = REL_DATE_RE.match(query, value_pos)
+        if match is not None:
+            return match.end(), Filter(
+                "aggregate_rel_date_filter", (negated, key, operator, match.group())
+            )
+
+        return None
+
+    def _text_filter(self, negated: bool, key: Key, pos: int) -> Match:
+        values = self._list(pos, self._text_in_value)
+        if values is not None:
+            return values[0], Filter("text_in_filter", (negated, key, values[1]))
+
+        value_pos, operator = self._operator(pos)
+        end, value = self._search_value(value_pos)
+        return end, Filter(
+            "text_filter", (negated, key, operator, value, self.query[value_pos:end])
+        )
+
+    def _search_key(self, pos: int) -> Match:
+        match = KEY_RE.match(self.query, pos)
+        if match is None:
+            match = QUOTED_KEY_RE.match(self.query, pos)
+            if match is None:
+                return None
+            return match.end(), Key(match.group(1))
+        return match.end(), Key(match.group())
+
+    def _explicit_tag_key(self, pos: int) -> Match:
+        if not self.query.startswith("tags[", pos):
+            return None
+        match = self._search_key(pos + 5)
+        if match is None or not self.query.startswith("]", match[0]):
+            return None
+        return match[0] + 1, TagKey(match[1].name)
+
+    def _aggregate_key(self, pos: int) -> Match:
+        query = self.query
+        match = KEY_RE.match(query, pos)
+        if match is None or not query.startswith("(", match.end()):
+            return None
+
+        end = self._spaces(match.end() + 1)
+        args: List[Optional[str]] = []
+        param = self._aggregate_param(end)
+        if param is not None:
+            end, args = self._items(param, self._aggregate_param)
+
+        end = self._spaces(end)
+        if not query.startswith(")", end):
+            return None
+        return end + 1, FunctionKey(match.group(), args)
+
+    def _aggregate_param(self, pos: int) -> Match:
+        match = QUOTED_AGGREGATE_PARAM_RE.match(self.query, pos) or RAW_AGGREGATE_PARAM_RE.match(
+            self.query, pos
+        )
+        if match is None:
+            return None
+        return match.end(), match.group()
+
+    def _items(self, first: Tuple[int, Any], match_item: Callable[[int], Match]):
+        """
+        Matches the items of a comma separated list following its first item.
+        Missing items, as in ``a, , b``, are ``None``.
+        """
+        end, item = first
+        items = [item]
+        while True:
+            comma = COMMA_RE.match(self.query, end)
+            if comma is None:
+                break
+            item_pos = self._spaces(comma.end())
+            if self.query.startswith(",", item_pos):
+                break
+            match = match_item(item_pos)
+            if match is None:
+                end = item_pos
+                items.append(None)
+            else:
+                end, item = match
+                items.append(item)
+        return end, items
+
+    def _list(self, pos: int, match_item: Callable[[int], Match]) -> Match:
+        query = self.query
+        if not query.startswith("[", pos):
+            return None
+        first = match_item(pos + 1)
+        if first is None:
+            return None
+        end, items = self._items(first, match_item)
+        if not query.startswith("]", end) or END_VALUE_RE.match(query, end + 1) is None:
+            return None
+        return end + 1, ValueList(items)
+
+    def _numeric_value(self, pos: int) -> Match:
+        match = NUMERIC_VALUE_RE.match(self.query, pos)
+        if match is None:
+            return None
+        return match.end(), list(match.groups())
+
+    def _text_in_value(self, pos: int) -> Match:
+        query = self.query
+        match = QUOTED_VALUE_RE.match(query, pos)
+        if match is not None:
+            return match.end(), match.group(1).replace('\\"', '"')
+
+        match = IN_VALUE_RE.match(query, pos)
+        if match is None:
+            return None
+        # A value runs until a comma, or up to the last closing bracket before
+        # the end of the list.
+        end = match.end()
+        if COMMA_RE.match(query, end) is None:
+            end = query.rfind("]", pos + 1, end)
+            if end == -1:
+                return None
+        return end, query[pos:end].replace('\\"', '"')
+
+    def _search_value(self, pos: int) -> Tuple[int, Any]:
+        match = QUOTED_VALUE_RE.match(self.query, pos)
+        if match is not None:
+            return match.end(), SearchValue(match.group(1).replace('\\"', '"'))
+        match = VALUE_RE.match(self.query, pos)
+        return match.end(), Value(match.group())
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_search_terms(query: str) -> List[Term]:
+    """
+    Parses the terms of a search query. Raises ``IncompleteParseError`` at the
+    same position as the grammar if the query is not valid.
+
+    Terms are not modified when visited, so the same ones are shared by every
+    request.
+    """
+    return SearchQueryParser(query).parse()
+
+
+def visit_search_terms(visitor: SearchVisitor, terms: Sequence[Term]) -> List[Any]:
+    """
+    Turns parsed terms into search filters, like ``SearchVisitor.visit`` does
+    for a parse tree.
+    """
+    search_filters = []
+    for term in terms:
+        value = term.visit(visitor)
+        if isinstance(value, list):
+            search_filters.extend(_flatten(value))
+        elif value:
+            search_filters.append(value)
+    return search_filters
+
+
+def _flatten(values: List[Any]):
+    for value in values:
+        if isinstance(value, list):
+            yield from _flatten(value)
+        elif value:
+            yield value
@@ -10,7 +10,7 @@ import sqlparse
 from django.utils import timezone
 from sentry_relay import meta_with_chunks
 
-from sentry import features
+from sentry import eventstore, features
 from sentry.api.serializers import Serializer, register, serialize
 from sentry.api.serializers.models.release import GroupEventReleaseSerializer
 from sentry.eventstore.models import Event, GroupEvent
@@ -193,6 +193,7 @@ class EventSerializer(Serializer):
         return serialize(user_report, user)
 
     def get_attrs(self, item_list, user, is_public=False):
+        eventstore.prefetch_nodes(item_list)
         crash_files = get_crash_files(item_list)
         serialized_files = {
             file.event_id: serialized
@@ -1,7 +1,9 @@
 import logging
+from collections import defaultdict
 
 from django.db.models import F
 
+from sentry.db.models.query import bulk_increment
 from sentry.signals import buffer_incr_complete
 from sentry.tasks.process_buffer import process_incr
 from sentry.utils.services import Service
@@ -28,7 +30,7 @@ class Buffer(Service, metaclass=BufferMount):
     keep up with the updates.
     """
 
-    __all__ = ("get", "incr", "process", "process_pending", "validate")
+    __all__ = ("get", "incr", "process", "process_batch", "process_pending", "validate")
 
     def get(self, model, columns, filters):
         """
@@ -102,3 +104,72 @@ class Buffer(Service, metaclass=BufferMount):
             created=created,
             sender=model,
         )
+
+    def process_batch(self, batch):
+        """
+        Flushes many buffered increments at once. ``batch`` is a sequence of
+        ``(model, columns, filters, extra, signal_only)`` tuples, as they would
+        be passed to ``process``.
+
+        Updates that target a single row by primary key are grouped by model
+        and column set and applied with one bulk ``UPDATE`` per group. Anything
+        else (composite filters, ``signal_only``, rows which don't exist yet)
+        goes through ``process`` one by one.
+        """
+        from sentry.models import Group
+
+        bulk = defaultdict(list)
+        for model, columns, filters, extra, signal_only in batch:
+            pk = self._get_bulk_pk(model, columns, filters, signal_only)
+            if pk is None:
+                self._process(model, columns, filters, extra, signal_only)
+                continue
+            bulk[(model, frozenset(columns), frozenset(extra or ()))].append(
+                (pk, columns, filters, extra)
+            )
+
+        for (model, incr_columns, extra_columns), items in bulk.items():
+            expressions = None
+            if model is Group and "times_seen" in incr_columns and "last_seen" in extra_columns:
+                # See the equivalent ``ScoreClause`` in ``process``.
+                expressions = {
+                    "score": "log(t.times_seen + v.times_seen) * 600 "
+                    "+ floor(extract(epoch from v.last_seen))"
+                }
+
+            updated = bulk_increment(
+                model,
+                [(pk, columns, extra or {}) for pk, columns, _, extra in items],
+                expressions=expressions,
+            )
+            for pk, columns, filters, extra in items:
+                if model._meta.pk.to_python(pk) not in updated:
+                    self._process(model, columns, filters, extra)
+                    continue
+
+                if model is Group:
+                    # ``process`` keeps the cached group current via ``post_save``,
+                    # which the bulk update never fires.
+                    Group.objects.uncache_object(pk)
+
+                buffer_incr_complete.send_robust(
+                    model=model,
+                    columns=columns,
+                    filters=filters,
+                    extra=extra,
+                    created=False,
+                    sender=model,
+                )
+
+    def _process(self, model, columns, filters, extra=None, signal_only=None):
+        # Subclasses like ``RedisBuffer`` override ``process`` with a key based
+        # signature and point this at the model based implementation instead.
+        return self.process(model, columns, filters, extra, signal_only)
+
+    def _get_bulk_pk(self, model, columns, filters, signal_only):
+        if signal_only or not columns or len(filters) != 1:
+            return None
+        ((key, value),) = filters.items()
+        if key not in ("pk", model._meta.pk.name):
+            return None
+        return value
@@ -1,8 +1,11 @@
+import atexit
 import pickle
 import threading
+from collections import defaultdict
 from datetime import datetime
 from time import time
 
+import msgpack
 from django.db import models
 from django.utils import timezone
 from django.utils.encoding import force_bytes, force_text
@@ -19,6 +22,10 @@ from sentry.utils.redis import get_cluster_from_options
 _local_buffers = None
 _local_buffers_lock = threading.Lock()
 
+# Version prefix for values written with the msgpack encoding. It can't be
+# mistaken for the JSON (``{``/``[``) or pickle payloads we read as well.
+MSGPACK_V1 = b"\x01"
+
 
 class PendingBuffer:
     def __init__(self, size):
@@ -47,16 +54,110 @@ class PendingBuffer:
         return rv
 
 
+class LocalBuffer:
+    """
+    Accumulates increments for buffer keys in process memory, so that many
+    ``incr`` calls for the same key turn into a single Redis write.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add(self, key, model, columns, filters, extra=None, signal_only=None):
+        """
+        Merges an increment into the entry for ``key`` and returns the number
+        of increments accumulated since the last flush.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = {
+                    "model": model,
+                    "filters": filters,
+                    "columns": defaultdict(int),
+                    "extra": {},
+                    "signal_only": None,
+                }
+            for column, amount in columns.items():
+                entry["columns"][column] += amount
+            if extra:
+                # last write wins, same as ``hset`` in Redis
+                entry["extra"].update(extra)
+            if signal_only is True:
+                entry["signal_only"] = True
+            self.count += 1
+            return self.count
+
+    def get(self, key, column):
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry["columns"].get(column, 0) if entry is not None else 0
+
+    def flush(self):
+        with self.lock:
+            rv = self.entries
+            self.entries = {}
+            self.count = 0
+        return rv
+
+    def restore(self, entries):
+        """
+        Merges entries returned by ``flush`` back in, after they could not be
+        written. Values of ``extra`` added since the flush take precedence.
+        """
+        with self.lock:
+            for key, old in entries.items():
+                entry = self.entries.get(key)
+                if entry is None:
+                    self.entries[key] = old
+                    continue
+                for column, amount in old["columns"].items():
+                    entry["columns"][column] += amount
+                entry["extra"] = {**old["extra"], **entry["extra"]}
+                if old["signal_only"] is True:
+                    entry["signal_only"] = True
+            self.count += len(entries)
+
+
 class RedisBuffer(Buffer):
     key_expire = 60 * 60  # 1 hour
     pending_key = "b:p"
 
-    def __init__(self, pending_partitions=1, incr_batch_size=2, **options):
+    def __init__(
+        self,
+        pending_partitions=1,
+        incr_batch_size=2,
+        batch_flush=False,
+        value_encoding="pickle",
+        local_buffer_window=None,
+        local_buffer_size=100,
+        **options,
+    ):
         self.cluster, options = get_cluster_from_options("SENTRY_BUFFER_OPTIONS", options)
         self.pending_partitions = pending_partitions
         self.incr_batch_size = incr_batch_size
+        # Either "pickle" or "msgpack". Both formats are always readable, so
+        # this can be flipped while keys written with the other one are pending.
+        assert value_encoding in ("pickle", "msgpack")
+        self.value_encoding = value_encoding
+        # When enabled, ``process_pending`` flushes the whole partition itself
+        # with bulk updates instead of fanning out ``process_incr`` tasks.
+        self.batch_flush = batch_flush
+        # When set, ``incr`` coalesces increments in memory and writes them to
+        # Redis after ``local_buffer_window`` seconds or ``local_buffer_size``
+        # calls, whichever comes first.
+        self.local_buffer_window = local_buffer_window
+        self.local_buffer_size = local_buffer_size
+        self._local_buffer = LocalBuffer()
+        self._local_flush_timer = None
         assert self.pending_partitions > 0
         assert self.incr_batch_size > 0
+        assert self.local_buffer_size > 0
+
+        if self.local_buffer_window:
+            atexit.register(self.flush_local)
 
     def validate(self):
         try:
@@ -145,6 +246,30 @@ class RedisBuffer(Buffer):
         else:
             raise TypeError(f"invalid type: {type_}")
 
+    def _dump_field(self, value):
+        """
+        Encodes a filters dict or an extra value for storage in the buffer hash.
+        """
+        if self.value_encoding == "msgpack":
+            try:
+                # Strict types, so that tuples and subclasses of builtin types
+                # are not turned into lists and plain values on the way back.
+                return MSGPACK_V1 + msgpack.packb(value, datetime=True, strict_types=True)
+            except (TypeError, ValueError, OverflowError):
+                # Model instances, tuples, naive datetimes, integers beyond 64
+                # bits and the like still need pickle.
+                pass
+        # TODO(dcramer): once this goes live in production, we can kill the pickle path
+        # (this is to ensure a zero downtime deploy where we can transition event processing)
+        return pickle.dumps(value)
+
+    def _load_field(self, value):
+        if value.startswith(MSGPACK_V1):
+            return msgpack.unpackb(value[len(MSGPACK_V1) :], timestamp=3)
+        else:
+            # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
+            return pickle.loads(value)
+
     def get(self, model, columns, filters):
         """
         Fetches buffered values for a model/filter. Passed columns must be integer columns.
@@ -158,7 +283,9 @@ class RedisBuffer(Buffer):
         results = pipe.execute()
 
         return {
-            col: (int(results[i]) if results[i] is not None else 0) for i, col in enumerate(columns)
+            col: (int(results[i]) if results[i] is not None else 0)
+            + self._local_buffer.get(key, col)
+            for i, col in enumerate(columns)
         }
 
     def incr(self, model, columns, filters, extra=None, signal_only=None, return_incr_results=True):
@@ -175,16 +302,32 @@ class RedisBuffer(Buffer):
         # TODO(dcramer): longer term we'd rather not have to serialize values
         # here (unless it's to JSON)
         key = self._make_key(model, filters)
+
+        if self.local_buffer_window:
+            count = self._local_buffer.add(key, model, columns, filters, extra, signal_only)
+            if count >= self.local_buffer_size:
+                self.flush_local()
+            elif count == 1:
+                self._schedule_local_flush()
+        else:
+            # We can't use conn.map() due to wanting to support multiple pending
+            # keys (one per Redis partition)
+            conn = self.cluster.get_local_client_for_key(key)
+            pipe = conn.pipeline()
+            self._incr_pipeline(pipe, key, model, columns, filters, extra, signal_only)
+            pipe.execute()
+
+        metrics.incr(
+            "buffer.incr",
+            skip_internal=True,
+            tags={"module": model.__module__, "model": model.__name__},
+        )
+
+    def _incr_pipeline(self, pipe, key, model, columns, filters, extra=None, signal_only=None):
         pending_key = self._make_pending_key_from_key(key)
-        # We can't use conn.map() due to wanting to support multiple pending
-        # keys (one per Redis partition)
-        conn = self.cluster.get_local_client_for_key(key)
 
-        pipe = conn.pipeline()
         pipe.hsetnx(key, "m", f"{model.__module__}.{model.__name__}")
-        # TODO(dcramer): once this goes live in production, we can kill the pickle path
-        # (this is to ensure a zero downtime deploy where we can transition event processing)
-        pipe.hsetnx(key, "f", pickle.dumps(filters))
+        pipe.hsetnx(key, "f", self._dump_field(filters))
         # pipe.hsetnx(key, 'f', json.dumps(self._dump_values(filters)))
         for column, amount in columns.items():
             pipe.hincrby(key, "i+" + column, amount)
@@ -194,9 +337,7 @@ class RedisBuffer(Buffer):
             # hook here
             # e.g. "update score if last_seen or times_seen is changed"
             for column, value in extra.items():
-                # TODO(dcramer): once this goes live in production, we can kill the pickle path
-                # (this is to ensure a zero downtime deploy where we can transition event processing)
-                pipe.hset(key, "e+" + column, pickle.dumps(value))
+                pipe.hset(key, "e+" + column, self._dump_field(value))
                 # pipe.hset(key, 'e+' + column, json.dumps(self._dump_value(value)))
 
         if signal_only is True:
@@ -204,13 +345,60 @@ class RedisBuffer(Buffer):
 
         pipe.expire(key, self.key_expire)
         pipe.zadd(pending_key, {key: time()})
-        pipe.execute()
 
-        metrics.incr(
-            "buffer.incr",
-            skip_internal=True,
-            tags={"module": model.__module__, "model": model.__name__},
-        )
+    def _schedule_local_flush(self):
+        timer = threading.Timer(self.local_buffer_window, self.flush_local)
+        timer.daemon = True
+        timer.start()
+        self._local_flush_timer = timer
+
+    def flush_local(self):
+        """
+        Writes all increments coalesced in this process to Redis, using one
+        pipeline per Redis host. Increments that could not be written are put
+        back into the local buffer and retried with the next flush.
+        """
+        if self._local_flush_timer is not None:
+            self._local_flush_timer.cancel()
+            self._local_flush_timer = None
+
+        entries = self._local_buffer.flush()
+        if not entries:
+            return
+
+        router = self.cluster.get_router()
+        keys_by_host = defaultdict(list)
+        for key in entries:
+            keys_by_host[router.get_host_for_key(key)].append(key)
+
+        failed = {}
+        for host_id, keys in keys_by_host.items():
+            try:
+                pipe = self.cluster.get_local_client(host_id).pipeline()
+                for key in keys:
+                    entry = entries[key]
+                    self._incr_pipeline(
+                        pipe,
+                        key,
+                        entry["model"],
+                        entry["columns"],
+                        entry["filters"],
+                        entry["extra"],
+                        entry["signal_only"],
+                    )
+                pipe.execute()
+            except Exception:
+                # This usually runs on the timer thread, where nothing else
+                # would notice the error.
+                self.logger.exception("buffer.local-flush.failed", extra={"host_id": host_id})
+                failed.update((key, entries[key]) for key in keys)
+
+        metrics.timing("buffer.local-flush-size", len(entries) - len(failed))
+
+        if failed:
+            metrics.incr("buffer.local-flush-failed", amount=len(failed), skip_internal=True)
+            self._local_buffer.restore(failed)
+            self._schedule_local_flush()
 
     def process_pending(self, partition=None):
         if partition is None and self.pending_partitions > 1:
@@ -229,32 +417,74 @@ class RedisBuffer(Buffer):
         if not client.set(lock_key, "1", nx=True, ex=60):
             return
 
-        pending_buffer = PendingBuffer(self.incr_batch_size)
-
         try:
-            keycount = 0
             with self.cluster.all() as conn:
                 results = conn.zrange(pending_key, 0, -1)
 
-            with self.cluster.all() as conn:
-                for host_id, keys in results.value.items():
-                    if not keys:
-                        continue
-                    keycount += len(keys)
-                    for key in keys:
-                        pending_buffer.append(key.decode("utf-8"))
-                        if pending_buffer.full():
-                            process_incr.apply_async(kwargs={"batch_keys": pending_buffer.flush()})
-                    conn.target([host_id]).zrem(pending_key, *keys)
-
-            # queue up remainder of pending keys
-            if not pending_buffer.empty():
-                process_incr.apply_async(kwargs={"batch_keys": pending_buffer.flush()})
+            if self.batch_flush:
+                keycount = self._process_pending_batch(pending_key, results.value)
+            else:
+                keycount = self._process_pending_tasks(pending_key, results.value)
 
             metrics.timing("buffer.pending-size", keycount)
         finally:
             client.delete(lock_key)
 
+    def _process_pending_tasks(self, pending_key, keys_by_host):
+        pending_buffer = PendingBuffer(self.incr_batch_size)
+        keycount = 0
+
+        with self.cluster.all() as conn:
+            for host_id, keys in keys_by_host.items():
+                if not keys:
+                    continue
+                keycount += len(keys)
+                for key in keys:
+                    pending_buffer.append(key.decode("utf-8"))
+                    if pending_buffer.full():
+                        process_incr.apply_async(kwargs={"batch_keys": pending_buffer.flush()})
+                conn.target([host_id]).zrem(pending_key, *keys)
+
+        # queue up remainder of pending keys
+        if not pending_buffer.empty():
+            process_incr.apply_async(kwargs={"batch_keys": pending_buffer.flush()})
+
+        return keycount
+
+    def _process_pending_batch(self, pending_key, keys_by_host):
+        """
+        Drains the pending keys of every host with a single pipeline per host
+        and flushes the collected values through ``process_batch``.
+        """
+        keycount = 0
+        batch = []
+
+        for host_id, keys in keys_by_host.items():
+            if not keys:
+                continue
+            keycount += len(keys)
+
+            pipe = self.cluster.get_local_client(host_id).pipeline()
+            for key in keys:
+                pipe.hgetall(key)
+                pipe.delete(key)
+            pipe.zrem(pending_key, *keys)
+            results = pipe.execute()
+
+            for key, values in zip(keys, results[:-1:2]):
+                payload = self._load_payload(values)
+                if payload is None:
+                    metrics.incr("buffer.revoked", tags={"reason": "empty"}, skip_internal=False)
+                    self.logger.debug("buffer.revoked.empty", extra={"redis_key": key})
+                    continue
+                batch.append(payload)
+
+        if batch:
+            self.process_batch(batch)
+
+        metrics.timing("buffer.batch-size", len(batch))
+        return keycount
+
     def process(self, key=None, batch_keys=None):
         assert not (key is None and batch_keys is None)
         assert not (key is not None and batch_keys is not None)
@@ -288,42 +518,51 @@ class RedisBuffer(Buffer):
             pipe.delete(key)
             values = pipe.execute()[0]
 
-            # XXX(python3): In python2 this isn't as important since redis will
-            # return string tyes (be it, byte strings), but in py3 we get bytes
-            # back, and really we just want to deal with keys as strings.
-            values = {force_text(k): v for k, v in values.items()}
-
-            if not values:
+            payload = self._load_payload(values)
+            if payload is None:
                 metrics.incr("buffer.revoked", tags={"reason": "empty"}, skip_internal=False)
                 self.logger.debug("buffer.revoked.empty", extra={"redis_key": key})
                 return
 
-            # XXX(py3): Note that ``import_string`` explicitly wants a str in
-            # python2, so we'll decode (for python3) and then translate back to
-            # a byte string (in python2) for import_string.
-            model = import_string(str(values.pop("m").decode("utf-8")))
-
-            if values["f"].startswith(b"{"):
-                filters = self._load_values(json.loads(values.pop("f").decode("utf-8")))
-            else:
-                # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
-                filters = pickle.loads(values.pop("f"))
-
-            incr_values = {}
-            extra_values = {}
-            signal_only = None
-            for k, v in values.items():
-                if k.startswith("i+"):
-                    incr_values[k[2:]] = int(v)
-                elif k.startswith("e+"):
-                    if v.startswith(b"["):
-                        extra_values[k[2:]] = self._load_value(json.loads(v.decode("utf-8")))
-                    else:
-                        # TODO(dcramer): legacy pickle support - remove in Sentry 9.1
-                        extra_values[k[2:]] = pickle.loads(v)
-                elif k == "s":
-                    signal_only = bool(int(v))  # Should be 1 if set
-
-            self._process(model, incr_values, filters, extra_values, signal_only)
+            self._process(*payload)
         finally:
             client.delete(lock_key)
+
+    def _load_payload(self, values):
+        """
+        Decodes a buffer hash into ``(model, columns, filters, extra, signal_only)``,
+        or returns ``None`` if the hash was empty.
+        """
+        # XXX(python3): In python2 this isn't as important since redis will
+        # return string tyes (be it, byte strings), but in py3 we get bytes
+        # back, and really we just want to deal with keys as strings.
+        values = {force_text(k): v for k, v in values.items()}
+
+        if not values:
+            return None
+
+        # XXX(py3): Note that ``import_string`` explicitly wants a str in
+        # python2, so we'll decode (for python3) and then translate back to
+        # a byte string (in python2) for import_string.
+        model = import_string(str(values.pop("m").decode("utf-8")))
+
+        if values["f"].startswith(b"{"):
+            filters = self._load_values(json.loads(values.pop("f").decode("utf-8")))
+        else:
+            filters = self._load_field(values.pop("f"))
+
+        incr_values = {}
+        extra_values = {}
+        signal_only = None
+        for k, v in values.items():
+            if k.startswith("i+"):
+                incr_values[k[2:]] = int(v)
+            elif k.startswith("e+"):
+                if v.startswith(b"["):
+                    extra_values[k[2:]] = self._load_value(json.loads(v.decode("utf-8")))
+                else:
+                    extra_values[k[2:]] = self._load_field(v)
+            elif k == "s":
+                signal_only = bool(int(v))  # Should be 1 if set
+
+        return model, incr_values, filters, extra_values, signal_only
@@ -38,6 +38,24 @@ class BaseCache(local):
     def get(self, key, version=None, raw=False):
         raise NotImplementedError
 
+    # The batch operations below can/should be overridden by backends that
+    # are able to perform them in fewer round-trips.
+
+    def set_many(self, items, timeout, version=None, raw=False):
+        for key, value in items.items():
+            self.set(key, value, timeout, version=version, raw=raw)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.delete(key, version=version)
+
+    def get_many(self, keys, version=None, raw=False):
+        """
+        Returns the values of ``keys`` in the same order, with ``None`` for
+        missing keys.
+        """
+        return [self.get(key, version=version, raw=raw) for key in keys]
+
     def _mark_transaction(self, op):
         """
         Mark transaction with a tag so we can identify system components that rely
@@ -16,11 +16,27 @@ class CommonRedisCache(BaseCache):
         self.client = client
         BaseCache.__init__(self, **options)
 
-    def set(self, key, value, timeout, version=None, raw=False):
-        key = self.make_key(key, version=version)
+    def _encode(self, key, value, raw):
         v = json.dumps(value) if not raw else value
         if len(v) > self.max_size:
             raise ValueTooLarge(f"Cache key too large: {key!r} {len(v)!r}")
+        return v
+
+    def _execute_many(self, commands):
+        """
+        Executes a sequence of ``(command, args)`` pairs with one round-trip
+        per node, and returns their results in the same order.
+        """
+        # Redis Cluster pipelines are split by slot and sent to each node
+        # separately, so this works for both single nodes and clusters.
+        with self.client.pipeline(transaction=False) as pipeline:
+            for command, args in commands:
+                getattr(pipeline, command)(*args)
+            return pipeline.execute()
+
+    def set(self, key, value, timeout, version=None, raw=False):
+        key = self.make_key(key, version=version)
+        v = self._encode(key, value, raw)
         if timeout:
             self.client.setex(key, int(timeout), v)
         else:
@@ -28,12 +44,33 @@ class CommonRedisCache(BaseCache):
 
         self._mark_transaction("set")
 
+    def set_many(self, items, timeout, version=None, raw=False):
+        commands = []
+        for key, value in items.items():
+            key = self.make_key(key, version=version)
+            v = self._encode(key, value, raw)
+            if timeout:
+                commands.append(("setex", (key, int(timeout), v)))
+            else:
+                commands.append(("set", (key, v)))
+
+        if commands:
+            self._execute_many(commands)
+
+        self._mark_transaction("set")
+
     def delete(self, key, version=None):
         key = self.make_key(key, version=version)
         self.client.delete(key)
 
         self._mark_transaction("delete")
 
+    def delete_many(self, keys, version=None):
+        if keys:
+            self._execute_many([("delete", (self.make_key(key, version=version),)) for key in keys])
+
+        self._mark_transaction("delete")
+
     def get(self, key, version=None, raw=False):
         key = self.make_key(key, version=version)
         result = self.client.get(key)
@@ -44,6 +81,19 @@ class CommonRedisCache(BaseCache):
 
         return result
 
+    def get_many(self, keys, version=None, raw=False):
+        results = []
+        if keys:
+            results = self._execute_many(
+                [("get", (self.make_key(key, version=version),)) for key in keys]
+            )
+        if not raw:
+            results = [json.loads(result) if result is not None else None for result in results]
+
+        self._mark_transaction("get")
+
+        return results
+
 
 class RbCache(CommonRedisCache):
     def __init__(self, **options):
@@ -51,6 +101,13 @@ class RbCache(CommonRedisCache):
         client = cluster.get_routing_client()
         CommonRedisCache.__init__(self, client, **options)
 
+    def _execute_many(self, commands):
+        # The routing client does not support pipelines, its mapping client
+        # batches the commands for each host instead.
+        with self.client.map() as client:
+            promises = [getattr(client, command)(*args) for command, args in commands]
+        return [promise.value for promise in promises]
+
 
 # Confusing legacy name for RbCache.  We don't actually have a pure redis cache
 RedisCache = RbCache
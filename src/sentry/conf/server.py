@@ -111,7 +111,9 @@ SENTRY_ENSURE_FQDN = False
 SENTRY_DYNAMIC_SAMPLING_RULES_REDIS_CLUSTER = "default"
 SENTRY_INCIDENT_RULES_REDIS_CLUSTER = "default"
 SENTRY_RATE_LIMIT_REDIS_CLUSTER = "default"
+SENTRY_RULE_FREQUENCY_COUNTERS_REDIS_CLUSTER = "default"
 SENTRY_RULE_TASK_REDIS_CLUSTER = "default"
+SENTRY_SNUBA_SINGLE_FLIGHT_REDIS_CLUSTER = "default"
 SENTRY_TRANSACTION_NAMES_REDIS_CLUSTER = "default"
 SENTRY_WEBHOOK_LOG_REDIS_CLUSTER = "default"
 
@@ -1846,6 +1848,10 @@ SENTRY_SNUBA_CACHE_TTL_SECONDS = 60
 # Node storage backend
 SENTRY_NODESTORE = "sentry.nodestore.django.DjangoNodeStorage"
 SENTRY_NODESTORE_OPTIONS = {}
+# Directory with per-platform zstd dictionaries (see ``sentry nodestore
+# train-dictionary``). When set, node payloads of platforms that have a
+# dictionary are compressed with it before they are handed to the backend.
+SENTRY_NODESTORE_DICTIONARIES_PATH = None
 
 # Tag storage backend
 SENTRY_TAGSTORE = os.environ.get("SENTRY_TAGSTORE", "sentry.tagstore.snuba.SnubaTagStorage")
@@ -139,10 +139,32 @@ class NodeData(MutableMapping):
             See documentation of nodestore.
         """
 
+        subkeys = self._get_subkeys_to_write(subkeys)
+        if subkeys is not None:
+            nodestore.set_subkeys(self.id, subkeys)
+
+    @classmethod
+    def save_many(cls, nodes):
+        """
+        Write several nodes back to nodestore in one call.
+
+        :param nodes: A sequence of ``(node_data, subkeys)`` tuples, see
+            ``save`` for what ``subkeys`` may contain.
+        """
+        items = {}
+        for node, subkeys in nodes:
+            subkeys = node._get_subkeys_to_write(subkeys)
+            if subkeys is not None:
+                items[node.id] = subkeys
+
+        if items:
+            nodestore.set_subkeys_multi(items)
+
+    def _get_subkeys_to_write(self, subkeys):
         # We never loaded any data for reading or writing, so there
         # is nothing to save.
         if self._node_data is None:
-            return
+            return None
 
         # We can't put our wrappers into the nodestore, so we need to
         # ensure that the data is converted into a plain old dict
@@ -152,8 +174,7 @@ class NodeData(MutableMapping):
 
         subkeys = subkeys or {}
         subkeys[None] = to_write
-
-        nodestore.set_subkeys(self.id, subkeys)
+        return subkeys
 
 
 class NodeField(GzippedDictField):
@@ -2,9 +2,9 @@ from __future__ import annotations
 
 import itertools
 from functools import reduce
-from typing import Any, Tuple, Type, cast
+from typing import Any, Mapping, Sequence, Set, Tuple, Type, cast
 
-from django.db import IntegrityError, router, transaction
+from django.db import IntegrityError, connections, router, transaction
 from django.db.models import Model, Q
 from django.db.models.expressions import CombinedExpression
 from django.db.models.signals import post_save
@@ -12,6 +12,7 @@ from django.db.models.signals import post_save
 from .utils import resolve_combined_expression
 
 __all__ = (
+    "bulk_increment",
     "create_or_update",
     "update",
     "update_or_create",
@@ -164,6 +165,79 @@ def create_or_update(
     return affected, False
 
 
+def bulk_increment(
+    model: Type[Model],
+    rows: Sequence[Tuple[Any, Mapping[str, int], Mapping[str, Any]]],
+    expressions: Mapping[str, str] | None = None,
+    using: str | None = None,
+) -> Set[Any]:
+    """
+    Applies many ``(pk, columns, extra)`` updates to ``model`` with a single
+    ``UPDATE ... FROM (VALUES ...)`` statement. Counters in ``columns`` are
+    added to the current value, values in ``extra`` overwrite it. Every row
+    must carry the same set of column names.
+
+    ``expressions`` maps additional column names to raw SQL, where ``t`` is
+    the table being updated and ``v`` the row of values.
+
+    Returns the set of primary keys that were actually updated, so callers can
+    fall back to ``create_or_update`` for rows that do not exist yet.
+
+    >>> bulk_increment(Group, [
+    >>>     (1, {'times_seen': 3}, {'last_seen': now}),
+    >>>     (2, {'times_seen': 1}, {'last_seen': now}),
+    >>> ])
+    """
+    if not rows:
+        return set()
+
+    if not using:
+        using = router.db_for_write(model)
+    connection = connections[using]
+    quote = connection.ops.quote_name
+
+    _, first_columns, first_extra = rows[0]
+    incr_columns = sorted(first_columns)
+    extra_columns = sorted(first_extra)
+    fields = [model._meta.get_field(c) for c in itertools.chain(incr_columns, extra_columns)]
+
+    assignments = [
+        f"{quote(f.column)} = t.{quote(f.column)} + v.{quote(f.column)}"
+        for f in fields[: len(incr_columns)]
+    ]
+    assignments.extend(
+        f"{quote(f.column)} = v.{quote(f.column)}" for f in fields[len(incr_columns) :]
+    )
+    assignments.extend(f"{quote(column)} = {sql}" for column, sql in (expressions or {}).items())
+
+    row_sql = "(%s)" % ", ".join(["%s"] + [f"%s::{f.db_type(connection)}" for f in fields])
+    params: list[Any] = []
+    for pk, columns, extra in rows:
+        assert sorted(columns) == incr_columns and sorted(extra) == extra_columns
+        params.append(pk)
+        params.extend(
+            f.get_db_prep_save(value, connection)
+            for f, value in zip(
+                fields,
+                itertools.chain(
+                    (columns[c] for c in incr_columns), (extra[c] for c in extra_columns)
+                ),
+            )
+        )
+
+    pk_column = quote(model._meta.pk.column)
+    sql = (
+        f"UPDATE {quote(model._meta.db_table)} AS t SET {', '.join(assignments)} "
+        f"FROM (VALUES {', '.join([row_sql] * len(rows))}) "
+        f"AS v (__pk, {', '.join(quote(f.column) for f in fields)}) "
+        f"WHERE t.{pk_column} = v.__pk RETURNING t.{pk_column}"
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
+
+
 def in_iexact(column: str, values: Any) -> Q:
     """Operator to test if any of the given values are (case-insensitive)
     matching to values in the given column."""
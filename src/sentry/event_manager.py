@@ -14,6 +14,7 @@ from typing import (
     TYPE_CHECKING,
     Any,
     Dict,
+    List,
     Mapping,
     MutableMapping,
     Optional,
@@ -53,6 +54,7 @@ from sentry.constants import (
     DataCategory,
 )
 from sentry.culprit import generate_culprit
+from sentry.db.models.fields.node import NodeData
 from sentry.dynamic_sampling import LatestReleaseBias, LatestReleaseParams
 from sentry.eventstore.processing import event_processing_store
 from sentry.eventtypes import (
@@ -594,6 +596,7 @@ class EventManager:
         _increment_release_associated_counts_many(jobs, projects)
         _get_or_create_group_release_many(jobs, projects)
         _tsdb_record_all_metrics(jobs)
+        _record_frequency_counters(jobs)
 
         UserReport.objects.filter(project_id=project.id, event_id=job["event"].event_id).update(
             group_id=group_info.group.id, environment_id=job["environment"].id
@@ -1053,10 +1056,14 @@ def _create_kwargs(job: Union[Job, PerformanceJob]) -> dict[str, Any]:
 
 @metrics.wraps("save_event.get_or_create_environment_many")
 def _get_or_create_environment_many(jobs: Sequence[Job], projects: ProjectsMapping) -> None:
+    environments: dict[tuple[int, Optional[str]], Environment] = {}
     for job in jobs:
-        job["environment"] = Environment.get_or_create(
-            project=projects[job["project_id"]], name=job["environment"]
-        )
+        environment_key = (job["project_id"], job["environment"])
+        if environment_key not in environments:
+            environments[environment_key] = Environment.get_or_create(
+                project=projects[job["project_id"]], name=job["environment"]
+            )
+        job["environment"] = environments[environment_key]
 
 
 @metrics.wraps("save_event.get_or_create_group_environment_many")
@@ -1083,14 +1090,21 @@ def _get_or_create_release_associated_models(
     # XXX: This is possibly unnecessarily detached from
     # _get_or_create_release_many, but we do not want to destroy order of
     # execution right now
+    associations: dict[tuple[int, int, int], tuple[Release, Environment, datetime]] = {}
     for job in jobs:
         release = job["release"]
         if not release:
             continue
 
-        project = projects[job["project_id"]]
         environment = job["environment"]
         date = job["event"].datetime
+        association_key = (job["project_id"], release.id, environment.id)
+        if association_key in associations and associations[association_key][2] >= date:
+            continue
+        associations[association_key] = (release, environment, date)
+
+    for (project_id, _, _), (release, environment, date) in associations.items():
+        project = projects[project_id]
 
         ReleaseEnvironment.get_or_create(
             project=project, release=release, environment=environment, datetime=date
@@ -1168,6 +1182,34 @@ def _get_or_create_group_release(
             )
 
 
+@metrics.wraps("save_event.record_frequency_counters")
+def _record_frequency_counters(jobs: Sequence[Job]) -> None:
+    """
+    Count events in the counters read by event frequency alert rules, for
+    projects that have such rules.
+    """
+    if not options.get("rules.frequency-counters.enabled"):
+        return
+
+    from sentry.rules import frequency_counters
+
+    for job in jobs:
+        environment_ids = frequency_counters.get_counted_environment_ids(job["project_id"])
+        counters = [
+            (job["project_id"], group_info.group.id, environment_id)
+            for group_info in job["groups"]
+            for environment_id in environment_ids
+            if environment_id is None or environment_id == job["environment"].id
+        ]
+        if counters:
+            try:
+                frequency_counters.increment(counters, job["event"].datetime)
+            except Exception:
+                # This leaves the counts short until the affected buckets
+                # expire, saving the event matters more.
+                logger.exception("Failed to record frequency counters")
+
+
 @metrics.wraps("save_event.tsdb_record_all_metrics")
 def _tsdb_record_all_metrics(jobs: Sequence[Job]) -> None:
     """
@@ -1228,6 +1270,7 @@ def _tsdb_record_all_metrics(jobs: Sequence[Job]) -> None:
 @metrics.wraps("save_event.nodestore_save_many")
 def _nodestore_save_many(jobs: Sequence[Job]) -> None:
     inserted_time = datetime.utcnow().replace(tzinfo=UTC).timestamp()
+    nodes = []
     for job in jobs:
         # Write the event to Nodestore
         subkeys = {}
@@ -1243,7 +1286,9 @@ def _nodestore_save_many(jobs: Sequence[Job]) -> None:
                 subkeys["unprocessed"] = unprocessed
 
         job["event"].data["nodestore_insert"] = inserted_time
-        job["event"].data.save(subkeys=subkeys)
+        nodes.append((job["event"].data, subkeys))
+
+    NodeData.save_many(nodes)
 
 
 @metrics.wraps("save_event.eventstream_insert_many")
@@ -2358,6 +2403,7 @@ def save_transaction_events(jobs: Sequence[Job], projects: ProjectsMapping) -> S
     _get_or_create_environment_many(jobs, projects)
     _get_or_create_release_associated_models(jobs, projects)
     _tsdb_record_all_metrics(jobs)
+    _record_frequency_counters(jobs)
     _materialize_event_metrics(jobs)
     _nodestore_save_many(jobs)
     _eventstream_insert_many(jobs)
@@ -2367,6 +2413,96 @@ def save_transaction_events(jobs: Sequence[Job], projects: ProjectsMapping) -> S
     return jobs
 
 
+@metrics.wraps("event_manager.save_events")
+def save_events(
+    project_id: int,
+    managers: Sequence[EventManager],
+    raw: bool = False,
+    assume_normalized: bool = False,
+    start_times: Optional[Sequence[Optional[int]]] = None,
+    skip_send_first_transaction: bool = False,
+    cache_keys: Optional[Sequence[Optional[str]]] = None,
+    auto_upgrade_grouping: bool = False,
+) -> List[Event]:
+    """
+    Save several events of the same project, see ``EventManager.save``.
+    Events are returned in the order of ``managers``.
+
+    Transactions and generic events are saved as one batch each, so that
+    release and environment lookups and nodestore writes are shared between
+    them. Error events still go through ``EventManager.save`` one at a time,
+    as grouping has to see the groups created by earlier events. Their
+    ``cache_keys`` and ``auto_upgrade_grouping`` are passed on to it.
+    """
+    if start_times is None:
+        start_times = [None] * len(managers)
+    if cache_keys is None:
+        cache_keys = [None] * len(managers)
+
+    with metrics.timer("event_manager.save.project.get_from_cache"):
+        project = Project.objects.get_from_cache(id=project_id)
+
+    projects = {project.id: project}
+    events: List[Optional[Event]] = [None] * len(managers)
+    batches: dict[str, list[tuple[int, Job]]] = {"transaction": [], "generic": []}
+
+    for index, (manager, start_time, cache_key) in enumerate(
+        zip(managers, start_times, cache_keys)
+    ):
+        if not manager._normalized:
+            if not assume_normalized:
+                manager.normalize(project_id=project_id)
+            manager._normalized = True
+
+        event_type = manager._data.get("type")
+        if event_type not in batches:
+            events[index] = manager.save(
+                project_id,
+                raw=raw,
+                assume_normalized=True,
+                start_time=start_time,
+                cache_key=cache_key,
+                auto_upgrade_grouping=auto_upgrade_grouping,
+            )
+            continue
+
+        manager._data["project"] = project.id
+        batches[event_type].append(
+            (
+                index,
+                {
+                    "data": manager._data,
+                    "project_id": project.id,
+                    "raw": raw,
+                    "start_time": start_time,
+                },
+            )
+        )
+
+    for event_type, save_jobs in (
+        ("transaction", save_transaction_events),
+        ("generic", save_generic_events),
+    ):
+        batch = batches[event_type]
+        if not batch:
+            continue
+
+        jobs = save_jobs([job for _, job in batch], projects)
+        for (index, _), job in zip(batch, jobs):
+            events[index] = job["event"]
+
+        if (
+            event_type == "transaction"
+            and not project.flags.has_transactions
+            and not skip_send_first_transaction
+        ):
+            first_transaction_received.send_robust(
+                project=project, event=jobs[0]["event"], sender=Project
+            )
+
+    return cast(List[Event], events)
+
+
 @metrics.wraps("event_manager.save_generic_events")
 def save_generic_events(jobs: Sequence[Job], projects: ProjectsMapping) -> Sequence[Job]:
     with metrics.timer("event_manager.save_generic.organization_ids"):
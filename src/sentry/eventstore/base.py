@@ -124,6 +124,7 @@ class EventStorage(Service):
         "get_unfetched_events",
         "get_adjacent_event_ids",
         "bind_nodes",
+        "prefetch_nodes",
         "get_unfetched_transactions",
     )
 
@@ -255,6 +256,19 @@ class EventStorage(Service):
                 data = node_results.get(node.id) or {}
                 node.bind_data(data, ref=node.get_ref(item))
 
+    def prefetch_nodes(self, object_list, node_name="data"):
+        """
+        For a list of Event objects whose (unfetched) NodeDatas are about to be
+        read, have nodestore fetch all of them together with the first read
+        from within a ``nodestore.local_cache`` block. Unlike ``bind_nodes``
+        this does not fetch anything by itself, and does nothing outside of
+        such a block.
+        """
+        for item in object_list:
+            node = getattr(item, node_name)
+            if node.id and node._node_data is None:
+                nodestore.prefetch(node.id)
+
     def get_unfetched_transactions(
         self,
         snuba_filter,
@@ -14,7 +14,7 @@ from dateutil.parser import parse as parse_date
 from django.conf import settings
 from django.utils.encoding import force_text
 
-from sentry import eventtypes
+from sentry import eventtypes, options
 from sentry.db.models import NodeData
 from sentry.grouping.result import CalculatedHashes
 from sentry.interfaces.base import Interface, get_interfaces
@@ -353,6 +353,22 @@ class BaseEvent(metaclass=abc.ABCMeta):
             if rv is not None:
                 return rv
 
+        # Events with the same grouping inputs as a previous one get the same
+        # hashes, so look them up before calculating them.
+        digest = None
+        if options.get("grouping.hash-cache.enabled"):
+            from sentry.grouping.cache import get_cached_hashes, get_grouping_input_digest
+
+            digest = get_grouping_input_digest(
+                self.data, self._get_grouping_config_dict(force_config)
+            )
+            cached = get_cached_hashes(digest) if digest is not None else None
+            if cached is not None:
+                rv, main_exception_id = cached
+                if main_exception_id is not None:
+                    self.data["main_exception_id"] = main_exception_id
+                return rv
+
         # Create fresh hashes
         flat_variants, hierarchical_variants = self.get_sorted_grouping_variants(force_config)
         flat_hashes, _ = self._hashes_from_sorted_grouping_variants(flat_variants)
@@ -368,9 +384,14 @@ class BaseEvent(metaclass=abc.ABCMeta):
         flat_hashes = [hash_ for _, hash_ in flat_hashes]
         hierarchical_hashes = [hash_ for _, hash_ in hierarchical_hashes]
 
-        return CalculatedHashes(
+        rv = CalculatedHashes(
             hashes=flat_hashes, hierarchical_hashes=hierarchical_hashes, tree_labels=tree_labels
         )
+        if digest is not None:
+            from sentry.grouping.cache import set_cached_hashes
+
+            set_cached_hashes(digest, rv, self.data.get("main_exception_id"))
+        return rv
 
     def get_sorted_grouping_variants(self, force_config: str | Mapping[str, Any] | None = None):
         """Get grouping variants sorted into flat and hierarchical variants"""
@@ -415,18 +436,9 @@ class BaseEvent(metaclass=abc.ABCMeta):
         # We have modified event data, so any cached interfaces have to be reset:
         self.__dict__.pop("interfaces", None)
 
-    def get_grouping_variants(self, force_config=None, normalize_stacktraces: bool = False):
-        """
-        This is similar to `get_hashes` but will instead return the
-        grouping components for each variant in a dictionary.
-
-        If `normalize_stacktraces` is set to `True` then the event data will be
-        modified for `in_app` in addition to event variants being created.  This
-        means that after calling that function the event data has been modified
-        in place.
-        """
-        from sentry.grouping.api import get_grouping_variants_for_event, load_grouping_config
-
+    def _get_grouping_config_dict(
+        self, force_config: str | Mapping[str, Any] | None = None
+    ) -> Mapping[str, Any]:
         # Forcing configs has two separate modes.  One is where just the
         # config ID is given in which case it's merged with the stored or
         # default config dictionary
@@ -435,15 +447,26 @@ class BaseEvent(metaclass=abc.ABCMeta):
                 stored_config = self.get_grouping_config()
                 config = dict(stored_config)
                 config["id"] = force_config
-            else:
-                config = force_config
+                return config
+            return force_config
 
         # Otherwise we just use the same grouping config as stored.  if
         # this is None we use the project's default config.
-        else:
-            config = self.get_grouping_config()
+        return self.get_grouping_config()
+
+    def get_grouping_variants(self, force_config=None, normalize_stacktraces: bool = False):
+        """
+        This is similar to `get_hashes` but will instead return the
+        grouping components for each variant in a dictionary.
+
+        If `normalize_stacktraces` is set to `True` then the event data will be
+        modified for `in_app` in addition to event variants being created.  This
+        means that after calling that function the event data has been modified
+        in place.
+        """
+        from sentry.grouping.api import get_grouping_variants_for_event, load_grouping_config
 
-        config = load_grouping_config(config)
+        config = load_grouping_config(self._get_grouping_config_dict(force_config))
 
         if normalize_stacktraces:
             with sentry_sdk.start_span(op="grouping.normalize_stacktraces_for_grouping") as span:
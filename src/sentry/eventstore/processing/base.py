@@ -1,5 +1,5 @@
 from datetime import timedelta
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import sentry_sdk
 
@@ -25,8 +25,13 @@ class EventProcessingStore:
     implementations.
     """
 
-    def __init__(self, inner: KVStorage[str, Event]):
+    def __init__(
+        self, inner: KVStorage[str, Event], encoded_inner: Optional[KVStorage[str, bytes]] = None
+    ):
         self.inner = inner
+        # Optional view of ``inner`` that accepts events which already are
+        # encoded as JSON, only available for storages that store JSON.
+        self.encoded_inner = encoded_inner
         self.timeout = timedelta(seconds=DEFAULT_TIMEOUT)
 
     def __get_unprocessed_key(self, key: str) -> str:
@@ -40,16 +45,73 @@ class EventProcessingStore:
             self.inner.set(key, event, self.timeout)
             return key
 
+    def store_many(self, events: Sequence[Event], unprocessed: bool = False) -> List[str]:
+        """
+        Stores several events at once, returns their keys in the same order.
+        """
+        with sentry_sdk.start_span(op="eventstore.processing.store_many"):
+            keys = [cache_key_for_event(event) for event in events]
+            if unprocessed:
+                keys = [self.__get_unprocessed_key(key) for key in keys]
+            self.inner.set_many(dict(zip(keys, events)), self.timeout)
+            return keys
+
+    def store_encoded(self, event: Event, encoded: bytes) -> str:
+        """
+        Stores ``event`` like ``store``, but writes ``encoded``, the JSON
+        encoding of the event, as-is instead of encoding the event again.
+        """
+        if self.encoded_inner is None:
+            return self.store(event)
+
+        with sentry_sdk.start_span(op="eventstore.processing.store_encoded"):
+            key = cache_key_for_event(event)
+            self.encoded_inner.set(key, encoded, self.timeout)
+            return key
+
+    def store_encoded_many(self, items: Sequence[Tuple[Event, bytes]]) -> List[str]:
+        """
+        Stores several ``(event, encoded)`` pairs at once like
+        ``store_encoded``, returns their keys in the same order.
+        """
+        if self.encoded_inner is None:
+            return self.store_many([event for event, _ in items])
+
+        with sentry_sdk.start_span(op="eventstore.processing.store_encoded_many"):
+            keys = [cache_key_for_event(event) for event, _ in items]
+            self.encoded_inner.set_many(
+                {key: encoded for key, (_, encoded) in zip(keys, items)}, self.timeout
+            )
+            return keys
+
     def get(self, key: str, unprocessed: bool = False) -> Optional[Event]:
         with sentry_sdk.start_span(op="eventstore.processing.get"):
             if unprocessed:
                 key = self.__get_unprocessed_key(key)
             return self.inner.get(key)
 
+    def get_many(self, keys: Sequence[str], unprocessed: bool = False) -> Dict[str, Event]:
+        """
+        Returns a mapping of the given keys to their events, keys of events
+        that are missing from the store are left out.
+        """
+        with sentry_sdk.start_span(op="eventstore.processing.get_many"):
+            if not unprocessed:
+                return dict(self.inner.get_many(keys))
+
+            keys_by_unprocessed_key = {self.__get_unprocessed_key(key): key for key in keys}
+            return {
+                keys_by_unprocessed_key[unprocessed_key]: event
+                for unprocessed_key, event in self.inner.get_many(list(keys_by_unprocessed_key))
+            }
+
     def delete_by_key(self, key: str) -> None:
         with sentry_sdk.start_span(op="eventstore.processing.delete_by_key"):
-            self.inner.delete(key)
-            self.inner.delete(self.__get_unprocessed_key(key))
+            self.inner.delete_many([key, self.__get_unprocessed_key(key)])
+
+    def delete_many(self, keys: Sequence[str]) -> None:
+        with sentry_sdk.start_span(op="eventstore.processing.delete_many"):
+            self.inner.delete_many([*keys, *(self.__get_unprocessed_key(key) for key in keys)])
 
     def delete(self, event: Event) -> None:
         key = cache_key_for_event(event)
@@ -1,4 +1,5 @@
 from sentry.cache import default_cache
+from sentry.cache.redis import CommonRedisCache
 from sentry.utils.kvstore.cache import CacheKVStorage
 
 from .base import EventProcessingStore
@@ -9,4 +10,9 @@ def DefaultEventProcessingStore() -> EventProcessingStore:
     Creates an instance of the processing store which uses the
     ``default_cache`` as its backend.
     """
-    return EventProcessingStore(CacheKVStorage(default_cache))
+    # Only the Redis caches are known to store values as JSON.
+    encoded_inner = None
+    if isinstance(default_cache, CommonRedisCache):
+        encoded_inner = CacheKVStorage(default_cache, raw=True)
+
+    return EventProcessingStore(CacheKVStorage(default_cache), encoded_inner=encoded_inner)
@@ -11,4 +11,7 @@ def RedisClusterEventProcessingStore(**options) -> EventProcessingStore:
 
     Keyword argument are forwarded to the ``RedisClusterCache`` constructor.
     """
-    return EventProcessingStore(CacheKVStorage(RedisClusterCache(**options)))
+    cache = RedisClusterCache(**options)
+    return EventProcessingStore(
+        CacheKVStorage(cache), encoded_inner=CacheKVStorage(cache, raw=True)
+    )
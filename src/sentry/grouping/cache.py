@@ -0,0 +1,143 @@
+"""
+Cache for the hashes of events whose grouping inputs have been seen before.
+
+During spikes most events of an issue carry byte-identical stack traces, and
+recomputing their grouping components is wasted work. Hashes are looked up by
+a digest of everything grouping depends on, first in a process-local LRU and
+then, if ``grouping.hash-cache.shared-ttl`` is set, in the shared cache.
+"""
+import threading
+from typing import Any, Mapping, Optional, Tuple
+
+from cachetools import LRUCache
+
+from sentry import options
+from sentry.grouping.result import CalculatedHashes
+from sentry.grouping.strategies.configurations import CONFIGURATIONS
+from sentry.utils import json, metrics
+from sentry.utils.cache import cache
+from sentry.utils.hashlib import md5_text
+
+# Interfaces that grouping strategies are defined for.
+GROUPING_INTERFACES = (
+    "exception",
+    "stacktrace",
+    "threads",
+    "logentry",
+    "template",
+    "csp",
+    "hpkp",
+    "expectct",
+    "expectstaple",
+)
+
+# Frame attributes that never contribute to grouping and are left out of the digest.
+IGNORED_FRAME_KEYS = frozenset(["vars", "pre_context", "post_context"])
+
+LOCAL_CACHE_SIZE = 10000
+CACHE_KEY_PREFIX = "grouping-hashes:"
+
+_digest_encoder = json.JSONEncoder(separators=(",", ":"), sort_keys=True, ignore_nan=True)
+
+_local_cache: LRUCache = LRUCache(maxsize=LOCAL_CACHE_SIZE)
+_local_cache_lock = threading.Lock()
+
+
+def _strip_frames(value):
+    if isinstance(value, dict):
+        return {
+            k: _strip_frame_list(v) if k == "frames" else _strip_frames(v) for k, v in value.items()
+        }
+    if isinstance(value, list):
+        return [_strip_frames(v) for v in value]
+    return value
+
+
+def _strip_frame_list(frames):
+    if not isinstance(frames, list):
+        return frames
+    return [
+        {k: v for k, v in frame.items() if k not in IGNORED_FRAME_KEYS}
+        if isinstance(frame, dict)
+        else frame
+        for frame in frames
+    ]
+
+
+def get_grouping_input_digest(
+    event_data: Mapping[str, Any], config: Mapping[str, Any]
+) -> Optional[str]:
+    """
+    Returns a digest of the grouping config, platform and grouping interfaces
+    of an event, or ``None`` if its hashes depend on anything else.
+
+    Server-side fingerprinting rules have already been applied to the event at
+    this point, so only events with the default fingerprint are cacheable.
+    """
+    if config.get("id") not in CONFIGURATIONS or event_data.get("checksum"):
+        return None
+
+    fingerprint = event_data.get("fingerprint") or ["{{ default }}"]
+    if list(fingerprint) != ["{{ default }}"]:
+        return None
+
+    interfaces = {
+        key: _strip_frames(event_data[key]) for key in GROUPING_INTERFACES if event_data.get(key)
+    }
+    payload = _digest_encoder.encode(
+        [config["id"], config.get("enhancements"), event_data.get("platform"), interfaces]
+    )
+    return md5_text(payload).hexdigest()
+
+
+def get_cached_hashes(digest: str) -> Optional[Tuple[CalculatedHashes, Optional[int]]]:
+    """
+    Returns the hashes and the ``main_exception_id`` grouping wrote to the
+    event when the hashes were calculated.
+    """
+    with _local_cache_lock:
+        rv = _local_cache.get(digest)
+
+    if rv is not None:
+        metrics.incr("grouping.hash_cache", tags={"result": "local"})
+    elif options.get("grouping.hash-cache.shared-ttl"):
+        rv = cache.get(CACHE_KEY_PREFIX + digest)
+        if rv is not None:
+            with _local_cache_lock:
+                _local_cache[digest] = rv
+            metrics.incr("grouping.hash_cache", tags={"result": "shared"})
+
+    if rv is None:
+        metrics.incr("grouping.hash_cache", tags={"result": "miss"})
+        return None
+
+    return (
+        CalculatedHashes(
+            hashes=list(rv["hashes"]),
+            hierarchical_hashes=list(rv["hierarchical_hashes"]),
+            tree_labels=list(rv["tree_labels"]),
+        ),
+        rv["main_exception_id"],
+    )
+
+
+def set_cached_hashes(
+    digest: str, hashes: CalculatedHashes, main_exception_id: Optional[int] = None
+) -> None:
+    rv = {
+        "hashes": list(hashes.hashes),
+        "hierarchical_hashes": list(hashes.hierarchical_hashes),
+        "tree_labels": list(hashes.tree_labels),
+        "main_exception_id": main_exception_id,
+    }
+    with _local_cache_lock:
+        _local_cache[digest] = rv
+
+    ttl = options.get("grouping.hash-cache.shared-ttl")
+    if ttl:
+        cache.set(CACHE_KEY_PREFIX + digest, rv, ttl)
+
+
+def clear_local_cache() -> None:
+    with _local_cache_lock:
+        _local_cache.clear()
@@ -1,6 +1,7 @@
 import base64
 import os
 import zlib
+from functools import lru_cache
 
 import msgpack
 from parsimonious.exceptions import ParseError
@@ -70,6 +71,11 @@ _        = space*
 VERSIONS = [1, 2]
 LATEST_VERSION = VERSIONS[-1]
 
+# Number of deserialized enhancement configs kept around by ``Enhancements.loads``.
+LOADS_CACHE_SIZE = 100
+# Number of frame field values whose matcher results are remembered per rule set.
+MATCH_CACHE_SIZE = 10000
+
 
 class StacktraceState:
     def __init__(self):
@@ -113,8 +119,10 @@ class Enhancements:
             bases = []
         self.bases = bases
 
-        self._modifier_rules = [rule for rule in self.iter_rules() if rule.is_modifier]
-        self._updater_rules = [rule for rule in self.iter_rules() if rule.is_updater]
+        self._modifier_rules = CompiledRules(
+            [rule for rule in self.iter_rules() if rule.is_modifier], modifies_frames=True
+        )
+        self._updater_rules = CompiledRules([rule for rule in self.iter_rules() if rule.is_updater])
 
     def apply_modifications_to_frame(self, frames, platform, exception_data):
         """This applies the frame modifications to the frames itself.  This
@@ -125,10 +133,10 @@ class Enhancements:
 
         match_frames = [create_match_frame(frame, platform) for frame in frames]
 
-        for rule in self._modifier_rules:
-            for idx, action in rule.get_matching_frame_actions(
-                match_frames, platform, exception_data, cache
-            ):
+        for rule, actions in self._modifier_rules.iter_matching_frame_actions(
+            match_frames, platform, exception_data, cache
+        ):
+            for idx, action in actions:
                 action.apply_modifications_to_frame(frames, match_frames, idx, rule=rule)
 
     def update_frame_components_contributions(self, components, frames, platform, exception_data):
@@ -139,11 +147,10 @@ class Enhancements:
 
         stacktrace_state = StacktraceState()
         # Apply direct frame actions and update the stack state alongside
-        for rule in self._updater_rules:
-
-            for idx, action in rule.get_matching_frame_actions(
-                match_frames, platform, exception_data, cache
-            ):
+        for rule, actions in self._updater_rules.iter_matching_frame_actions(
+            match_frames, platform, exception_data, cache
+        ):
+            for idx, action in actions:
                 action.update_frame_components_contributions(components, frames, idx, rule=rule)
                 action.modify_stacktrace_state(stacktrace_state, rule)
 
@@ -248,7 +255,11 @@ class Enhancements:
         )
 
     @classmethod
+    @lru_cache(maxsize=LOADS_CACHE_SIZE)
     def loads(cls, data):
+        """Deserializes a config from ``dumps``. Instances are shared between
+        callers loading the same config, so they must not be modified.
+        """
         if isinstance(data, str):
             data = data.encode("ascii", "ignore")
         padded = data + b"=" * (4 - (len(data) % 4))
@@ -351,6 +362,107 @@ class Rule:
         )
 
 
+class CompiledRules:
+    """A list of rules compiled for matching against many stack traces.
+
+    Frame matchers are indexed by the match frame field they look at, and the
+    results of all matchers for a field value are stored as a bitmask which
+    is kept across stack traces. A frame then matches a rule if its combined
+    mask (and those of its caller and callee) contain all bits of the rule.
+    """
+
+    def __init__(self, rules, modifies_frames=False):
+        self.rules = rules
+        self.modifies_frames = modifies_frames
+        self._matchers_by_field = {}
+        bits = {}
+        self._compiled = [self._compile_rule(rule, bits) for rule in rules]
+        self._masks = {}
+
+    def _compile_rule(self, rule, bits):
+        """Returns ``(rule, frame_mask, caller_mask, callee_mask)``. The masks
+        are ``None`` for rules which need to be evaluated by the rule itself.
+        """
+        masks = [0, 0, 0]
+        for matcher in rule._other_matchers:
+            if isinstance(matcher, CallerMatch):
+                pos, matcher = 1, matcher.caller
+            elif isinstance(matcher, CalleeMatch):
+                pos, matcher = 2, matcher.caller
+            else:
+                pos = 0
+            if not isinstance(matcher, FrameMatch) or isinstance(matcher, ExceptionFieldMatch):
+                return rule, None, None, None
+            bit = bits.get(matcher)
+            if bit is None:
+                bit = bits[matcher] = 1 << len(bits)
+                self._matchers_by_field.setdefault(matcher.field, []).append((bit, matcher))
+            masks[pos] |= bit
+        return (rule, *masks)
+
+    def get_frame_masks(self, match_frames):
+        masks = self._masks
+        rv = []
+        for match_frame in match_frames:
+            frame_mask = 0
+            for field, matchers in self._matchers_by_field.items():
+                value = match_frame[field]
+                mask = masks.get((field, value))
+                if mask is None:
+                    mask = 0
+                    cache = {}
+                    for bit, matcher in matchers:
+                        if matcher.matches_value(value, cache):
+                            mask |= bit
+                    if len(masks) >= MATCH_CACHE_SIZE:
+                        masks.clear()
+                    masks[field, value] = mask
+                frame_mask |= mask
+            rv.append(frame_mask)
+        return rv
+
+    def iter_matching_frame_actions(self, match_frames, platform, exception_data, cache):
+        """Yields ``(rule, [(idx, action), ...])`` for every matching rule, in
+        order. If the rules modify frames, the consumer may update the match
+        frames before resuming iteration.
+        """
+        frame_masks = self.get_frame_masks(match_frames)
+        last_idx = len(match_frames) - 1
+
+        for rule, mask, caller_mask, callee_mask in self._compiled:
+            if mask is None:
+                actions = rule.get_matching_frame_actions(
+                    match_frames, platform, exception_data, cache
+                )
+            elif not rule.matchers or not all(
+                m.matches_frame(match_frames, None, platform, exception_data, cache)
+                for m in rule._exception_matchers
+            ):
+                continue
+            else:
+                actions = [
+                    (idx, action)
+                    for idx, frame_mask in enumerate(frame_masks)
+                    if frame_mask & mask == mask
+                    and (
+                        not caller_mask
+                        or idx > 0
+                        and frame_masks[idx - 1] & caller_mask == caller_mask
+                    )
+                    and (
+                        not callee_mask
+                        or idx < last_idx
+                        and frame_masks[idx + 1] & callee_mask == callee_mask
+                    )
+                    for action in rule.actions
+                ]
+
+            if actions:
+                yield rule, actions
+                if self.modifies_frames:
+                    frame_masks = self.get_frame_masks(match_frames)
+
+
 class EnhancmentsVisitor(NodeVisitor):
     visit_comment = visit_empty = lambda *a: None
     unwrapped_exceptions = (InvalidEnhancerConfig,)
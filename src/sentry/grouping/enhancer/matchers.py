@@ -1,3 +1,4 @@
+import re
 from typing import Optional
 
 from sentry.grouping.utils import get_rule_bool
@@ -172,7 +173,17 @@ class FrameMatch(Match):
             rv = not rv
         return rv
 
+    def matches_value(self, value, cache):
+        """Matches the value of ``field`` of a match frame directly."""
+        rv = self._positive_value_match(value, cache)
+        if self.negated:
+            rv = not rv
+        return rv
+
     def _positive_frame_match(self, match_frame, platform, exception_data, cache):
+        return self._positive_value_match(match_frame[self.field], cache)
+
+    def _positive_value_match(self, value, cache):
         # Implement is subclasses
         raise NotImplementedError
 
@@ -202,8 +213,7 @@ class PathLikeMatch(FrameMatch):
     def __init__(self, key, pattern, negated=False):
         super().__init__(key, pattern.lower(), negated)
 
-    def _positive_frame_match(self, match_frame, platform, exception_data, cache):
-        value = match_frame[self.field]
+    def _positive_value_match(self, value, cache):
         if value is None:
             return False
 
@@ -221,48 +231,70 @@ class PathMatch(PathLikeMatch):
 
 
 class FamilyMatch(FrameMatch):
+
+    field = "family"
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._flags = set(self._encoded_pattern.split(b","))
 
-    def _positive_frame_match(self, match_frame, platform, exception_data, cache):
+    def _positive_value_match(self, value, cache):
         if b"all" in self._flags:
             return True
 
-        return match_frame["family"] in self._flags
+        return value in self._flags
 
 
 class InAppMatch(FrameMatch):
+
+    field = "in_app"
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._ref_val = get_rule_bool(self.pattern)
 
-    def _positive_frame_match(self, match_frame, platform, exception_data, cache):
+    def _positive_value_match(self, value, cache):
         ref_val = self._ref_val
-        return ref_val is not None and ref_val == match_frame["in_app"]
+        return ref_val is not None and ref_val == value
 
 
-class FunctionMatch(FrameMatch):
-    def _positive_frame_match(self, match_frame, platform, exception_data, cache):
+_GLOB_SPECIAL_RE = re.compile(rb"[*?\[\\{]")
 
-        return cached(cache, glob_match, match_frame["function"], self._encoded_pattern)
 
+def get_literal_prefix(pattern):
+    """Returns the part of a glob pattern before its first wildcard or escape."""
+    match = _GLOB_SPECIAL_RE.search(pattern)
+    return pattern[: match.start()] if match else pattern
 
-class FrameFieldMatch(FrameMatch):
-    def _positive_frame_match(self, match_frame, platform, exception_data, cache):
-        field = match_frame[self.field]
-        if field is None:
+
+class GlobMatch(FrameMatch):
+    """
+    Matches a frame field with a glob. Values that do not start with the
+    literal prefix of the pattern are rejected before the glob is evaluated.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._literal_prefix = get_literal_prefix(self._encoded_pattern)
+
+    def _positive_value_match(self, value, cache):
+        if value is None or not value.startswith(self._literal_prefix):
             return False
 
-        return cached(cache, glob_match, field, self._encoded_pattern)
+        return cached(cache, glob_match, value, self._encoded_pattern)
+
+
+class FunctionMatch(GlobMatch):
+
+    field = "function"
 
 
-class ModuleMatch(FrameFieldMatch):
+class ModuleMatch(GlobMatch):
 
     field = "module"
 
 
-class CategoryMatch(FrameFieldMatch):
+class CategoryMatch(GlobMatch):
 
     field = "category"
 
@@ -22,7 +22,7 @@ import sentry_sdk
 from django.conf import settings
 from django.core.cache import cache
 
-from sentry import eventstore, features
+from sentry import eventstore, features, options
 from sentry.attachments import CachedAttachment, attachment_cache
 from sentry.event_manager import save_attachment
 from sentry.eventstore.processing import event_processing_store
@@ -31,7 +31,11 @@ from sentry.ingest.userreport import Conflict, save_userreport
 from sentry.killswitches import killswitch_matches_context
 from sentry.models import Project
 from sentry.signals import event_accepted
-from sentry.tasks.store import preprocess_event, save_event_transaction
+from sentry.tasks.store import (
+    preprocess_event,
+    save_event_transaction,
+    save_event_transaction_batch,
+)
 from sentry.utils import json, metrics
 from sentry.utils.batching_kafka_consumer import AbstractBatchWorker
 from sentry.utils.cache import cache_key_for_event
@@ -95,6 +99,13 @@ class IngestConsumerWorker(AbstractBatchWorker):
             ]
         ] = []
 
+        # Without an executor, events can be stored in the processing store
+        # together instead of one by one.
+        event_messages: MutableSequence[Message] = []
+        batch_event_writes = self.__process_event_executor is None and options.get(
+            "store.ingest-consumer.batch-processing-store-writes"
+        )
+
         projects_to_fetch = set()
 
         with metrics.timer("ingest_consumer.prepare_messages"):
@@ -103,7 +114,10 @@ class IngestConsumerWorker(AbstractBatchWorker):
                 projects_to_fetch.add(message["project_id"])
 
                 if message_type == "event":
-                    other_messages.append((self.__process_event, message))
+                    if batch_event_writes:
+                        event_messages.append(message)
+                    else:
+                        other_messages.append((self.__process_event, message))
                 elif message_type == "attachment_chunk":
                     attachment_chunks.append(message)
                 elif message_type == "attachment":
@@ -122,9 +136,25 @@ class IngestConsumerWorker(AbstractBatchWorker):
         if attachment_chunks:
             # attachment_chunk messages need to be processed before attachment/event messages.
             with metrics.timer("ingest_consumer.process_attachment_chunk_batch"):
+                attachment_chunks = assemble_attachment_chunks(
+                    attachment_chunks,
+                    [*event_messages, *(message for _, message in other_messages)],
+                )
                 for attachment_chunk in attachment_chunks:
                     process_attachment_chunk(attachment_chunk)
 
+        if event_messages:
+            with metrics.timer("ingest_consumer.process_event_batch"):
+                events_with_projects = []
+                for message in event_messages:
+                    project_id = int(message["project_id"])
+                    try:
+                        events_with_projects.append((message, projects[project_id]))
+                    except KeyError:
+                        logger.error("Project for ingested event does not exist: %s", project_id)
+
+                process_event_batch(events_with_projects)
+
         if other_messages:
             with metrics.timer("ingest_consumer.process_other_messages_batch"):
                 other_messages_flush_start = time.monotonic()
@@ -188,7 +218,57 @@ def _do_process_event(message: Message, project: Project) -> None:
         return
 
     data, callback = result
-    callback(_store_event(data))
+    callback(_store_event(data, message.get("payload")))
+
+
+@trace_func(name="ingest_consumer.process_event_batch")
+@metrics.wraps("ingest_consumer.process_event_batch")
+def process_event_batch(messages: Sequence[Tuple[Message, Project]]) -> None:
+    """
+    Processes several events like ``process_event``, but writes all of them to
+    the processing store at once before dispatching their tasks.
+    """
+    loaded_events = []
+    seen_event_ids = set()
+    for message, project in messages:
+        # Duplicates are otherwise only detected once the first event has been
+        # dispatched, which now happens after the whole batch has been loaded.
+        event_id = (int(message["project_id"]), message["event_id"])
+        if event_id in seen_event_ids:
+            metrics.incr("ingest_consumer.process_event_batch.duplicate")
+            continue
+        seen_event_ids.add(event_id)
+
+        result = _load_event(message, project)
+        if result is not None:
+            data, callback = result
+            loaded_events.append((data, message.get("payload"), callback))
+
+    if not loaded_events:
+        return
+
+    cache_keys = _store_events([(data, payload) for data, payload, _ in loaded_events])
+
+    if not options.get("store.ingest-consumer.batch-save-transactions"):
+        for (_, _, callback), cache_key in zip(loaded_events, cache_keys):
+            callback(cache_key)
+        return
+
+    # Transactions of the same project are saved together.
+    transactions: MutableMapping[int, MutableSequence[Mapping[str, Any]]] = {}
+
+    def save_transaction(
+        cache_key: str, start_time: float, event_id: str, project_id: int, **kwargs: Any
+    ) -> None:
+        transactions.setdefault(project_id, []).append(
+            {"cache_key": cache_key, "start_time": start_time, "event_id": event_id}
+        )
+
+    for (_, _, callback), cache_key in zip(loaded_events, cache_keys):
+        callback(cache_key, save_transaction=save_transaction)
+
+    for project_id, events in transactions.items():
+        save_event_transaction_batch.delay(project_id=project_id, events=events)
 
 
 def process_event_async(
@@ -200,20 +280,22 @@ def process_event_async(
 
     data, callback = result
     return AsyncResult(
-        executor.submit(_store_event, data),
+        executor.submit(_store_event, data, message.get("payload")),
         lambda future: callback(future.result()),
     )
 
 
-def _load_event(message: Message, project: Project) -> Optional[Tuple[Any, Callable[[str], None]]]:
+def _load_event(
+    message: Message, project: Project
+) -> Optional[Tuple[Any, Callable[..., None]]]:
     """
     Perform some initial filtering and deserialize the message payload. If the
     event should be stored, the deserialized payload is returned along with a
     function that can be called with the event's storage key to resume
     processing after the event has been persisted and is available to be read by
-    other processing components.
+    other processing components. That function spawns ``save_event_transaction``
+    for transactions unless another ``save_transaction`` function is given.
     """
-    payload = message["payload"]
     start_time = float(message["start_time"])
     event_id = message["event_id"]
     project_id = int(message["project_id"])
@@ -263,10 +345,13 @@ def _load_event(message: Message, project: Project) -> Optional[Tuple[Any, Calla
 
     # Parse the JSON payload. This is required to compute the cache key and
     # call process_event. The payload will be put into Kafka raw, to avoid
-    # serializing it again.
+    # serializing it again. Consumers that decode messages in parallel pass
+    # the parsed payload as "data".
     # XXX: Do not use CanonicalKeyDict here. This may break preprocess_event
     # which assumes that data passed in is a raw dictionary.
-    data = json.loads(payload)
+    data = message.get("data")
+    if data is None:
+        data = json.loads(message["payload"])
 
     if project_id == settings.SENTRY_PROJECT:
         metrics.incr(
@@ -286,7 +371,9 @@ def _load_event(message: Message, project: Project) -> Optional[Tuple[Any, Calla
     ):
         return
 
-    def dispatch_task(cache_key: str) -> None:
+    def dispatch_task(
+        cache_key: str, save_transaction: Callable[..., Any] = save_event_transaction.delay
+    ) -> None:
         if attachments:
             with sentry_sdk.start_span(op="ingest_consumer.set_attachment_cache"):
                 attachment_objects = [
@@ -301,7 +388,7 @@ def _load_event(message: Message, project: Project) -> Optional[Tuple[Any, Calla
         if data.get("type") == "transaction":
             # No need for preprocess/process for transactions thus submit
             # directly transaction specific save_event task.
-            save_event_transaction.delay(
+            save_transaction(
                 cache_key=cache_key,
                 data=None,
                 start_time=start_time,
@@ -331,11 +418,89 @@ def _load_event(message: Message, project: Project) -> Optional[Tuple[Any, Calla
     return data, dispatch_task
 
 
-def _store_event(data: Any) -> str:
+def _store_event(data: Any, payload: Optional[Union[str, bytes]] = None) -> str:
     with metrics.timer("ingest_consumer._store_event"):
+        # The payload is the JSON encoding of the event, avoid encoding the
+        # parsed event again if the processing store can take it as-is.
+        if payload is not None and options.get("store.ingest-consumer.raw-payload-handoff"):
+            if isinstance(payload, str):
+                payload = payload.encode("utf8")
+            return event_processing_store.store_encoded(data, payload)
         return event_processing_store.store(data)
 
 
+def _store_events(events: Sequence[Tuple[Any, Optional[Union[str, bytes]]]]) -> Sequence[str]:
+    """
+    Stores ``(data, payload)`` pairs like ``_store_event`` with one
+    round-trip per processing store node, returns their keys in order.
+    """
+    with metrics.timer("ingest_consumer._store_events"):
+        if options.get("store.ingest-consumer.raw-payload-handoff") and all(
+            payload is not None for _, payload in events
+        ):
+            return event_processing_store.store_encoded_many(
+                [
+                    (data, payload.encode("utf8") if isinstance(payload, str) else payload)
+                    for data, payload in events
+                ]
+            )
+        return event_processing_store.store_many([data for data, _ in events])
+
+
+def assemble_attachment_chunks(
+    attachment_chunks: Sequence[Message], messages: Sequence[Message]
+) -> Sequence[Message]:
+    """
+    Concatenates the chunks of attachments that arrive in the same batch as
+    all of their chunks, and attaches the data to the attachment in the owning
+    event or attachment message. Those attachments are then written to the
+    attachment cache (or, for individual attachments, straight to filestore)
+    at once instead of being written and read back chunk by chunk.
+
+    Returns the chunks that still need to be written to the attachment cache.
+    """
+    chunks_by_attachment: MutableMapping[Tuple[int, str, str], MutableMapping[int, bytes]] = {}
+    for chunk in attachment_chunks:
+        key = (chunk["project_id"], chunk["event_id"], chunk["id"])
+        chunks_by_attachment.setdefault(key, {})[chunk["chunk_index"]] = chunk["payload"]
+
+    assembled = set()
+    for message in messages:
+        if message["type"] == "attachment":
+            attachments: Sequence[MutableMapping[str, Any]] = (message["attachment"],)
+        elif message["type"] == "event":
+            attachments = message.get("attachments") or ()
+        else:
+            continue
+
+        for attachment in attachments:
+            key = (message["project_id"], message["event_id"], attachment.get("id"))
+            chunks = chunks_by_attachment.get(key)
+            num_chunks = attachment.get("chunks")
+            if not chunks or num_chunks is None or len(chunks) != num_chunks:
+                continue
+            if any(chunk_index not in chunks for chunk_index in range(num_chunks)):
+                continue
+
+            attachment["data"] = b"".join(chunks[chunk_index] for chunk_index in range(num_chunks))
+            attachment["chunks"] = None
+            assembled.add(key)
+
+    if not assembled:
+        return attachment_chunks
+
+    remaining = [
+        chunk
+        for chunk in attachment_chunks
+        if (chunk["project_id"], chunk["event_id"], chunk["id"]) not in assembled
+    ]
+    metrics.incr(
+        "ingest_consumer.attachment_chunks_assembled",
+        amount=len(attachment_chunks) - len(remaining),
+    )
+    return remaining
+
+
 @trace_func(name="ingest_consumer.process_attachment_chunk")
 @metrics.wraps("ingest_consumer.process_attachment_chunk")
 def process_attachment_chunk(message: Message) -> None:
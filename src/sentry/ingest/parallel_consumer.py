@@ -0,0 +1,183 @@
+"""
+Arroyo-based ingest consumer.
+
+Messages are decoded in a pool of subprocesses, collected into batches grouped
+by project and then processed on the main thread, one project at a time, the
+same way ``IngestConsumerWorker`` processes a batch. Offsets are only committed once the
+batch containing them has been processed, and the multiprocessing step rejects
+messages (pausing the consumer) while its input buffers are full.
+
+This module must not read Django settings at import time, as its functions are
+run in subprocesses.
+"""
+import functools
+import logging
+from typing import Any, Mapping, MutableMapping, MutableSequence, Optional
+
+import msgpack
+from arroyo import Topic
+from arroyo.backends.kafka import KafkaConsumer, KafkaPayload, build_kafka_consumer_configuration
+from arroyo.commit import ONCE_PER_SECOND
+from arroyo.processing import StreamProcessor
+from arroyo.processing.strategies import (
+    CommitOffsets,
+    ProcessingStrategy,
+    ProcessingStrategyFactory,
+    RunTask,
+    RunTaskWithMultiprocessing,
+)
+from arroyo.processing.strategies.reduce import Reduce
+from arroyo.types import BaseValue, Commit, Message, Partition
+
+from sentry.snuba.utils import initialize_consumer_state
+
+logger = logging.getLogger(__name__)
+
+IngestMessage = MutableMapping[str, Any]
+ProjectBatch = MutableMapping[int, MutableSequence[IngestMessage]]
+
+
+def get_ingest_parallel_consumer(
+    consumer_type: str,
+    group_id: str,
+    auto_offset_reset: str,
+    strict_offset_reset: bool,
+    max_batch_size: int,
+    max_batch_time: int,
+    processes: int,
+    input_block_size: int,
+    output_block_size: int,
+    parse_payloads: bool = False,
+    force_topic: Optional[str] = None,
+    force_cluster: Optional[str] = None,
+) -> StreamProcessor[KafkaPayload]:
+    """
+    Handles events coming via a kafka queue, see ``get_ingest_consumer``.
+
+    :param max_batch_time: Maximum time to wait before flushing a batch, in
+        milliseconds.
+    """
+    from django.conf import settings
+
+    from sentry.ingest.types import ConsumerType
+    from sentry.utils.batching_kafka_consumer import create_topics
+    from sentry.utils.kafka_config import get_kafka_consumer_cluster_options
+
+    if bool(force_topic) != bool(force_cluster):
+        raise ValueError(
+            "Both 'force_topic' and 'force_cluster' have to be provided to override the configuration"
+        )
+
+    topic_name = force_topic or ConsumerType.get_topic_name(consumer_type)
+    cluster_name = force_cluster or settings.KAFKA_TOPICS[topic_name]["cluster"]
+    create_topics(cluster_name, [topic_name])
+
+    consumer = KafkaConsumer(
+        build_kafka_consumer_configuration(
+            get_kafka_consumer_cluster_options(cluster_name),
+            auto_offset_reset=auto_offset_reset,
+            group_id=group_id,
+            strict_offset_reset=strict_offset_reset,
+        )
+    )
+
+    return StreamProcessor(
+        consumer,
+        Topic(topic_name),
+        IngestStrategyFactory(
+            max_batch_size=max_batch_size,
+            max_batch_time=max_batch_time / 1000,
+            processes=processes,
+            input_block_size=input_block_size,
+            output_block_size=output_block_size,
+            parse_payloads=parse_payloads,
+        ),
+        ONCE_PER_SECOND,
+    )
+
+
+class IngestStrategyFactory(ProcessingStrategyFactory[KafkaPayload]):
+    """
+    Builds the ingest consumer pipeline:
+
+    - messages are decoded, in ``processes`` subprocesses if more than one
+      process is requested. With ``parse_payloads``, the JSON payload of events
+      is parsed there as well. This is off by default, as the parsed event has
+      to be pickled back to the main process, which is not necessarily cheaper
+      than parsing it there. ``test_benchmark_ingest_consumer`` compares both.
+    - decoded messages are collected into batches of at most
+      ``max_batch_size`` messages or ``max_batch_time`` seconds, grouped by
+      project.
+    - batches are processed in order on the main thread, one project at a
+      time, after which their offsets are committed.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int,
+        max_batch_time: float,
+        processes: int,
+        input_block_size: int,
+        output_block_size: int,
+        parse_payloads: bool = False,
+    ):
+        from sentry.ingest.ingest_consumer import IngestConsumerWorker
+
+        super().__init__()
+        self.max_batch_size = max_batch_size
+        self.max_batch_time = max_batch_time
+        self.num_processes = processes
+        self.input_block_size = input_block_size
+        self.output_block_size = output_block_size
+        self.decode = functools.partial(decode_message, parse_payloads=parse_payloads)
+        self.worker = IngestConsumerWorker()
+
+    def create_with_partitions(
+        self,
+        commit: Commit,
+        partitions: Mapping[Partition, int],
+    ) -> ProcessingStrategy[KafkaPayload]:
+        collect_step: Reduce[IngestMessage, ProjectBatch] = Reduce(
+            self.max_batch_size,
+            self.max_batch_time,
+            accumulate_by_project,
+            dict,
+            RunTask(self.flush_batch, CommitOffsets(commit)),
+        )
+
+        if self.num_processes <= 1:
+            return RunTask(self.decode, collect_step)
+
+        return RunTaskWithMultiprocessing(
+            self.decode,
+            collect_step,
+            self.num_processes,
+            self.max_batch_size,
+            self.max_batch_time,
+            self.input_block_size,
+            self.output_block_size,
+            initializer=initialize_consumer_state,
+        )
+
+    def flush_batch(self, message: Message[ProjectBatch]) -> None:
+        for batch in message.payload.values():
+            self.worker.flush_batch(batch)
+
+
+def decode_message(message: Message[KafkaPayload], parse_payloads: bool = False) -> IngestMessage:
+    """
+    Decodes an ingest message. With ``parse_payloads``, the JSON payload of
+    events is parsed as well and passed on as ``data``.
+    """
+    rv: IngestMessage = msgpack.unpackb(message.payload.value, use_list=False)
+    if parse_payloads and rv["type"] == "event":
+        from sentry.utils import json
+
+        rv["data"] = json.loads(rv["payload"])
+    return rv
+
+
+def accumulate_by_project(batch: ProjectBatch, value: BaseValue[IngestMessage]) -> ProjectBatch:
+    ingest_message = value.payload
+    batch.setdefault(int(ingest_message["project_id"]), []).append(ingest_message)
+    return batch
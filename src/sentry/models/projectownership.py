@@ -15,6 +15,7 @@ from sentry.ownership.grammar import Rule, load_schema, resolve_actors
 from sentry.types.activity import ActivityType
 from sentry.utils import metrics
 from sentry.utils.cache import cache
+from sentry.utils.worker_cache import post_process_cache
 
 if TYPE_CHECKING:
     from sentry.models import ProjectCodeOwners, Team
@@ -83,15 +84,19 @@ class ProjectOwnership(Model):
         See the post_save and post_delete signals below for additional
         cache updates.
         """
-        cache_key = cls.get_cache_key(project_id)
-        ownership = cache.get(cache_key)
-        if ownership is None:
-            try:
-                ownership = cls.objects.get(project_id=project_id)
-            except cls.DoesNotExist:
-                ownership = False
-            cache.set(cache_key, ownership, READ_CACHE_DURATION)
-        return ownership or None
+
+        def fetch():
+            cache_key = cls.get_cache_key(project_id)
+            ownership = cache.get(cache_key)
+            if ownership is None:
+                try:
+                    ownership = cls.objects.get(project_id=project_id)
+                except cls.DoesNotExist:
+                    ownership = False
+                cache.set(cache_key, ownership, READ_CACHE_DURATION)
+            return ownership
+
+        return post_process_cache.get(("project", project_id), "ownership", fetch) or None
 
     @classmethod
     def get_owners(
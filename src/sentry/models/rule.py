@@ -15,6 +15,7 @@ from sentry.db.models import (
 from sentry.db.models.fields.hybrid_cloud_foreign_key import HybridCloudForeignKey
 from sentry.db.models.manager import BaseManager
 from sentry.utils.cache import cache
+from sentry.utils.worker_cache import post_process_cache
 
 
 # TODO(dcramer): pull in enum library
@@ -76,12 +77,15 @@ class Rule(Model):
 
     @classmethod
     def get_for_project(cls, project_id):
-        cache_key = f"project:{project_id}:rules"
-        rules_list = cache.get(cache_key)
-        if rules_list is None:
-            rules_list = list(cls.objects.filter(project=project_id, status=RuleStatus.ACTIVE))
-            cache.set(cache_key, rules_list, 60)
-        return rules_list
+        def fetch():
+            cache_key = f"project:{project_id}:rules"
+            rules_list = cache.get(cache_key)
+            if rules_list is None:
+                rules_list = list(cls.objects.filter(project=project_id, status=RuleStatus.ACTIVE))
+                cache.set(cache_key, rules_list, 60)
+            return rules_list
+
+        return post_process_cache.get(("project", project_id), "rules", fetch)
 
     @property
     def created_by_id(self):
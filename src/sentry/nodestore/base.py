@@ -1,10 +1,20 @@
+from collections import OrderedDict
+from contextlib import contextmanager
 from threading import local
 
 import sentry_sdk
+from django.conf import settings
 from django.core.cache import InvalidCacheBackendError, caches
 
+from sentry.nodestore.compression import (
+    ZSTD_MAGIC,
+    CompressionDictionaries,
+    DictionaryNotFound,
+    get_dictionary_id,
+)
 from sentry.utils import json
 from sentry.utils.cache import memoize
+from sentry.utils.codecs import ZstdCodec
 from sentry.utils.services import Service
 
 # Cache an instance of the encoder we want to use
@@ -22,6 +32,52 @@ json_dumps = json.JSONEncoder(
 
 json_loads = json._default_decoder.decode
 
+# Upper bound for the encoded size of all nodes held by a single ``local_cache`` block.
+DEFAULT_MEMO_BYTES = 32 * 1024 * 1024
+
+
+class NodeMemo:
+    """
+    Encoded nodes fetched within a single request or task, bounded by their
+    total size and evicted in LRU order.
+
+    Payloads are kept encoded so that every read hands out a fresh object
+    which callers are free to mutate, just like a read from the backend.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        # id -> encoded payload
+        self.items = OrderedDict()
+        # ids that should be fetched together with the next read
+        self.pending = OrderedDict()
+
+    def get_many(self, id_list):
+        rv = {}
+        for id in id_list:
+            value = self.items.get(id)
+            if value is not None:
+                self.items.move_to_end(id)
+                rv[id] = value
+        return rv
+
+    def set(self, id, value):
+        self.discard(id)
+        if len(value) > self.max_bytes:
+            return
+        self.items[id] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self.items.popitem(last=False)
+            self.size -= len(evicted)
+
+    def discard(self, id):
+        value = self.items.pop(id, None)
+        if value is not None:
+            self.size -= len(value)
+        self.pending.pop(id, None)
+
 
 class NodeStorage(local, Service):
     """
@@ -65,11 +121,49 @@ class NodeStorage(local, Service):
         "get_multi",
         "set",
         "set_subkeys",
+        "set_subkeys_multi",
         "cleanup",
         "validate",
         "bootstrap",
+        "local_cache",
+        "prefetch",
     )
 
+    _memo = None
+
+    @contextmanager
+    def local_cache(self, enabled=True, max_bytes=DEFAULT_MEMO_BYTES):
+        """
+        Memoize nodes read by the current thread for the duration of the
+        block, so that serializers and tasks re-reading the same events only
+        hit the backend once. Ids registered with ``prefetch`` are fetched
+        together with the next read in a single ``_get_bytes_multi`` call.
+
+        Nested blocks share the memo of the outermost one.
+
+        >>> with nodestore.local_cache():
+        >>>     nodestore.get('key1')
+        >>>     nodestore.get('key1')  # served from memory
+        """
+        if not enabled or self._memo is not None:
+            yield
+            return
+
+        self._memo = NodeMemo(max_bytes)
+        try:
+            yield
+        finally:
+            self._memo = None
+
+    def prefetch(self, id):
+        """
+        Register ``id`` to be fetched along with the next read from within a
+        ``local_cache`` block. This is a no-op outside of one.
+        """
+        memo = self._memo
+        if memo is not None and id not in memo.items:
+            memo.pending[id] = True
+
     def delete(self, id):
         """
         >>> nodestore.delete('key1')
@@ -92,6 +186,9 @@ class NodeStorage(local, Service):
         if value is None:
             return None
 
+        if value.startswith(ZSTD_MAGIC):
+            value = self._decompress(value)
+
         lines_iter = iter(value.splitlines())
         try:
             if subkey is not None:
@@ -124,6 +221,9 @@ class NodeStorage(local, Service):
         >>> nodestore.get('key1')
         {"message": "hello world"}
         """
+        if subkey is None and self._memo is not None:
+            return self.get_multi([id]).get(id)
+
         with sentry_sdk.start_span(op="nodestore.get") as span:
             span.set_tag("node_id", id)
             if subkey is None:
@@ -165,6 +265,12 @@ class NodeStorage(local, Service):
             "key2": {"message": "hello world"}
         }
         """
+        if subkey is None and self._memo is not None:
+            return self._get_multi_memoized(id_list)
+
+        return self._get_multi(id_list, subkey=subkey)
+
+    def _get_multi(self, id_list, subkey=None, encoded=None):
         with sentry_sdk.start_span(op="nodestore.get_multi") as span:
             span.set_tag("subkey", str(subkey))
             span.set_tag("num_ids", len(id_list))
@@ -179,10 +285,11 @@ class NodeStorage(local, Service):
             else:
                 uncached_ids = id_list
 
-            items = {
-                id: self._decode(value, subkey=subkey)
-                for id, value in self._get_bytes_multi(uncached_ids).items()
-            }
+            items = {}
+            for id, value in self._get_bytes_multi(uncached_ids).items():
+                items[id] = self._decode(value, subkey=subkey)
+                if encoded is not None and value:
+                    encoded[id] = value
             if subkey is None:
                 self._set_cache_items(items)
                 items.update(cache_items)  # pyright: ignore
@@ -192,6 +299,33 @@ class NodeStorage(local, Service):
 
             return items
 
+    def _get_multi_memoized(self, id_list):
+        memo = self._memo
+        items = {
+            id: self._decode(value, subkey=None) for id, value in memo.get_many(id_list).items()
+        }
+        missing = [id for id in id_list if id not in items]
+        if not missing:
+            return items
+
+        # Piggyback everything that has been prefetched onto this read.
+        missing.extend(id for id in memo.pending if id not in memo.items and id not in items)
+        missing = list(OrderedDict.fromkeys(missing))
+        memo.pending.clear()
+
+        encoded = {}
+        fetched = self._get_multi(missing, encoded=encoded)
+        for id, value in fetched.items():
+            if value is None:
+                continue
+            if id not in encoded:
+                # Values served by the cache need to be encoded again.
+                encoded[id] = json_dumps(value).encode("utf8")
+            memo.set(id, encoded[id])
+
+        items.update((id, fetched.get(id)) for id in id_list if id not in items)
+        return items
+
     def _encode(self, data):
         """
         Encode data dict in a way where its keys can be deserialized
@@ -200,13 +334,32 @@ class NodeStorage(local, Service):
 
         >>> _encode({"unprocessed": {}, None: {"stacktrace": {}}})
         b'{"stacktrace": {}}\nunprocessed\n{}'
+
+        If a compression dictionary has been trained for the platform of the
+        payload, the result is compressed with it instead.
         """
-        lines = [json_dumps(data.pop(None)).encode("utf8")]
+        payload = data.pop(None)
+        lines = [json_dumps(payload).encode("utf8")]
         for key, value in data.items():
             lines.append(key.encode("ascii"))
             lines.append(json_dumps(value).encode("utf8"))
 
-        return b"\n".join(lines)
+        rv = b"\n".join(lines)
+
+        if self.compression_dictionaries is not None and isinstance(payload, dict):
+            codec = self.compression_dictionaries.get_codec_for_platform(payload.get("platform"))
+            if codec is not None:
+                return codec.encode(rv)
+
+        return rv
+
+    def _decompress(self, value):
+        dictionary_id = get_dictionary_id(value)
+        if not dictionary_id:
+            return ZstdCodec().decode(value)
+        if self.compression_dictionaries is None:
+            raise DictionaryNotFound(dictionary_id)
+        return self.compression_dictionaries.get_codec(dictionary_id).decode(value)
 
     def _set_bytes(self, id, data, ttl=None):
         """
@@ -245,6 +398,36 @@ class NodeStorage(local, Service):
             self._set_bytes(id, bytes_data, ttl=ttl)
             # set cache only after encoding and write to nodestore has succeeded
             self._set_cache_item(id, cache_item)
+            if self._memo is not None:
+                self._memo.discard(id)
+
+    def _set_bytes_multi(self, items, ttl=None):
+        """
+        >>> nodestore._set_bytes_multi({'key1': b"{'foo': 'bar'}", 'key2': b"{}"})
+        """
+        for id, data in items.items():
+            self._set_bytes(id, data, ttl=ttl)
+
+    def set_subkeys_multi(self, items, ttl=None):
+        """
+        Set values and subkeys for several ids at once. Backends that support
+        it write all of them in a single request.
+
+        >>> nodestore.set_subkeys_multi({
+        ...    'key1': {None: {'foo': 'bar'}},
+        ...    'key2': {None: {'foo': 'baz'}, "reprocessing": {'foo': 'bam'}},
+        ... })
+        """
+        with sentry_sdk.start_span(op="nodestore.set_subkeys_multi") as span:
+            span.set_data("num_ids", len(items))
+            cache_items = {id: data.get(None) for id, data in items.items()}
+            bytes_items = {id: self._encode(dict(data)) for id, data in items.items()}
+            self._set_bytes_multi(bytes_items, ttl=ttl)
+            # set cache only after encoding and write to nodestore has succeeded
+            self._set_cache_items(cache_items)
+            if self._memo is not None:
+                for id in items:
+                    self._memo.discard(id)
 
     def cleanup(self, cutoff_timestamp):
         raise NotImplementedError
@@ -270,13 +453,25 @@ class NodeStorage(local, Service):
             self.cache.set_many(items)
 
     def _delete_cache_item(self, id):
+        if self._memo is not None:
+            self._memo.discard(id)
         if self.cache:
             self.cache.delete(id)
 
     def _delete_cache_items(self, id_list):
+        if self._memo is not None:
+            for id in id_list:
+                self._memo.discard(id)
         if self.cache:
             self.cache.delete_many([id for id in id_list])
 
+    @memoize
+    def compression_dictionaries(self):
+        path = settings.SENTRY_NODESTORE_DICTIONARIES_PATH
+        if path:
+            return CompressionDictionaries(path)
+        return None
+
     @memoize
     def cache(self):
         try:
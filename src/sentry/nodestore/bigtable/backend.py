@@ -67,6 +67,9 @@ class BigtableNodeStorage(NodeStorage):
     def _set_bytes(self, id, data, ttl=None):
         self.store.set(id, data, ttl)
 
+    def _set_bytes_multi(self, items, ttl=None):
+        self.store.set_many(items, ttl)
+
     def delete(self, id):
         if self.skip_deletes:
             return
@@ -0,0 +1,114 @@
+import os
+import time
+from typing import Mapping, MutableMapping, Optional
+
+import zstandard
+
+from sentry.utils import json
+from sentry.utils.codecs import ZstdCodec
+
+# Every zstd frame starts with these bytes, which can't be the start of the
+# JSON payloads written by ``NodeStorage._encode``.
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+INDEX_FILENAME = "index.json"
+
+# How often, in seconds, the index is checked for changes made by other
+# processes.
+RELOAD_INTERVAL = 60
+
+
+class DictionaryNotFound(Exception):
+    pass
+
+
+class CompressionDictionaries:
+    """
+    Zstandard dictionaries trained on node payloads of a single platform,
+    stored in a directory as ``<dictionary id>.dict`` files along with an
+    ``index.json`` that maps platforms to the dictionary used for writes.
+
+    Dictionaries are never removed from the directory, so that nodes written
+    with an older dictionary can still be read after a platform has been
+    retrained. Files are replaced atomically, and the index is reloaded when
+    it changes, at most every ``RELOAD_INTERVAL`` seconds. Long running
+    processes therefore pick up retrained dictionaries without a restart.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.platforms: MutableMapping[str, int] = {}
+        self.codecs: MutableMapping[int, ZstdCodec] = {}
+        self.mtime: Optional[int] = None
+        self.checked_at = 0.0
+        self.reload()
+
+    def reload(self) -> None:
+        self.checked_at = time.monotonic()
+        try:
+            with open(os.path.join(self.path, INDEX_FILENAME), "rb") as f:
+                self.mtime = os.fstat(f.fileno()).st_mtime_ns
+                self.platforms = json.loads(f.read())["platforms"]
+        except FileNotFoundError:
+            self.mtime = None
+            self.platforms = {}
+
+    def maybe_reload(self) -> None:
+        if time.monotonic() - self.checked_at < RELOAD_INTERVAL:
+            return
+        self.checked_at = time.monotonic()
+        try:
+            mtime: Optional[int] = os.stat(os.path.join(self.path, INDEX_FILENAME)).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self.mtime:
+            self.reload()
+
+    def get_codec(self, dictionary_id: int) -> ZstdCodec:
+        codec = self.codecs.get(dictionary_id)
+        if codec is None:
+            try:
+                with open(os.path.join(self.path, f"{dictionary_id}.dict"), "rb") as f:
+                    dictionary = zstandard.ZstdCompressionDict(f.read())
+            except FileNotFoundError:
+                raise DictionaryNotFound(dictionary_id)
+            codec = self.codecs[dictionary_id] = ZstdCodec(dictionary)
+        return codec
+
+    def get_codec_for_platform(self, platform: Optional[str]) -> Optional[ZstdCodec]:
+        self.maybe_reload()
+        dictionary_id = self.platforms.get(platform) if platform else None
+        if dictionary_id is None:
+            return None
+        return self.get_codec(dictionary_id)
+
+    def add(self, platform: str, dictionary: zstandard.ZstdCompressionDict) -> int:
+        """
+        Store ``dictionary`` and use it for all future writes of ``platform``
+        payloads. Returns the ID of the dictionary.
+        """
+        dictionary_id: int = dictionary.dict_id()
+        os.makedirs(self.path, exist_ok=True)
+        self._write(f"{dictionary_id}.dict", dictionary.as_bytes())
+
+        self.reload()
+        platforms: Mapping[str, int] = {**self.platforms, platform: dictionary_id}
+        self._write(INDEX_FILENAME, json.dumps({"platforms": platforms}).encode("utf8"))
+
+        self.reload()
+        return dictionary_id
+
+    def _write(self, filename: str, data: bytes) -> None:
+        # Readers must never see a partially written file.
+        path = os.path.join(self.path, filename)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+
+
+def get_dictionary_id(value: bytes) -> int:
+    """
+    Returns the ID of the dictionary that ``value`` was compressed with, or
+    0 if none was used.
+    """
+    return zstandard.get_frame_parameters(value).dict_id
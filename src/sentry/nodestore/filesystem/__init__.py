@@ -1 +1,2 @@
 from .backend import FileSystemNodeStorage  # NOQA
+from .segments import SegmentNodeStorage  # NOQA
@@ -0,0 +1,545 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sentry.nodestore.base import NodeStorage
+
+SEGMENT_MAGIC = b"SNS1"
+SEGMENT_SUFFIX = ".seg"
+LOCK_FILENAME = ".lock"
+
+# magic, number of index slots, number of used slots, latest expiry of any record
+HEADER = struct.Struct(">4sIIQ")
+# hash of the key, offset of the record (0 for an empty slot)
+SLOT = struct.Struct(">QQ")
+# key length, value length, expiry as unix timestamp (0 if the record never expires)
+RECORD = struct.Struct(">HIQ")
+
+EMPTY = 0
+# Set on the offset of a slot whose key has been deleted.
+DELETED = 1 << 63
+NEVER = 2**64 - 1
+
+# Fraction of index slots in use after which a segment is rotated.
+MAX_LOAD = 0.75
+
+
+def hash_key(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+
+
+def write_segment(
+    path: str, capacity: int, records: Iterable[Tuple[bytes, int, bytes, int]] = ()
+) -> None:
+    """
+    Write a segment file containing ``records``, given as ``(key, key_hash,
+    value, expires_at)`` tuples.
+    """
+    slots: List[Tuple[int, int]] = [(0, EMPTY)] * capacity
+    data_offset = HEADER.size + capacity * SLOT.size
+    used = 0
+    max_expires = 0
+
+    with open(path, "wb") as f:
+        f.truncate(data_offset)
+        f.seek(data_offset)
+        offset = data_offset
+        for key, key_hash, value, expires_at in records:
+            slot = key_hash % capacity
+            while slots[slot][1] != EMPTY:
+                slot = (slot + 1) % capacity
+            slots[slot] = (key_hash, offset)
+            used += 1
+            max_expires = max(max_expires, expires_at or NEVER)
+
+            f.write(RECORD.pack(len(key), len(value), expires_at))
+            f.write(key)
+            f.write(value)
+            offset += RECORD.size + len(key) + len(value)
+
+        f.seek(0)
+        f.write(HEADER.pack(SEGMENT_MAGIC, capacity, used, max_expires))
+        f.write(b"".join(SLOT.pack(*slot) for slot in slots))
+
+
+class Segment:
+    """
+    A single segment file: a fixed-size open addressing hash index followed by
+    the records appended to it.
+
+    The file is opened on first access, and closed again by its shard once it
+    has not been used for a while. Reads go through a read-only memory map of
+    the file, writes through ``pwrite`` on the same descriptor and must only
+    happen while the shard lock is held.
+    """
+
+    def __init__(self, path: str, shard: "Shard"):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.created = int(self.name[: -len(SEGMENT_SUFFIX)]) / 1e9
+        self.shard = shard
+        self._fd: Optional[int] = None
+        self._buf: Optional[mmap.mmap] = None
+        self.size = 0
+
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self.inode = os.fstat(fd).st_ino
+            magic, self.capacity, _, _ = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+        finally:
+            os.close(fd)
+        if magic != SEGMENT_MAGIC:
+            raise ValueError(f"{path} is not a nodestore segment")
+        self.data_offset = HEADER.size + self.capacity * SLOT.size
+
+    def open(self):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR)
+            self.remap(os.fstat(self._fd).st_size)
+        self.shard.touch(self)
+
+    def close(self):
+        if self._buf is not None:
+            self._buf.close()
+            self._buf = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self.shard.forget(self)
+
+    @property
+    def fd(self) -> int:
+        self.open()
+        return self._fd
+
+    @property
+    def buf(self) -> mmap.mmap:
+        self.open()
+        return self._buf
+
+    def remap(self, size: int):
+        if self._buf is not None:
+            self._buf.close()
+        self._buf = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+        self.size = size
+
+    def ensure(self, end: int):
+        # Other processes may have appended records since the file was mapped.
+        self.open()
+        if end > self.size:
+            self.remap(os.fstat(self._fd).st_size)
+
+    def stat(self) -> os.stat_result:
+        return os.stat(self.path)
+
+    @property
+    def used(self) -> int:
+        return HEADER.unpack_from(self.buf)[2]
+
+    @property
+    def max_expires(self) -> int:
+        return HEADER.unpack_from(self.buf)[3]
+
+    def read(self, offset: int) -> Tuple[bytes, bytes, int]:
+        offset &= ~DELETED
+        self.ensure(offset + RECORD.size)
+        key_len, value_len, expires_at = RECORD.unpack_from(self._buf, offset)
+        start = offset + RECORD.size
+        self.ensure(start + key_len + value_len)
+        key = self._buf[start : start + key_len]
+        value = self._buf[start + key_len : start + key_len + value_len]
+        return key, value, expires_at
+
+    def read_key(self, offset: int) -> bytes:
+        offset &= ~DELETED
+        self.ensure(offset + RECORD.size)
+        key_len = RECORD.unpack_from(self._buf, offset)[0]
+        start = offset + RECORD.size
+        self.ensure(start + key_len)
+        return self._buf[start : start + key_len]
+
+    def slots(self):
+        for slot in range(self.capacity):
+            key_hash, offset = SLOT.unpack_from(self.buf, HEADER.size + slot * SLOT.size)
+            if offset != EMPTY:
+                yield key_hash, offset
+
+    def find(self, key: bytes, key_hash: int) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Walk the probe sequence of ``key_hash``. Returns ``(slot, offset)`` of
+        the entry for ``key``, or ``(slot, None)`` with the first free slot if
+        there is none. The slot is ``None`` if the index is full.
+        """
+        capacity = self.capacity
+        for i in range(capacity):
+            slot = (key_hash + i) % capacity
+            entry_hash, offset = SLOT.unpack_from(self.buf, HEADER.size + slot * SLOT.size)
+            if offset == EMPTY:
+                return slot, None
+            if entry_hash == key_hash and self.read_key(offset) == key:
+                return slot, offset
+        return None, None
+
+    def append(
+        self, slot: int, key: bytes, key_hash: int, value: bytes, expires_at: int, new: bool
+    ):
+        fd = self.fd
+        offset = os.fstat(fd).st_size
+        os.pwrite(fd, RECORD.pack(len(key), len(value), expires_at) + key + value, offset)
+
+        slot_offset = HEADER.size + slot * SLOT.size
+        if new:
+            # The hash goes first so readers never see an offset without it.
+            os.pwrite(fd, SLOT.pack(key_hash, EMPTY)[:8], slot_offset)
+        os.pwrite(fd, SLOT.pack(key_hash, offset)[8:], slot_offset + 8)
+
+        _, capacity, used, max_expires = HEADER.unpack_from(self.buf)
+        os.pwrite(
+            fd,
+            HEADER.pack(
+                SEGMENT_MAGIC, capacity, used + int(new), max(max_expires, expires_at or NEVER)
+            ),
+            0,
+        )
+
+    def mark_deleted(self, slot: int, offset: int):
+        os.pwrite(self.fd, SLOT.pack(0, offset | DELETED)[8:], HEADER.size + slot * SLOT.size + 8)
+
+
+class Shard:
+    """
+    A directory of segments, newest first. Writers serialize on an exclusive
+    ``flock`` of the shard's lock file, so several processes can share one
+    shard.
+
+    Shards are shared by all threads of a process, see ``get_shard``, and
+    serialize them on ``mutex``. At most ``max_open_segments`` segments of a
+    shard are open at a time, the least recently used one is closed when
+    another one is opened.
+    """
+
+    def __init__(self, path: str, max_open_segments: int):
+        self.path = path
+        self.max_open_segments = max_open_segments
+        self.segments: List[Segment] = []
+        self.mtime: Optional[int] = None
+        self.mutex = threading.RLock()
+        self.open_segments: "OrderedDict[str, Segment]" = OrderedDict()
+
+    def touch(self, segment: Segment):
+        self.open_segments[segment.name] = segment
+        self.open_segments.move_to_end(segment.name)
+        while len(self.open_segments) > self.max_open_segments:
+            _, idle = self.open_segments.popitem(last=False)
+            idle.close()
+
+    def forget(self, segment: Segment):
+        if self.open_segments.get(segment.name) is segment:
+            del self.open_segments[segment.name]
+
+    @contextmanager
+    def lock(self):
+        with self.mutex:
+            fd = os.open(os.path.join(self.path, LOCK_FILENAME), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                self.refresh(force=True)
+                yield
+            finally:
+                os.close(fd)
+
+    def refresh(self, force: bool = False):
+        """
+        Pick up segments that have been created, replaced or removed by other
+        processes. Segments are only created, compacted and dropped by renames
+        and unlinks in the shard directory, so an unchanged directory mtime
+        means the known segments are still current. Recently modified
+        directories are always rescanned since mtime granularity is coarse.
+        """
+        mtime = os.stat(self.path).st_mtime_ns
+        if not force and mtime == self.mtime and time.time_ns() - mtime > 1_000_000_000:
+            return
+
+        names = sorted(
+            (name for name in os.listdir(self.path) if name.endswith(SEGMENT_SUFFIX)),
+            reverse=True,
+        )
+        existing = {segment.name: segment for segment in self.segments}
+        segments = []
+        for name in names:
+            path = os.path.join(self.path, name)
+            segment = existing.pop(name, None)
+            try:
+                if segment is not None and os.stat(path).st_ino != segment.inode:
+                    segment.close()
+                    segment = None
+                if segment is None:
+                    segment = Segment(path, self)
+            except FileNotFoundError:
+                continue
+            segments.append(segment)
+
+        for segment in existing.values():
+            segment.close()
+
+        self.segments = segments
+        self.mtime = mtime
+
+    def close(self):
+        with self.mutex:
+            for segment in self.segments:
+                segment.close()
+            self.segments = []
+            self.mtime = None
+
+    def read(self, key: bytes, key_hash: int, now: float) -> Optional[bytes]:
+        with self.mutex:
+            self.refresh()
+            return self.get(key, key_hash, now)
+
+    def get(self, key: bytes, key_hash: int, now: float) -> Optional[bytes]:
+        for segment in self.segments:
+            _, offset = segment.find(key, key_hash)
+            if offset is None:
+                continue
+            if offset & DELETED:
+                return None
+            _, value, expires_at = segment.read(offset)
+            if expires_at and expires_at <= now:
+                return None
+            return value
+        return None
+
+    def create_segment(self, capacity: int) -> Segment:
+        path = os.path.join(self.path, f"{time.time_ns():020d}{SEGMENT_SUFFIX}")
+        write_segment(f"{path}.tmp", capacity)
+        os.replace(f"{path}.tmp", path)
+        segment = Segment(path, self)
+        self.segments.insert(0, segment)
+        return segment
+
+    def drop_segment(self, segment: Segment):
+        os.unlink(segment.path)
+        segment.close()
+        self.segments.remove(segment)
+
+
+_shards: Dict[str, Shard] = {}
+_shards_lock = threading.Lock()
+
+
+def get_shard(path: str, max_open_segments: int) -> Shard:
+    """
+    Returns the shard at ``path``. ``NodeStorage`` instances are thread-local,
+    so shards are kept per process to share their open segments between
+    threads.
+    """
+    with _shards_lock:
+        shard = _shards.get(path)
+        if shard is None:
+            shard = _shards[path] = Shard(path, max_open_segments)
+        return shard
+
+
+class SegmentNodeStorage(NodeStorage):
+    """
+    A filesystem backend that appends nodes to a small number of large segment
+    files instead of writing one file per node, which makes it viable for
+    single-node deployments with a high event volume.
+
+    Nodes are spread over ``shards`` directories by the hash of their id. Each
+    shard appends to its newest segment, which is rotated once its index or
+    ``max_segment_size`` is full, or after ``segment_interval`` if one is set.
+    Every segment starts with an open addressing hash index of ``capacity``
+    slots, and is read through a memory map. ``cleanup`` drops whole segments
+    that are older than the cutoff or only hold expired nodes, and compacts
+    the remaining ones once ``compaction_threshold`` of their data is garbage.
+
+    Shards and their open segments are shared by all threads of a process.
+    Each open segment holds a file descriptor, so a process needs up to
+    ``shards * max_open_segments`` descriptors on top of its usual ones, 256
+    with the defaults. Make sure ``ulimit -n`` allows for that.
+
+    :param path: Directory to store the shards in.
+    :param shards: Number of shard directories. Must not be changed once data
+        has been written.
+    :param segment_interval: How long a segment is appended to before it is
+        rotated. Segments are only rotated by size if this is ``None``.
+    :param max_open_segments: How many segments of each shard are kept open.
+        Reads from other segments open them on demand.
+    :param default_ttl: How long nodes are returned for when no ttl is passed
+        on write.
+
+    >>> SegmentNodeStorage(
+    ...     path='/data/nodestore',
+    ...     max_segment_size=512 * 1024 * 1024,
+    ...     default_ttl=timedelta(days=90),
+    ... )
+    """
+
+    def __init__(
+        self,
+        path,
+        shards=16,
+        capacity=65536,
+        segment_interval=None,
+        max_segment_size=256 * 1024 * 1024,
+        default_ttl=None,
+        compaction_threshold=0.5,
+        max_open_segments=16,
+    ):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.capacity = capacity
+        self.segment_interval = segment_interval
+        self.max_segment_size = max_segment_size
+        self.default_ttl = default_ttl
+        self.compaction_threshold = compaction_threshold
+        self.shards = [
+            get_shard(os.path.join(self.path, f"{i:03d}"), max_open_segments)
+            for i in range(shards)
+        ]
+
+    def _locate(self, id) -> Tuple[Shard, bytes, int]:
+        key = id.encode("utf8")
+        key_hash = hash_key(key)
+        # The low bits of the hash pick the index slot, so use the high ones here.
+        return self.shards[(key_hash >> 32) % len(self.shards)], key, key_hash
+
+    def _get_bytes(self, id):
+        shard, key, key_hash = self._locate(id)
+        return shard.read(key, key_hash, time.time())
+
+    def _get_bytes_multi(self, id_list):
+        now = time.time()
+        refreshed = set()
+        rv = {}
+        for id in id_list:
+            shard, key, key_hash = self._locate(id)
+            with shard.mutex:
+                if shard.path not in refreshed:
+                    shard.refresh()
+                    refreshed.add(shard.path)
+                rv[id] = shard.get(key, key_hash, now)
+        return rv
+
+    def _set_bytes(self, id, data, ttl=None):
+        self._set_bytes_multi({id: data}, ttl=ttl)
+
+    def _set_bytes_multi(self, items, ttl=None):
+        ttl = ttl or self.default_ttl
+        expires_at = int(time.time() + ttl.total_seconds()) if ttl else 0
+
+        by_shard = {}
+        for id, data in items.items():
+            shard, key, key_hash = self._locate(id)
+            by_shard.setdefault(shard.path, (shard, []))[1].append((key, key_hash, data))
+
+        for shard, records in by_shard.values():
+            with shard.lock():
+                for key, key_hash, data in records:
+                    segment = self._get_active_segment(shard, len(key) + len(data))
+                    slot, offset = segment.find(key, key_hash)
+                    if slot is None:
+                        segment = shard.create_segment(self.capacity)
+                        slot, offset = segment.find(key, key_hash)
+                    segment.append(slot, key, key_hash, data, expires_at, new=offset is None)
+
+    def _get_active_segment(self, shard: Shard, size: int) -> Segment:
+        if shard.segments:
+            segment = shard.segments[0]
+            if (
+                (
+                    self.segment_interval is None
+                    or time.time() - segment.created < self.segment_interval.total_seconds()
+                )
+                and segment.used < self.capacity * MAX_LOAD
+                and segment.stat().st_size + RECORD.size + size <= self.max_segment_size
+            ):
+                return segment
+        return shard.create_segment(self.capacity)
+
+    def delete(self, id):
+        self.delete_multi([id])
+
+    def delete_multi(self, id_list):
+        by_shard = {}
+        for id in id_list:
+            shard, key, key_hash = self._locate(id)
+            by_shard.setdefault(shard.path, (shard, []))[1].append((key, key_hash))
+
+        try:
+            for shard, keys in by_shard.values():
+                with shard.lock():
+                    for key, key_hash in keys:
+                        for segment in shard.segments:
+                            slot, offset = segment.find(key, key_hash)
+                            if offset is not None and not offset & DELETED:
+                                segment.mark_deleted(slot, offset)
+        finally:
+            self._delete_cache_items(id_list)
+
+    def cleanup(self, cutoff_timestamp):
+        cutoff = cutoff_timestamp.timestamp()
+        now = time.time()
+
+        for shard in self.shards:
+            with shard.lock():
+                # The newest segment may still be appended to.
+                for segment in shard.segments[1:]:
+                    max_expires = segment.max_expires
+                    if (
+                        segment.stat().st_mtime < cutoff
+                        or max_expires == 0
+                        or max_expires != NEVER
+                        and max_expires <= now
+                    ):
+                        shard.drop_segment(segment)
+                self.compact(shard, now)
+
+        if self.cache:
+            self.cache.clear()
+
+    def compact(self, shard: Shard, now: float):
+        """
+        Rewrite the inactive segments of ``shard`` in which at least
+        ``compaction_threshold`` of the data is deleted, expired or shadowed
+        by a newer write. Must be called with the shard lock held.
+        """
+        segments = list(shard.segments)
+        for i, segment in enumerate(segments[1:], 1):
+            newer = [s for s in segments[:i] if s in shard.segments]
+            live = []
+            live_size = 0
+            for key_hash, offset in segment.slots():
+                if offset & DELETED:
+                    continue
+                key, value, expires_at = segment.read(offset)
+                if expires_at and expires_at <= now:
+                    continue
+                if any(s.find(key, key_hash)[1] is not None for s in newer):
+                    continue
+                live.append((key, key_hash, value, expires_at))
+                live_size += RECORD.size + len(key) + len(value)
+
+            st = segment.stat()
+            data_size = st.st_size - segment.data_offset
+            if not live:
+                shard.drop_segment(segment)
+            elif live_size <= data_size * (1 - self.compaction_threshold):
+                write_segment(f"{segment.path}.tmp", segment.capacity, live)
+                # Keep the mtime so that cleanup still sees the original age.
+                os.utime(f"{segment.path}.tmp", ns=(st.st_atime_ns, st.st_mtime_ns))
+                os.replace(f"{segment.path}.tmp", segment.path)
+
+        shard.refresh(force=True)
+
+    def bootstrap(self):
+        for shard in self.shards:
+            os.makedirs(shard.path, exist_ok=True)
@@ -507,6 +507,22 @@ register("symbolicate-event.low-priority.metrics.submission-rate", default=0.0)
 # special save_event task for transactions avoiding the preprocess.
 register("store.save-transactions-ingest-consumer-rate", default=0.0)
 
+# Write the JSON payload of events received by the ingest consumer to the
+# processing store as-is instead of encoding the parsed event again.
+register("store.ingest-consumer.raw-payload-handoff", default=False)
+
+# Write all events of an ingest consumer batch to the processing store at once
+# when the consumer runs without an executor.
+register("store.ingest-consumer.batch-processing-store-writes", default=False)
+# Save the transactions of such a batch with one save_event_transaction_batch
+# task per project.
+register("store.ingest-consumer.batch-save-transactions", default=False)
+
+# Sampling rate for events that only need stacktrace processing to be
+# processed and saved in a single task, if they have at most this many frames.
+register("store.process-and-save-inline-rate", default=0.0)
+register("store.process-and-save-inline.max-frames", default=250)
+
 # Drop delete_old_primary_hash messages for a particular project.
 register("reprocessing2.drop-delete-old-primary-hash", default=[])
 
@@ -718,3 +734,31 @@ register("txnames.bump-lifetime-sample-rate", default=0.1)
 register("span_descs.bump-lifetime-sample-rate", default=0.25)
 # Decides whether artifact bundles asynchronous renewal is enabled.
 register("sourcemaps.artifact-bundles.enable-renewal", default=0.0)
+
+# Memoize nodestore reads for the duration of an API request or post-process task.
+register("nodestore.local-cache", default=False)
+
+# Cache per-project lookups of post-process tasks in each worker for this many seconds (0 to disable).
+register("post-process.worker-cache.ttl", default=0)
+# Run the post-process steps that only read state in a thread pool.
+register("post-process.concurrent-steps", default=False)
+
+# Reuse the hashes of events whose grouping inputs have been seen before.
+register("grouping.hash-cache.enabled", default=False)
+# Also share cached grouping hashes between processes for this many seconds (0 to disable).
+register("grouping.hash-cache.shared-ttl", default=0)
+
+# Count events for event frequency alert rules, and read those counts instead of TSDB where they cover the interval.
+register("rules.frequency-counters.enabled", default=False)
+
+# Parse event search queries with the hand-written parser instead of the PEG grammar.
+register("api.event-search.hand-written-parser", default=False)
+# Reuse the resolved select, orderby and groupby of discover queries with the same fields.
+register("discover.query-builder.plan-cache", default=False)
+
+# Let one worker run a cached Snuba query while others with the same query wait for its result.
+register("snuba.single-flight.enabled", default=False)
+# Seconds to wait for the result of a query run by another worker before running it.
+register("snuba.single-flight.timeout", default=10.0)
+# Cache the queries of the referrers in sentry.utils.snuba.REFERRER_CACHE_POLICIES, serving stale results while they are refreshed.
+register("snuba.referrer-cache-policies.enabled", default=False)
@@ -15,3 +15,4 @@ from .stats import *  # noqa: F401,F403
 from .superuser import *  # noqa: F401,F403
 from .useremail import *  # noqa: F401,F403
 from .users import *  # noqa: F401,F403
+from .worker_cache import *  # noqa: F401,F403
@@ -0,0 +1,106 @@
+from django.db.models.signals import post_delete, post_save
+
+from sentry.models import (
+    Organization,
+    Project,
+    ProjectOwnership,
+    Rule,
+    ServiceHook,
+    ServiceHookProject,
+)
+from sentry.utils.worker_cache import post_process_cache
+
+
+def invalidate_project(instance, **kwargs):
+    post_process_cache.invalidate(("project", instance.id))
+
+
+def invalidate_organization(instance, **kwargs):
+    post_process_cache.invalidate(("organization", instance.id))
+
+
+def invalidate_owning_project(instance, **kwargs):
+    post_process_cache.invalidate(("project", instance.project_id))
+
+
+def invalidate_service_hook(instance, **kwargs):
+    if instance.project_id is not None:
+        post_process_cache.invalidate(("project", instance.project_id))
+    if instance.organization_id is not None:
+        post_process_cache.invalidate(("organization", instance.organization_id))
+
+
+# Bump the versions that the post-process worker cache checks its values
+# against, see ``sentry.utils.worker_cache``.
+post_save.connect(
+    invalidate_project,
+    sender=Project,
+    dispatch_uid="worker_cache.invalidate_project.post_save.Project",
+    weak=False,
+)
+post_delete.connect(
+    invalidate_project,
+    sender=Project,
+    dispatch_uid="worker_cache.invalidate_project.post_delete.Project",
+    weak=False,
+)
+post_save.connect(
+    invalidate_organization,
+    sender=Organization,
+    dispatch_uid="worker_cache.invalidate_organization.post_save.Organization",
+    weak=False,
+)
+post_delete.connect(
+    invalidate_organization,
+    sender=Organization,
+    dispatch_uid="worker_cache.invalidate_organization.post_delete.Organization",
+    weak=False,
+)
+post_save.connect(
+    invalidate_owning_project,
+    sender=ProjectOwnership,
+    dispatch_uid="worker_cache.invalidate_owning_project.post_save.ProjectOwnership",
+    weak=False,
+)
+post_delete.connect(
+    invalidate_owning_project,
+    sender=ProjectOwnership,
+    dispatch_uid="worker_cache.invalidate_owning_project.post_delete.ProjectOwnership",
+    weak=False,
+)
+post_save.connect(
+    invalidate_owning_project,
+    sender=Rule,
+    dispatch_uid="worker_cache.invalidate_owning_project.post_save.Rule",
+    weak=False,
+)
+post_delete.connect(
+    invalidate_owning_project,
+    sender=Rule,
+    dispatch_uid="worker_cache.invalidate_owning_project.post_delete.Rule",
+    weak=False,
+)
+post_save.connect(
+    invalidate_owning_project,
+    sender=ServiceHookProject,
+    dispatch_uid="worker_cache.invalidate_owning_project.post_save.ServiceHookProject",
+    weak=False,
+)
+post_delete.connect(
+    invalidate_owning_project,
+    sender=ServiceHookProject,
+    dispatch_uid="worker_cache.invalidate_owning_project.post_delete.ServiceHookProject",
+    weak=False,
+)
+post_save.connect(
+    invalidate_service_hook,
+    sender=ServiceHook,
+    dispatch_uid="worker_cache.invalidate_service_hook.post_save.ServiceHook",
+    weak=False,
+)
+post_delete.connect(
+    invalidate_service_hook,
+    sender=ServiceHook,
+    dispatch_uid="worker_cache.invalidate_service_hook.post_delete.ServiceHook",
+    weak=False,
+)
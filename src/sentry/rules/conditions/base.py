@@ -14,6 +14,14 @@ class EventCondition(RuleBase, abc.ABC):
     def passes(self, event: GroupEvent, state: EventState) -> bool:
         pass
 
+    def prepare_batch(self, events: Sequence[GroupEvent]) -> None:
+        """
+        Called when the condition is going to be evaluated for several events
+        of its project in a row (see ``RuleProcessor.apply_batch``), so that
+        it can look up data for all of them at once.
+        """
+        pass
+
     def get_activity(
         self, start: datetime, end: datetime, limit: int
     ) -> Sequence[ConditionActivity]:
@@ -5,18 +5,20 @@ import contextlib
 import logging
 import re
 from datetime import datetime, timedelta
-from typing import Any, Dict, Mapping, Tuple
+from typing import Any, Callable, Dict, Mapping, MutableMapping, Optional, Sequence, Tuple
 
 from django import forms
 from django.core.cache import cache
 from django.utils import timezone
 
-from sentry import release_health, tsdb
+from sentry import options, release_health, tsdb
 from sentry.eventstore.models import GroupEvent
 from sentry.issues.constants import get_issue_tsdb_group_model, get_issue_tsdb_user_group_model
+from sentry.issues.grouptype import GroupCategory
 from sentry.receivers.rules import DEFAULT_RULE_LABEL
-from sentry.rules import EventState
+from sentry.rules import EventState, frequency_counters
 from sentry.rules.conditions.base import EventCondition
+from sentry.tsdb.base import TSDBModel
 from sentry.types.condition_activity import (
     FREQUENCY_CONDITION_BUCKET_SIZE,
     ConditionActivity,
@@ -111,6 +113,13 @@ class BaseEventFrequencyCondition(EventCondition, abc.ABC):
 
         super().__init__(*args, **kwargs)
 
+        self.batch_events: Sequence[GroupEvent] = ()
+        self.batch_rates: MutableMapping[Tuple[str, Optional[str]], Mapping[int, int]] = {}
+
+    def prepare_batch(self, events: Sequence[GroupEvent]) -> None:
+        self.batch_events = events
+        self.batch_rates = {}
+
     def _get_options(self) -> Tuple[str | None, float | None]:
         interval, value = None, None
         try:
@@ -126,7 +135,18 @@ class BaseEventFrequencyCondition(EventCondition, abc.ABC):
             return False
 
         # TODO(mgaeta): Bug: Rule is optional.
-        current_value = self.get_rate(event, interval, self.rule.environment_id)  # type: ignore
+        environment_id = self.rule.environment_id  # type: ignore
+        if self.batch_events:
+            # The rates of all groups of a batch are queried together the first
+            # time one of them is needed.
+            rates = self.batch_rates.get((interval, environment_id))
+            if rates is None:
+                rates = self.batch_rates[(interval, environment_id)] = self.get_rates(
+                    self.batch_events, interval, environment_id
+                )
+            current_value = rates[event.group_id]
+        else:
+            current_value = self.get_rate(event, interval, environment_id)
         logging.info(f"event_frequency_rule current: {current_value}, threshold: {value}")
         return current_value > value
 
@@ -163,6 +183,10 @@ class BaseEventFrequencyCondition(EventCondition, abc.ABC):
         raise NotImplementedError
 
     def query(self, event: GroupEvent, start: datetime, end: datetime, environment_id: str) -> int:
+        counts = self.query_counters([event], start, end, environment_id)
+        if counts is not None:
+            return counts[event.group_id]
+
         query_result = self.query_hook(event, start, end, environment_id)
         metrics.incr(
             "rules.conditions.queried_snuba",
@@ -179,6 +203,46 @@ class BaseEventFrequencyCondition(EventCondition, abc.ABC):
         """ """
         raise NotImplementedError  # subclass must implement
 
+    def batch_query(
+        self, events: Sequence[GroupEvent], start: datetime, end: datetime, environment_id: str
+    ) -> Mapping[int, int]:
+        counts = self.query_counters(events, start, end, environment_id)
+        if counts is not None:
+            return counts
+
+        query_result = self.batch_query_hook(events, start, end, environment_id)
+        metrics.incr(
+            "rules.conditions.queried_snuba",
+            tags={
+                "condition": re.sub("(?!^)([A-Z]+)", r"_\1", self.__class__.__name__).lower(),
+                "is_created_on_project_creation": self.is_guessed_to_be_created_on_project_creation,
+                "batch": True,
+            },
+        )
+        return query_result
+
+    def query_counters(
+        self, events: Sequence[GroupEvent], start: datetime, end: datetime, environment_id: str
+    ) -> Mapping[int, int] | None:
+        """
+        Returns the values of the groups of ``events`` from the precomputed
+        frequency counters, or ``None`` if they are not available.
+        """
+        return None
+
+    def batch_query_hook(
+        self, events: Sequence[GroupEvent], start: datetime, end: datetime, environment_id: str
+    ) -> Mapping[int, int]:
+        """
+        Returns the values of the groups of ``events``, by group id. Queries
+        each group separately unless overridden.
+        """
+        events_by_group_id = {event.group_id: event for event in events}
+        return {
+            group_id: self.query_hook(event, start, end, environment_id)
+            for group_id, event in events_by_group_id.items()
+        }
+
     def get_rate(self, event: GroupEvent, interval: str, environment_id: str) -> int:
         _, duration = self.intervals[interval]
         end = timezone.now()
@@ -203,6 +267,33 @@ class BaseEventFrequencyCondition(EventCondition, abc.ABC):
 
         return result
 
+    def get_rates(
+        self, events: Sequence[GroupEvent], interval: str, environment_id: str
+    ) -> Mapping[int, int]:
+        """
+        Like ``get_rate``, but for the groups of all ``events`` at once.
+        """
+        _, duration = self.intervals[interval]
+        end = timezone.now()
+        option_override_cm = contextlib.nullcontext()
+        if duration >= timedelta(hours=1):
+            option_override_cm = options_override({"consistent": False})
+        with option_override_cm:
+            result = self.batch_query(events, end - duration, end, environment_id=environment_id)
+            comparison_type = self.get_option("comparisonType", COMPARISON_TYPE_COUNT)
+            if comparison_type == COMPARISON_TYPE_PERCENT:
+                comparison_interval = comparison_intervals[self.get_option("comparisonInterval")][1]
+                comparison_end = end - comparison_interval
+                comparison_result = self.batch_query(
+                    events, comparison_end - duration, comparison_end, environment_id=environment_id
+                )
+                result = {
+                    group_id: percent_increase(value, comparison_result[group_id])
+                    for group_id, value in result.items()
+                }
+
+        return result
+
     @property
     def is_guessed_to_be_created_on_project_creation(self) -> bool:
         """
@@ -240,6 +331,54 @@ class EventFrequencyCondition(BaseEventFrequencyCondition):
         )
         return sums[event.group_id]
 
+    def query_counters(
+        self, events: Sequence[GroupEvent], start: datetime, end: datetime, environment_id: str
+    ) -> Mapping[int, int] | None:
+        if not options.get("rules.frequency-counters.enabled"):
+            return None
+
+        # Only error events are counted.
+        if any(event.group.issue_category != GroupCategory.ERROR for event in events):
+            return None
+
+        try:
+            counts = frequency_counters.get_counts(
+                self.project.id,
+                list({event.group_id for event in events}),
+                environment_id,
+                start,
+                end,
+            )
+        except Exception:
+            self.logger.exception("Failed to read frequency counters")
+            counts = None
+
+        metrics.incr(
+            "rules.conditions.frequency_counters",
+            tags={"result": "miss" if counts is None else "hit"},
+        )
+        return counts
+
+    def batch_query_hook(
+        self, events: Sequence[GroupEvent], start: datetime, end: datetime, environment_id: str
+    ) -> Mapping[int, int]:
+        sums: Dict[int, int] = {}
+        for model, group_ids in _get_group_ids_by_model(events, get_issue_tsdb_group_model).items():
+            sums.update(
+                self.tsdb.get_sums(
+                    model=model,
+                    keys=group_ids,
+                    start=start,
+                    end=end,
+                    environment_id=environment_id,
+                    use_cache=True,
+                    jitter_value=self.project.id,
+                    tenant_ids={"organization_id": self.project.organization_id},
+                    referrer_suffix="alert_event_frequency",
+                )
+            )
+        return sums
+
     def get_preview_aggregate(self) -> Tuple[str, str]:
         return "count", "roundedTime"
 
@@ -264,6 +403,28 @@ class EventUniqueUserFrequencyCondition(BaseEventFrequencyCondition):
         )
         return totals[event.group_id]
 
+    def batch_query_hook(
+        self, events: Sequence[GroupEvent], start: datetime, end: datetime, environment_id: str
+    ) -> Mapping[int, int]:
+        totals: Dict[int, int] = {}
+        for model, group_ids in _get_group_ids_by_model(
+            events, get_issue_tsdb_user_group_model
+        ).items():
+            totals.update(
+                self.tsdb.get_distinct_counts_totals(
+                    model=model,
+                    keys=group_ids,
+                    start=start,
+                    end=end,
+                    environment_id=environment_id,
+                    use_cache=True,
+                    jitter_value=self.project.id,
+                    tenant_ids={"organization_id": self.project.organization_id},
+                    referrer_suffix="alert_event_uniq_user_frequency",
+                )
+            )
+        return totals
+
     def get_preview_aggregate(self) -> Tuple[str, str]:
         return "uniq", "user"
 
@@ -392,6 +553,16 @@ class EventFrequencyPercentCondition(BaseEventFrequencyCondition):
         raise NotImplementedError
 
 
+def _get_group_ids_by_model(
+    events: Sequence[GroupEvent], get_model: Callable[[GroupCategory], TSDBModel]
+) -> Mapping[TSDBModel, Sequence[int]]:
+    group_ids_by_model: Dict[TSDBModel, Dict[int, None]] = {}
+    for event in events:
+        model = get_model(event.group.issue_category)
+        group_ids_by_model.setdefault(model, {})[event.group_id] = None
+    return {model: list(group_ids) for model, group_ids in group_ids_by_model.items()}
+
+
 def bucket_count(start: datetime, end: datetime, buckets: Dict[datetime, int]) -> int:
     rounded_end = round_to_five_minute(end)
     rounded_start = round_to_five_minute(start)
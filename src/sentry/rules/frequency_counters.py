@@ -0,0 +1,157 @@
+"""
+Sliding-window event counters for the groups of projects with event frequency
+alert rules.
+
+Events are counted per group and environment in ten-second buckets, the
+resolution of the smallest TSDB rollup, so that ``EventFrequencyCondition``
+can read the count of an interval in a single round-trip instead of querying
+TSDB. The buckets of a group and environment are kept in one Redis hash per
+``SEGMENT_SIZE`` buckets. Every hash expires on its own once it is older than
+the largest window it serves, so the buckets of groups that keep receiving
+events do not accumulate. Counters are only maintained for the environments
+that the project's frequency rules are scoped to.
+
+A project key records the bucket, by the current time rather than event
+timestamps, in which counting started for a project and environment. Workers
+may still hold a cached rule list without the rule that started counting, so
+counting is only considered complete once the rule caches have expired.
+Intervals that begin before that, or that are longer than ``MAX_WINDOW``, are
+not covered by the counters and have to be queried from TSDB instead.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from sentry import options
+from sentry.utils import redis
+
+BUCKET_SIZE = 10  # seconds
+SEGMENT_SIZE = 60  # buckets
+MAX_WINDOW = timedelta(hours=1)
+
+# Segments are kept a little longer than the largest window they serve after
+# their last bucket was written to.
+KEY_TTL = int(MAX_WINDOW.total_seconds()) + 2 * BUCKET_SIZE
+
+# How long ``Rule.get_for_project`` keeps the rules of a project in the cache.
+RULES_CACHE_TTL = 60  # seconds
+
+FREQUENCY_CONDITION_ID = "sentry.rules.conditions.event_frequency.EventFrequencyCondition"
+
+
+def _get_client():
+    return redis.redis_clusters.get(settings.SENTRY_RULE_FREQUENCY_COUNTERS_REDIS_CLUSTER)
+
+
+def _get_bucket(timestamp: datetime) -> int:
+    return int(timestamp.timestamp()) // BUCKET_SIZE
+
+
+def _get_group_key(group_id: int, environment_id: Optional[int], bucket: int) -> str:
+    return f"rfc:g:{group_id}:{environment_id or ''}:{bucket // SEGMENT_SIZE}"
+
+
+def _get_project_key(project_id: int, environment_id: Optional[int]) -> str:
+    return f"rfc:p:{project_id}:{environment_id or ''}"
+
+
+def _get_grace_buckets() -> int:
+    """
+    Returns the number of buckets after the one in which counting started
+    during which workers may still skip counting because of a stale rule list.
+    """
+    grace = max(RULES_CACHE_TTL, options.get("post-process.worker-cache.ttl"))
+    return -(-grace // BUCKET_SIZE)
+
+
+def get_counted_environment_ids(project_id: int) -> Set[Optional[int]]:
+    """
+    Returns the environments, ``None`` standing for all of them, that the
+    active frequency rules of a project are scoped to.
+    """
+    from sentry.models import Rule
+
+    return {
+        rule.environment_id
+        for rule in Rule.get_for_project(project_id)
+        if any(
+            condition.get("id") == FREQUENCY_CONDITION_ID
+            for condition in rule.data.get("conditions", ())
+        )
+    }
+
+
+def increment(counters: Iterable[Tuple[int, int, Optional[int]]], timestamp: datetime) -> None:
+    """
+    Counts an event for each ``(project_id, group_id, environment_id)``
+    triple, in the bucket of ``timestamp``.
+    """
+    bucket = _get_bucket(timestamp)
+    # Events are not necessarily saved in order, counting starts now.
+    started_bucket = _get_bucket(timezone.now())
+    project_keys = set()
+
+    with _get_client().pipeline(transaction=False) as pipeline:
+        for project_id, group_id, environment_id in counters:
+            group_key = _get_group_key(group_id, environment_id, bucket)
+            pipeline.hincrby(group_key, str(bucket), 1)
+            pipeline.expire(group_key, KEY_TTL)
+            project_keys.add(_get_project_key(project_id, environment_id))
+
+        for project_key in project_keys:
+            pipeline.set(project_key, started_bucket, nx=True)
+            pipeline.expire(project_key, KEY_TTL)
+
+        pipeline.execute()
+
+
+def get_counts(
+    project_id: int,
+    group_ids: Sequence[int],
+    environment_id: Optional[int],
+    start: datetime,
+    end: datetime,
+) -> Optional[Mapping[int, int]]:
+    """
+    Returns the number of events of each group between ``start`` and ``end``,
+    or ``None`` if the counters do not cover that interval.
+
+    Counts are accurate to a bucket, like the ten-second TSDB rollup the
+    first bucket is counted as a whole.
+    """
+    if end - start > MAX_WINDOW:
+        return None
+
+    first_bucket = _get_bucket(start)
+    segments: Dict[int, List[str]] = {}
+    for bucket in range(first_bucket, _get_bucket(end) + 1):
+        segments.setdefault(bucket // SEGMENT_SIZE, []).append(str(bucket))
+
+    with _get_client().pipeline(transaction=False) as pipeline:
+        pipeline.get(_get_project_key(project_id, environment_id))
+        for group_id in group_ids:
+            for segment, buckets in segments.items():
+                pipeline.hmget(
+                    _get_group_key(group_id, environment_id, segment * SEGMENT_SIZE), buckets
+                )
+        since, *values = pipeline.execute()
+
+    # Events in the bucket in which counting started, and in the buckets after
+    # it until all workers have seen the rules, may not all have been counted.
+    if since is None or int(since) + _get_grace_buckets() >= first_bucket:
+        return None
+
+    counts = {}
+    for index, group_id in enumerate(group_ids):
+        group_values = values[index * len(segments) : (index + 1) * len(segments)]
+        counts[group_id] = sum(
+            int(value)
+            for segment_values in group_values
+            for value in segment_values
+            if value is not None
+        )
+    return counts
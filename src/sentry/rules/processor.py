@@ -3,21 +3,42 @@ from __future__ import annotations
 import logging
 from datetime import timedelta
 from random import randrange
-from typing import Any, Callable, Iterable, List, Mapping, MutableMapping, Sequence, Set, Tuple
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Iterable,
+    List,
+    Mapping,
+    MutableMapping,
+    Sequence,
+    Set,
+    Tuple,
+)
 
 from django.core.cache import cache
 from django.utils import timezone
 
 from sentry import analytics
 from sentry.eventstore.models import GroupEvent
-from sentry.models import Environment, GroupRuleStatus, Rule, RuleSnooze
+from sentry.models import Environment, Group, GroupRuleStatus, Project, Rule, RuleSnooze
 from sentry.rules import EventState, history, rules
+from sentry.rules.base import RuleBase
+from sentry.rules.conditions.base import EventCondition
 from sentry.types.rules import RuleFuture
 from sentry.utils.hashlib import hash_values
 from sentry.utils.safe import safe_execute
 
 SLOW_CONDITION_MATCHES = ["event_frequency"]
 
+RuleCallbacks = Iterable[
+    Tuple[Callable[[GroupEvent, Sequence[RuleFuture]], None], List[RuleFuture]]
+]
+
+
+def build_rule_status_cache_key(group_id: int, rule_id: int) -> str:
+    return "grouprulestatus:1:%s" % hash_values([group_id, rule_id])
+
 
 def get_match_function(match_name: str) -> Callable[..., bool] | None:
     if match_name == "all":
@@ -53,45 +74,73 @@ class RuleProcessor:
             str, Tuple[Callable[[GroupEvent, Sequence[RuleFuture]], None], List[RuleFuture]]
         ] = {}
 
+        # Condition instances shared by the processors of a batch, see
+        # ``apply_batch``.
+        self.batch_conditions: MutableMapping[Tuple[int, int], RuleBase] | None = None
+        self.batch_events: Sequence[GroupEvent] = ()
+
     def get_rules(self) -> Sequence[Rule]:
         """Get all of the rules for this project from the DB (or cache)."""
         rules_: Sequence[Rule] = Rule.get_for_project(self.project.id)
         return rules_
 
     def _build_rule_status_cache_key(self, rule_id: int) -> str:
-        return "grouprulestatus:1:%s" % hash_values([self.group.id, rule_id])
+        return build_rule_status_cache_key(self.group.id, rule_id)
 
     def bulk_get_rule_status(self, rules: Sequence[Rule]) -> Mapping[int, GroupRuleStatus]:
-        keys = [self._build_rule_status_cache_key(rule.id) for rule in rules]
-        cache_results: Mapping[str, GroupRuleStatus] = cache.get_many(keys)
-        missing_rule_ids: Set[int] = set()
-        rule_statuses: MutableMapping[int, GroupRuleStatus] = {}
-        for key, rule in zip(keys, rules):
+        return {
+            rule_id: rule_status
+            for (_, rule_id), rule_status in self.bulk_get_rule_statuses(
+                self.project, [self.group], rules
+            ).items()
+        }
+
+    @classmethod
+    def bulk_get_rule_statuses(
+        cls, project: Project, groups: Sequence[Group], rules: Sequence[Rule]
+    ) -> Mapping[Tuple[int, int], GroupRuleStatus]:
+        """
+        Returns the statuses of ``rules`` for all ``groups``, keyed by
+        ``(group_id, rule_id)``. Missing statuses are created.
+        """
+        group_ids = {group.id for group in groups}
+        keys = {
+            build_rule_status_cache_key(group_id, rule.id): (group_id, rule.id)
+            for group_id in group_ids
+            for rule in rules
+        }
+        cache_results: Mapping[str, GroupRuleStatus] = cache.get_many(list(keys))
+        missing: Set[Tuple[int, int]] = set()
+        rule_statuses: MutableMapping[Tuple[int, int], GroupRuleStatus] = {}
+        for key, group_and_rule_id in keys.items():
             rule_status = cache_results.get(key)
             if not rule_status:
-                missing_rule_ids.add(rule.id)
+                missing.add(group_and_rule_id)
             else:
-                rule_statuses[rule.id] = rule_status
+                rule_statuses[group_and_rule_id] = rule_status
 
-        if missing_rule_ids:
+        if missing:
             # If not cached, attempt to fetch status from the database
             statuses = GroupRuleStatus.objects.filter(
-                group=self.group, rule_id__in=missing_rule_ids
+                group_id__in={group_id for group_id, _ in missing},
+                rule_id__in={rule_id for _, rule_id in missing},
             )
             to_cache: List[GroupRuleStatus] = list()
             for status in statuses:
-                rule_statuses[status.rule_id] = status
-                missing_rule_ids.remove(status.rule_id)
-                to_cache.append(status)
+                group_and_rule_id = (status.group_id, status.rule_id)
+                if group_and_rule_id in missing:
+                    rule_statuses[group_and_rule_id] = status
+                    missing.remove(group_and_rule_id)
+                    to_cache.append(status)
 
             # We might need to create some statuses if they don't already exist
-            if missing_rule_ids:
+            if missing:
                 # We use `ignore_conflicts=True` here to avoid race conditions where the statuses
                 # might be created between when we queried above and attempt to create the rows now.
                 GroupRuleStatus.objects.bulk_create(
                     [
-                        GroupRuleStatus(rule_id=rule_id, group=self.group, project=self.project)
-                        for rule_id in missing_rule_ids
+                        GroupRuleStatus(rule_id=rule_id, group_id=group_id, project=project)
+                        for group_id, rule_id in missing
                     ],
                     ignore_conflicts=True,
                 )
@@ -99,22 +148,31 @@ class RuleProcessor:
                 # instances. Re-query the database to fetch the rows, they should all exist at this
                 # point.
                 statuses = GroupRuleStatus.objects.filter(
-                    group=self.group, rule_id__in=missing_rule_ids
+                    group_id__in={group_id for group_id, _ in missing},
+                    rule_id__in={rule_id for _, rule_id in missing},
                 )
                 for status in statuses:
-                    rule_statuses[status.rule_id] = status
-                    missing_rule_ids.remove(status.rule_id)
-                    to_cache.append(status)
+                    group_and_rule_id = (status.group_id, status.rule_id)
+                    if group_and_rule_id in missing:
+                        rule_statuses[group_and_rule_id] = status
+                        missing.remove(group_and_rule_id)
+                        to_cache.append(status)
 
-                if missing_rule_ids:
+                if missing:
                     # Shouldn't happen, but log just in case
-                    self.logger.error(
+                    cls.logger.error(
                         "Failed to fetch some GroupRuleStatuses in RuleProcessor",
-                        extra={"missing_rule_ids": missing_rule_ids, "group_id": self.group.id},
+                        extra={
+                            "missing_rule_ids": {rule_id for _, rule_id in missing},
+                            "group_ids": sorted({group_id for group_id, _ in missing}),
+                        },
                     )
             if to_cache:
                 cache.set_many(
-                    {self._build_rule_status_cache_key(item.rule_id): item for item in to_cache}
+                    {
+                        build_rule_status_cache_key(item.group_id, item.rule_id): item
+                        for item in to_cache
+                    }
                 )
 
         return rule_statuses
@@ -127,12 +185,29 @@ class RuleProcessor:
             self.logger.warning("Unregistered condition %r", condition["id"])
             return None
 
-        condition_inst = condition_cls(self.project, data=condition, rule=rule)
+        condition_inst = self.get_condition_instance(condition_cls, condition, rule)
         passes: bool = safe_execute(
             condition_inst.passes, self.event, state, _with_transaction=False
         )
         return passes
 
+    def get_condition_instance(
+        self, condition_cls: type[RuleBase], condition: Mapping[str, Any], rule: Rule
+    ) -> RuleBase:
+        if self.batch_conditions is None:
+            return condition_cls(self.project, data=condition, rule=rule)
+
+        # All processors of a batch evaluate the same rule objects, so the
+        # identity of a condition's data is stable for the batch.
+        key = (rule.id, id(condition))
+        condition_inst = self.batch_conditions.get(key)
+        if condition_inst is None:
+            condition_inst = condition_cls(self.project, data=condition, rule=rule)
+            if isinstance(condition_inst, EventCondition):
+                condition_inst.prepare_batch(self.batch_events)
+            self.batch_conditions[key] = condition_inst
+        return condition_inst
+
     def get_rule_type(self, condition: Mapping[str, Any]) -> str | None:
         rule_cls = rules.get(condition["id"])
         if rule_cls is None:
@@ -255,21 +330,76 @@ class RuleProcessor:
                 else:
                     self.grouped_futures[key][1].append(rule_future)
 
-    def apply(
-        self,
-    ) -> Iterable[Tuple[Callable[[GroupEvent, Sequence[RuleFuture]], None], List[RuleFuture]]]:
+    def apply(self) -> RuleCallbacks:
         # we should only apply rules on unresolved issues
         if not self.event.group.is_unresolved():
             return {}.values()
 
-        self.grouped_futures.clear()
         rules = self.get_rules()
         snoozed_rules = RuleSnooze.objects.filter(rule__in=rules, user_id=None).values_list(
             "rule", flat=True
         )
         rule_statuses = self.bulk_get_rule_status(rules)
+        return self.apply_rules(rules, snoozed_rules, rule_statuses)
+
+    def apply_rules(
+        self,
+        rules: Sequence[Rule],
+        snoozed_rules: Collection[int],
+        rule_statuses: Mapping[int, GroupRuleStatus],
+    ) -> RuleCallbacks:
+        self.grouped_futures.clear()
         for rule in rules:
             if rule.id not in snoozed_rules:
                 self.apply_rule(rule, rule_statuses[rule.id])
 
         return self.grouped_futures.values()
+
+    @classmethod
+    def apply_batch(cls, processors: Sequence[RuleProcessor]) -> List[RuleCallbacks]:
+        """
+        Applies the rules of a project to the events of several processors at
+        once, and returns what ``apply`` would return for each processor.
+
+        Rules, snoozes and rule statuses are fetched once for all events, and
+        conditions are able to query data for all of their groups at once, e.g.
+        the event frequency conditions.
+        """
+        if len({processor.project.id for processor in processors}) > 1:
+            raise ValueError("Rules can only be applied to events of a single project at once")
+
+        active_processors = [
+            processor for processor in processors if processor.event.group.is_unresolved()
+        ]
+        if active_processors:
+            rules = active_processors[0].get_rules()
+            snoozed_rules = set(
+                RuleSnooze.objects.filter(rule__in=rules, user_id=None).values_list(
+                    "rule", flat=True
+                )
+            )
+            rule_statuses = cls.bulk_get_rule_statuses(
+                active_processors[0].project,
+                [processor.group for processor in active_processors],
+                rules,
+            )
+
+            batch_conditions: MutableMapping[Tuple[int, int], RuleBase] = {}
+            batch_events = [processor.event for processor in active_processors]
+            for processor in active_processors:
+                processor.batch_conditions = batch_conditions
+                processor.batch_events = batch_events
+                try:
+                    processor.apply_rules(
+                        rules,
+                        snoozed_rules,
+                        {rule.id: rule_statuses[(processor.group.id, rule.id)] for rule in rules},
+                    )
+                finally:
+                    processor.batch_conditions = None
+                    processor.batch_events = ()
+
+        return [
+            processor.grouped_futures.values() if processor in active_processors else {}.values()
+            for processor in processors
+        ]
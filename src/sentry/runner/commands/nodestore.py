@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+import click
+
+from sentry.runner.decorators import configuration
+
+
+@click.group()
+def nodestore():
+    """Tools for interacting with the node storage."""
+
+
+@nodestore.command("train-dictionary")
+@click.option("--platform", required=True, help="Platform of the events to train on.")
+@click.option(
+    "--project",
+    "project_ids",
+    type=int,
+    multiple=True,
+    required=True,
+    help="Project to sample events from. Can be passed multiple times.",
+)
+@click.option("--samples", default=2000, show_default=True, help="Number of events to sample.")
+@click.option("--days", default=7, show_default=True, help="Sample events from the last N days.")
+@click.option("--size", default=112640, show_default=True, help="Maximum dictionary size in bytes.")
+@configuration
+def train_dictionary(platform, project_ids, samples, days, size):
+    """
+    Train a zstd dictionary on sampled event payloads of a platform.
+
+    The dictionary is written to SENTRY_NODESTORE_DICTIONARIES_PATH and is
+    used for all subsequent writes of events of that platform. Running
+    processes pick it up within a minute. Previously trained dictionaries are
+    kept around so existing nodes stay readable.
+    """
+    import zstandard
+    from django.conf import settings
+    from django.utils import timezone
+
+    from sentry import eventstore
+    from sentry.nodestore.base import json_dumps
+    from sentry.nodestore.compression import CompressionDictionaries
+
+    if not settings.SENTRY_NODESTORE_DICTIONARIES_PATH:
+        raise click.ClickException("SENTRY_NODESTORE_DICTIONARIES_PATH is not configured.")
+
+    end = timezone.now()
+    snuba_filter = eventstore.Filter(
+        project_ids=list(project_ids),
+        start=end - timedelta(days=days),
+        end=end,
+        conditions=[["platform", "=", platform]],
+    )
+
+    payloads = []
+    while len(payloads) < samples:
+        events = eventstore.get_events(
+            snuba_filter,
+            limit=min(100, samples - len(payloads)),
+            offset=len(payloads),
+            referrer="nodestore.train_dictionary",
+        )
+        if not events:
+            break
+        payloads.extend(json_dumps(dict(event.data)).encode("utf8") for event in events)
+
+    if not payloads:
+        raise click.ClickException(f"No {platform} events found.")
+
+    click.echo(f"Training on {len(payloads)} {platform} events...")
+    dictionary = zstandard.train_dictionary(size, payloads)
+
+    raw_size = sum(len(payload) for payload in payloads)
+    compressor = zstandard.ZstdCompressor(dict_data=dictionary)
+    compressed_size = sum(len(compressor.compress(payload)) for payload in payloads)
+
+    dictionaries = CompressionDictionaries(settings.SENTRY_NODESTORE_DICTIONARIES_PATH)
+    dictionary_id = dictionaries.add(platform, dictionary)
+    click.echo(
+        f"Wrote dictionary {dictionary_id} for {platform} "
+        f"(compression ratio on samples: {raw_size / compressed_size:.1f}x)"
+    )
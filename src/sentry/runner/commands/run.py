@@ -553,6 +553,47 @@ def ingest_consumer(consumer_types, all_consumer_types, **options):
         run_processor_with_signals(consumer)
 
 
+@run.command("ingest-parallel-consumer")
+@log_options()
+@click.option(
+    "consumer_type",
+    "--consumer-type",
+    required=True,
+    help="Specify which type of consumer to create, i.e. from which topic to consume messages.",
+    type=click.Choice(ConsumerType.all()),
+)
+@kafka_options("ingest-consumer", include_batching_options=True, default_max_batch_size=100)
+@strict_offset_reset_option()
+@click.option(
+    "--processes",
+    default=1,
+    type=int,
+    help="Number of processes used to decode messages.",
+)
+@click.option("--input-block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+@click.option("--output-block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+@click.option(
+    "--parse-payloads",
+    is_flag=True,
+    default=False,
+    help="Parse the JSON payload of events in the decoding processes as well.",
+)
+@configuration
+def ingest_parallel_consumer(consumer_type, **options):
+    """
+    Runs an "ingest consumer" task built on Arroyo.
+
+    Same as "ingest-consumer", but decodes messages in multiple processes and
+    processes them in batches grouped by project.
+    """
+    from sentry.ingest.parallel_consumer import get_ingest_parallel_consumer
+    from sentry.utils import metrics
+
+    with metrics.global_tags(ingest_consumer_types=consumer_type, _all_threads=True):
+        consumer = get_ingest_parallel_consumer(consumer_type=consumer_type, **options)
+        run_processor_with_signals(consumer)
+
+
 @run.command("occurrences-ingest-consumer")
 @kafka_options(
     "occurrence-consumer",
@@ -1,12 +1,16 @@
 import math
+import threading
 from datetime import datetime, timedelta
 from typing import (
     Any,
     Callable,
     Dict,
+    Hashable,
+    Iterator,
     List,
     Mapping,
     Match,
+    NamedTuple,
     Optional,
     Sequence,
     Set,
@@ -16,6 +20,7 @@ from typing import (
 )
 
 import sentry_sdk
+from cachetools import LRUCache
 from django.utils.functional import cached_property
 from parsimonious.exceptions import ParseError
 from snuba_sdk import (
@@ -40,6 +45,7 @@ from snuba_sdk import (
     Request,
 )
 
+from sentry import options
 from sentry.api import event_search
 from sentry.discover.arithmetic import (
     OperandType,
@@ -72,6 +78,7 @@ from sentry.search.events.types import (
     WhereType,
 )
 from sentry.snuba.metrics.utils import MetricMeta
+from sentry.utils import metrics
 from sentry.utils.dates import outside_retention_with_modified_start, to_timestamp
 from sentry.utils.snuba import (
     Dataset,
@@ -86,6 +93,58 @@ from sentry.utils.snuba import (
 )
 from sentry.utils.validators import INVALID_ID_DETAILS, INVALID_SPAN_ID, WILDCARD_NOT_ALLOWED
 
+# Number of resolved query plans kept per process, see QueryBuilder.resolve_plan.
+PLAN_CACHE_SIZE = 1000
+
+_plan_cache: LRUCache = LRUCache(maxsize=PLAN_CACHE_SIZE)
+_plan_cache_lock = threading.Lock()
+
+
+class QueryPlan(NamedTuple):
+    """
+    The resolved select, orderby and groupby of a query, and the state that
+    resolving them added to the builder. Functions are kept by name so that
+    they can be bound to the function converter of the builder reusing the plan.
+    """
+
+    columns: List[SelectType]
+    orderby: List[OrderBy]
+    groupby: List[SelectType]
+    aggregates: List[CurriedFunction]
+    # alias: (field, function name, arguments)
+    functions: Dict[str, Tuple[str, str, Mapping[str, fields.NormalizedArg]]]
+    equation_alias_map: Dict[str, SelectType]
+    meta_resolver_map: Dict[str, str]
+    prefixed_to_tag_map: Dict[str, str]
+    tag_to_prefixed_map: Dict[str, str]
+
+
+def _get_added_items(before: Mapping[str, Any], after: Mapping[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in after.items() if before.get(key) is not value}
+
+
+class _RecordedParams(Mapping[str, Any]):
+    """
+    Filter params that mark the plan of a builder as depending on them once
+    they are read.
+    """
+
+    def __init__(self, builder: "QueryBuilder", params: ParamsType) -> None:
+        self.builder = builder
+        self.params = params
+
+    def __getitem__(self, key: str) -> Any:
+        self.builder._plan_depends_on_params = True
+        return self.params[key]
+
+    def __iter__(self) -> Iterator[str]:
+        self.builder._plan_depends_on_params = True
+        return iter(self.params)
+
+    def __len__(self) -> int:
+        self.builder._plan_depends_on_params = True
+        return len(self.params)
+
 
 class BaseQueryBuilder:
     requires_organization_condition: bool = False
@@ -97,6 +156,20 @@ class QueryBuilder(BaseQueryBuilder):
 
     spans_metrics_builder = False
 
+    # Set while the plan of the query is resolved, see resolve_plan.
+    _recording_plan = False
+    _plan_depends_on_params = False
+
+    @property
+    def params(self) -> SnubaParams:
+        if self._recording_plan:
+            self._plan_depends_on_params = True
+        return self._params
+
+    @params.setter
+    def params(self, params: SnubaParams) -> None:
+        self._params = params
+
     def _dataclass_params(
         self, snuba_params: Optional[SnubaParams], params: ParamsType
     ) -> SnubaParams:
@@ -316,12 +389,142 @@ class QueryBuilder(BaseQueryBuilder):
         with sentry_sdk.start_span(op="QueryBuilder", description="resolve_params"):
             # params depends on parse_query, and conditions being resolved first since there may be projects in conditions
             self.where += self.resolve_params()
-        with sentry_sdk.start_span(op="QueryBuilder", description="resolve_columns"):
-            self.columns = self.resolve_select(selected_columns, equations)
-        with sentry_sdk.start_span(op="QueryBuilder", description="resolve_orderby"):
-            self.orderby = self.resolve_orderby(orderby)
-        with sentry_sdk.start_span(op="QueryBuilder", description="resolve_groupby"):
-            self.groupby = self.resolve_groupby(groupby_columns)
+        self.resolve_plan(selected_columns, groupby_columns, equations, orderby)
+
+    def get_plan_cache_key(
+        self,
+        selected_columns: Optional[List[str]],
+        groupby_columns: Optional[List[str]],
+        equations: Optional[List[str]],
+        orderby: Optional[Union[List[str], str]],
+    ) -> Optional[Hashable]:
+        """
+        Returns the key of the plan of the query, or ``None`` if it should not
+        be cached.
+
+        Plans only depend on the resolved fields, the options of the builder,
+        the organization and the tags already resolved by the conditions.
+        Aggregates resolved by the conditions change the groupby, so queries
+        with aggregate conditions are not cached.
+        """
+        if (
+            not isinstance(self.config, DiscoverDatasetConfig)
+            or self.aggregates
+            or not options.get("discover.query-builder.plan-cache")
+        ):
+            return None
+
+        # Values cached while resolving the conditions depend on the params,
+        # but would not be read from them again by the plan.
+        if (
+            "custom_measurement_map" in self.__dict__
+            or "_resolve_project_threshold_config" in self.config.__dict__
+        ):
+            return None
+
+        return (
+            type(self),
+            self.dataset,
+            self.organization_id,
+            tuple(selected_columns or ()),
+            tuple(groupby_columns or ()),
+            tuple(equations or ()),
+            orderby if isinstance(orderby, str) else tuple(orderby or ()),
+            tuple(sorted(self.functions_acl)),
+            tuple(sorted(self.equation_config.items())),
+            self.auto_fields,
+            self.has_metrics,
+            self.transform_alias_to_input_format,
+            self.skip_tag_resolution,
+            self.use_metrics_layer,
+            tuple(sorted(self.tag_to_prefixed_map.items())),
+        )
+
+    def resolve_plan(
+        self,
+        selected_columns: Optional[List[str]],
+        groupby_columns: Optional[List[str]],
+        equations: Optional[List[str]],
+        orderby: Optional[Union[List[str], str]],
+    ) -> None:
+        """
+        Resolves the select, orderby and groupby of the query.
+
+        Resolved plans are reused by the queries with the same cache key.
+        Plans that read the params of the query while being resolved, such as
+        the `project` field which resolves the slugs of the projects, or that
+        add state which cannot be shared between builders are not cached.
+        """
+        cache_key = self.get_plan_cache_key(selected_columns, groupby_columns, equations, orderby)
+        if cache_key is not None:
+            with _plan_cache_lock:
+                plan = _plan_cache.get(cache_key)
+            if plan is not None:
+                metrics.incr("query_builder.plan_cache", tags={"result": "hit"})
+                sentry_sdk.set_tag("query.has_equations", bool(equations))
+                self.apply_plan(plan)
+                return
+            metrics.incr("query_builder.plan_cache", tags={"result": "miss"})
+
+        aggregates_count = len(self.aggregates)
+        function_alias_map = dict(self.function_alias_map)
+        equation_alias_map = dict(self.equation_alias_map)
+        value_resolver_map = dict(self.value_resolver_map)
+        meta_resolver_map = dict(self.meta_resolver_map)
+        prefixed_to_tag_map = dict(self.prefixed_to_tag_map)
+        tag_to_prefixed_map = dict(self.tag_to_prefixed_map)
+
+        self._recording_plan = cache_key is not None
+        try:
+            with sentry_sdk.start_span(op="QueryBuilder", description="resolve_columns"):
+                self.columns = self.resolve_select(selected_columns, equations)
+            with sentry_sdk.start_span(op="QueryBuilder", description="resolve_orderby"):
+                self.orderby = self.resolve_orderby(orderby)
+            with sentry_sdk.start_span(op="QueryBuilder", description="resolve_groupby"):
+                self.groupby = self.resolve_groupby(groupby_columns)
+        finally:
+            self._recording_plan = False
+
+        if (
+            cache_key is None
+            or self._plan_depends_on_params
+            or self.requires_other_aggregates
+            or _get_added_items(value_resolver_map, self.value_resolver_map)
+        ):
+            return
+
+        plan = QueryPlan(
+            columns=list(self.columns),
+            orderby=list(self.orderby),
+            groupby=list(self.groupby),
+            aggregates=self.aggregates[aggregates_count:],
+            functions={
+                alias: (details.field, details.instance.name, dict(details.arguments))
+                for alias, details in _get_added_items(
+                    function_alias_map, self.function_alias_map
+                ).items()
+            },
+            equation_alias_map=_get_added_items(equation_alias_map, self.equation_alias_map),
+            meta_resolver_map=_get_added_items(meta_resolver_map, self.meta_resolver_map),
+            prefixed_to_tag_map=_get_added_items(prefixed_to_tag_map, self.prefixed_to_tag_map),
+            tag_to_prefixed_map=_get_added_items(tag_to_prefixed_map, self.tag_to_prefixed_map),
+        )
+        with _plan_cache_lock:
+            _plan_cache[cache_key] = plan
+
+    def apply_plan(self, plan: QueryPlan) -> None:
+        self.columns = list(plan.columns)
+        self.orderby = list(plan.orderby)
+        self.groupby = list(plan.groupby)
+        self.aggregates.extend(plan.aggregates)
+        for alias, (field, name, arguments) in plan.functions.items():
+            self.function_alias_map[alias] = fields.FunctionDetails(
+                field, self.function_converter[name], dict(arguments)
+            )
+        self.equation_alias_map.update(plan.equation_alias_map)
+        self.meta_resolver_map.update(plan.meta_resolver_map)
+        self.prefixed_to_tag_map.update(plan.prefixed_to_tag_map)
+        self.tag_to_prefixed_map.update(plan.tag_to_prefixed_map)
 
     def load_config(
         self,
@@ -558,6 +761,8 @@ class QueryBuilder(BaseQueryBuilder):
                 "Invalid date range. Please try a more recent date range."
             )
 
+        # The time range has to follow the conditions of the query, as it is
+        # told apart from them by position when cached, see _round_query_times.
         if self.start:
             conditions.append(Condition(self.column("timestamp"), Op.GTE, self.start))
         if self.end:
@@ -724,9 +929,10 @@ class QueryBuilder(BaseQueryBuilder):
 
         combinator_applied = False
 
-        arguments = snql_function.format_as_arguments(
-            name, parsed_arguments, self.filter_params, combinator
-        )
+        params = self.filter_params
+        if self._recording_plan:
+            params = _RecordedParams(self, params)
+        arguments = snql_function.format_as_arguments(name, parsed_arguments, params, combinator)
 
         self.function_alias_map[alias] = fields.FunctionDetails(
             function, snql_function, arguments.copy()
@@ -1,14 +1,27 @@
 from __future__ import annotations
 
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import TYPE_CHECKING, List, Mapping, Optional, Sequence, Tuple, TypedDict, Union
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypedDict,
+    Union,
+)
 
 import sentry_sdk
 from django.conf import settings
+from django.db import connections
 from django.utils import timezone
 
-from sentry import features
+from sentry import features, options
 from sentry.exceptions import PluginError
 from sentry.issues.grouptype import GroupCategory
 from sentry.issues.issue_occurrence import IssueOccurrence
@@ -23,6 +36,7 @@ from sentry.utils.locking.manager import LockManager
 from sentry.utils.safe import safe_execute
 from sentry.utils.sdk import bind_organization_context, set_current_event_project
 from sentry.utils.services import build_instance_from_options
+from sentry.utils.worker_cache import post_process_cache
 
 if TYPE_CHECKING:
     from sentry.eventstore.models import Event, GroupEvent
@@ -43,42 +57,64 @@ class PostProcessJob(TypedDict, total=False):
     has_alert: bool
 
 
+PostProcessStep = Callable[[PostProcessJob], None]
+
+# Upper bound for the number of concurrent pipeline steps of a worker process.
+MAX_CONCURRENT_STEPS = 4
+
+_step_executor = ThreadPoolExecutor(
+    max_workers=MAX_CONCURRENT_STEPS, thread_name_prefix="post-process-step"
+)
+
+
 def _get_service_hooks(project_id):
     from sentry.models import ServiceHook
 
-    cache_key = f"servicehooks:1:{project_id}"
-    result = cache.get(cache_key)
+    def fetch():
+        cache_key = f"servicehooks:1:{project_id}"
+        result = cache.get(cache_key)
 
-    if result is None:
-        hooks = ServiceHook.objects.filter(servicehookproject__project_id=project_id)
-        result = [(h.id, h.events) for h in hooks]
-        cache.set(cache_key, result, 60)
-    return result
+        if result is None:
+            hooks = ServiceHook.objects.filter(servicehookproject__project_id=project_id)
+            result = [(h.id, h.events) for h in hooks]
+            cache.set(cache_key, result, 60)
+        return result
+
+    return post_process_cache.get(("project", project_id), "servicehooks", fetch)
 
 
 def _should_send_error_created_hooks(project):
     from sentry.models import Organization, ServiceHook
 
-    cache_key = f"servicehooks-error-created:1:{project.id}"
-    result = cache.get(cache_key)
+    def fetch():
+        cache_key = f"servicehooks-error-created:1:{project.id}"
+        result = cache.get(cache_key)
 
-    if result is None:
+        if result is None:
 
-        org = Organization.objects.get_from_cache(id=project.organization_id)
-        if not features.has("organizations:integrations-event-hooks", organization=org):
-            cache.set(cache_key, 0, 60)
-            return False
+            org = Organization.objects.get_from_cache(id=project.organization_id)
+            if not features.has("organizations:integrations-event-hooks", organization=org):
+                cache.set(cache_key, 0, 60)
+                return False
 
-        result = (
-            ServiceHook.objects.filter(organization_id=org.id)
-            .extra(where=["events @> '{error.created}'"])
-            .exists()
-        )
+            result = (
+                ServiceHook.objects.filter(organization_id=org.id)
+                .extra(where=["events @> '{error.created}'"])
+                .exists()
+            )
+
+            cache_value = 1 if result else 0
+            cache.set(cache_key, cache_value, 60)
 
-        cache_value = 1 if result else 0
-        cache.set(cache_key, cache_value, 60)
+        return result
 
-    return result
+    # Organization-wide hooks are invalidated through the organization.
+    return post_process_cache.get(
+        ("organization", project.organization_id),
+        "servicehooks-error-created",
+        fetch,
+        key=str(project.id),
+    )
 
 
 def should_write_event_stats(event: Event):
@@ -407,9 +443,12 @@ def post_process_group(
     """
     Fires post processing hooks for a group.
     """
+    from sentry import nodestore
     from sentry.utils import snuba
 
-    with snuba.options_override({"consistent": True}):
+    with snuba.options_override({"consistent": True}), nodestore.local_cache(
+        enabled=options.get("nodestore.local-cache")
+    ), post_process_cache.enabled(ttl=options.get("post-process.worker-cache.ttl")):
         from sentry import eventstore
         from sentry.eventstore.processing import event_processing_store
         from sentry.ingest.transaction_clusterer.datasource.redis import (
@@ -478,13 +517,21 @@ def post_process_group(
         # from cache which may contain stale parent models.
         with sentry_sdk.start_span(op="tasks.post_process_group.project_get_from_cache"):
             try:
-                event.project = Project.objects.get_from_cache(id=event.project_id)
+                event.project = post_process_cache.get(
+                    ("project", event.project_id),
+                    "project",
+                    lambda: Project.objects.get_from_cache(id=event.project_id),
+                )
             except Project.DoesNotExist:
                 # project probably got deleted while this task was sitting in the queue
                 return
             event.project.set_cached_field_value(
                 "organization",
-                Organization.objects.get_from_cache(id=event.project.organization_id),
+                post_process_cache.get(
+                    ("organization", event.project.organization_id),
+                    "organization",
+                    lambda: Organization.objects.get_from_cache(id=event.project.organization_id),
+                ),
             )
 
         is_reprocessed = is_reprocessed_event(event.data)
@@ -564,20 +611,62 @@ def run_post_process_job(job: PostProcessJob):
         # specific pipelines for issue types
         pipeline = GROUP_CATEGORY_POST_PROCESS_PIPELINE[issue_category]
 
+    run_concurrently = options.get("post-process.concurrent-steps")
+    futures: MutableMapping[PostProcessStep, Future[None]] = {}
+
     for pipeline_step in pipeline:
-        try:
-            with sentry_sdk.start_span(op=f"tasks.post_process_group.{pipeline_step.__name__}"):
-                pipeline_step(job)
-        except Exception:
-            issue_category_metric = issue_category.name.lower() if issue_category else None
-            metrics.incr(
-                "sentry.tasks.post_process.post_process_group.exception",
-                tags={"issue_category": issue_category_metric},
-            )
-            logger.exception(
-                f"Failed to process pipeline step {pipeline_step.__name__}",
-                extra={"event": group_event, "group": group_event.group},
-            )
+        dependencies = CONCURRENT_POST_PROCESS_STEPS.get(pipeline_step)
+        if not run_concurrently or dependencies is None:
+            _run_pipeline_step(job, pipeline_step)
+            continue
+
+        # Dependencies that are not run concurrently come earlier in the
+        # pipeline and have already completed at this point.
+        for dependency in dependencies:
+            if dependency in futures:
+                futures[dependency].result()
+
+        futures[pipeline_step] = _step_executor.submit(
+            _run_concurrent_pipeline_step,
+            sentry_sdk.Hub(sentry_sdk.Hub.current),
+            job,
+            pipeline_step,
+        )
+
+    for future in futures.values():
+        future.result()
+
+
+def _run_pipeline_step(job: PostProcessJob, pipeline_step: PostProcessStep) -> None:
+    group_event = job["event"]
+    try:
+        with sentry_sdk.start_span(
+            op=f"tasks.post_process_group.{pipeline_step.__name__}"
+        ), metrics.timer("tasks.post_process.run_step", tags={"step": pipeline_step.__name__}):
+            pipeline_step(job)
+    except Exception:
+        issue_category = group_event.group.issue_category
+        issue_category_metric = issue_category.name.lower() if issue_category else None
+        metrics.incr(
+            "sentry.tasks.post_process.post_process_group.exception",
+            tags={"issue_category": issue_category_metric},
+        )
+        logger.exception(
+            f"Failed to process pipeline step {pipeline_step.__name__}",
+            extra={"event": group_event, "group": group_event.group},
+        )
+
+
+def _run_concurrent_pipeline_step(
+    hub: sentry_sdk.Hub, job: PostProcessJob, pipeline_step: PostProcessStep
+) -> None:
+    try:
+        with hub, post_process_cache.enabled(ttl=options.get("post-process.worker-cache.ttl")):
+            _run_pipeline_step(job, pipeline_step)
+    finally:
+        # The step threads outlive the task, and would otherwise each hold on
+        # to their database connections while idle.
+        connections.close_all()
 
 
 def process_event(data: dict, group_id: Optional[int]) -> Event:
@@ -1063,3 +1152,15 @@ GENERIC_POST_PROCESS_PIPELINE = [
     process_inbox_adds,
     process_rules,
 ]
+
+# Steps that only read state or enqueue tasks, mapped to the steps they depend
+# on. With ``post-process.concurrent-steps`` enabled, they run in a thread pool
+# while the remaining steps continue in order on the task's thread. A
+# dependency has to come earlier in the pipeline than the step depending on it.
+CONCURRENT_POST_PROCESS_STEPS: Mapping[PostProcessStep, Sequence[PostProcessStep]] = {
+    process_commits: (),
+    process_code_mappings: (),
+    # Reads ``has_alert``, which is set by ``process_rules``.
+    process_service_hooks: (process_rules,),
+    process_similarity: (),
+}
@@ -1,7 +1,8 @@
 import logging
+import random
 from datetime import datetime
 from time import time
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
 
 import sentry_sdk
 from django.conf import settings
@@ -17,7 +18,11 @@ from sentry.eventstore.processing.base import Event
 from sentry.killswitches import killswitch_matches_context
 from sentry.lang.native.symbolicator import SymbolicatorTaskKind
 from sentry.models import Activity, Organization, Project, ProjectOption
-from sentry.stacktraces.processing import process_stacktraces, should_process_for_stacktraces
+from sentry.stacktraces.processing import (
+    find_stacktraces_in_data,
+    process_stacktraces,
+    should_process_for_stacktraces,
+)
 from sentry.tasks.base import instrumented_task
 from sentry.types.activity import ActivityType
 from sentry.utils import metrics
@@ -37,13 +42,31 @@ class RetryProcessing(Exception):
     pass
 
 
-@metrics.wraps("should_process")
 def should_process(data: CanonicalKeyDict) -> bool:
     """Quick check if processing is needed at all."""
-    from sentry.plugins.base import plugins
+    return _should_process(data)[0]
+
 
+@metrics.wraps("should_process")
+def _should_process(data: CanonicalKeyDict) -> Tuple[bool, bool]:
+    """
+    Like ``should_process``, but also returns whether the event has any
+    preprocessors.
+    """
     if data.get("type") == "transaction":
-        return False
+        return False, False
+
+    if _has_event_preprocessors(data):
+        return True, True
+
+    if should_process_for_stacktraces(data):
+        return True, False
+
+    return False, False
+
+
+def _has_event_preprocessors(data: CanonicalKeyDict) -> bool:
+    from sentry.plugins.base import plugins
 
     for plugin in plugins.all(version=2):
         processors = safe_execute(
@@ -52,12 +75,38 @@ def should_process(data: CanonicalKeyDict) -> bool:
         if processors:
             return True
 
-    if should_process_for_stacktraces(data):
-        return True
-
     return False
 
 
+def should_process_and_save_inline(
+    data: CanonicalKeyDict,
+    has_attachments: bool,
+    has_event_preprocessors: bool,
+    from_reprocessing: bool,
+) -> bool:
+    """
+    Check if an event that needs processing (but no symbolication) only needs
+    stacktrace processing and is small enough to be processed and saved in a
+    single task instead of going through ``process_event`` and ``save_event``.
+
+    Reprocessed events are excluded, as they have their own queues.
+    """
+    if has_attachments or has_event_preprocessors or from_reprocessing:
+        return False
+
+    if random.random() >= options.get("store.process-and-save-inline-rate"):
+        return False
+
+    max_frames = options.get("store.process-and-save-inline.max-frames")
+    num_frames = 0
+    for info in find_stacktraces_in_data(data, with_exceptions=True):
+        num_frames += len(info.stacktrace.get("frames") or ())
+        if num_frames > max_frames:
+            return False
+
+    return True
+
+
 def submit_process(
     from_reprocessing: bool,
     cache_key: str,
@@ -162,6 +211,7 @@ def _do_preprocess_event(
             task_kind = SymbolicatorTaskKind(
                 is_js=is_js, is_low_priority=is_low_priority, is_reprocessing=from_reprocessing
             )
+            metrics.incr("events.preprocess.path", tags={"path": "symbolicate"})
             submit_symbolicate(
                 task_kind,
                 cache_key=cache_key,
@@ -173,7 +223,22 @@ def _do_preprocess_event(
         # else: go directly to process, do not go through the symbolicate queue, do not collect 200
 
     # NOTE: Events considered for symbolication always go through `do_process_event`
-    if symbolication_function or should_process(data):
+    needs_processing, has_event_preprocessors = (
+        (True, False) if symbolication_function else _should_process(data)
+    )
+    if needs_processing:
+        if not symbolication_function and should_process_and_save_inline(
+            data, has_attachments, has_event_preprocessors, from_reprocessing
+        ):
+            metrics.incr("events.preprocess.path", tags={"path": "process_and_save"})
+            process_and_save_event.delay(
+                cache_key=cache_key,
+                start_time=start_time,
+                event_id=event_id,
+            )
+            return
+
+        metrics.incr("events.preprocess.path", tags={"path": "process"})
         submit_process(
             from_reprocessing=from_reprocessing,
             cache_key=cache_key,
@@ -184,6 +249,7 @@ def _do_preprocess_event(
         )
         return
 
+    metrics.incr("events.preprocess.path", tags={"path": "save"})
     submit_save_event(
         project_id=project_id,
         from_reprocessing=from_reprocessing,
@@ -278,6 +344,7 @@ def do_process_event(
     data_has_changed: bool = False,
     from_symbolicate: bool = False,
     has_attachments: bool = False,
+    save_inline: bool = False,
 ) -> None:
     from sentry.plugins.base import plugins
 
@@ -299,6 +366,16 @@ def do_process_event(
     event_id = data["event_id"]
 
     def _continue_to_save_event() -> None:
+        if save_inline:
+            _do_save_event(
+                cache_key=cache_key,
+                data=data,
+                start_time=start_time,
+                event_id=event_id,
+                project_id=project_id,
+            )
+            return
+
         from_reprocessing = process_task is process_event_from_reprocessing
         submit_save_event(
             project_id=project_id,
@@ -439,7 +516,10 @@ def do_process_event(
             _do_preprocess_event(cache_key, data, start_time, event_id, process_task, project)
             return
 
-        cache_key = processing.event_processing_store.store(data)
+        # When saving inline the event is passed on directly, and saving it
+        # writes it back to the processing store for post-processing.
+        if not save_inline:
+            cache_key = processing.event_processing_store.store(data)
 
     return _continue_to_save_event()
 
@@ -506,6 +586,31 @@ def process_event_from_reprocessing(
     )
 
 
+@instrumented_task(  # type: ignore
+    name="sentry.tasks.store.process_and_save_event",
+    queue="events.process_event",
+    time_limit=125,
+    soft_time_limit=120,
+)
+def process_and_save_event(
+    cache_key: str,
+    start_time: Optional[int] = None,
+    event_id: Optional[str] = None,
+    **kwargs: Any,
+) -> None:
+    """
+    Processes and saves an event in a single task, for events that only need
+    trivial processing (see ``should_process_and_save_inline``).
+    """
+    return do_process_event(
+        cache_key=cache_key,
+        start_time=start_time,
+        event_id=event_id,
+        process_task=process_event,
+        save_inline=True,
+    )
+
+
 def delete_raw_event(
     project_id: int, event_id: Optional[str], allow_hint_clear: bool = False
 ) -> None:
@@ -749,6 +854,107 @@ def _do_save_event(
             time_synthetic_monitoring_event(data, project_id, start_time)
 
 
+def _do_save_event_batch(project_id: int, events: Sequence[Mapping[str, Any]]) -> None:
+    """
+    Saves several events of a project like ``_do_save_event``, reading them
+    from and writing them back to the processing store at once. ``events``
+    holds the ``cache_key``, ``start_time`` and ``event_id`` of each event.
+    """
+
+    set_current_event_project(project_id)
+
+    from sentry.event_manager import EventManager, save_events
+
+    with metrics.timer("tasks.store.do_save_event_batch.get_cache"):
+        cached_data = processing.event_processing_store.get_many(
+            [event["cache_key"] for event in events]
+        )
+
+    loaded: List[Tuple[Mapping[str, Any], CanonicalKeyDict]] = []
+    discarded: List[str] = []
+    for event in events:
+        data = cached_data.get(event["cache_key"])
+        if data is not None:
+            data = CanonicalKeyDict(data)
+
+        # See _do_save_event
+        if not data or reprocessing.event_supports_reprocessing(data):
+            with metrics.timer("tasks.store.do_save_event.delete_raw_event"):
+                delete_raw_event(project_id, event["event_id"], allow_hint_clear=True)
+
+        if not data:
+            metrics.incr(
+                "events.failed", tags={"reason": "cache", "stage": "post"}, skip_internal=False
+            )
+            continue
+
+        loaded.append((event, data))
+        if killswitch_matches_context(
+            "store.load-shed-save-event-projects",
+            {
+                "project_id": project_id,
+                "event_type": data.get("type") or "none",
+                "platform": data.get("platform") or "none",
+            },
+        ):
+            discarded.append(event["cache_key"])
+
+    to_save = [(event, data) for event, data in loaded if event["cache_key"] not in discarded]
+
+    try:
+        if to_save:
+            with metrics.timer("tasks.store.do_save_event_batch.save_events"):
+                managers = [EventManager(data) for _, data in to_save]
+                save_events(
+                    project_id,
+                    managers,
+                    assume_normalized=True,
+                    start_times=[event["start_time"] for event, _ in to_save],
+                    cache_keys=[event["cache_key"] for event, _ in to_save],
+                    auto_upgrade_grouping=True,
+                )
+
+            # Put the updated events back into the cache so that post_process
+            # has the most recent data.
+            saved_data = []
+            for manager in managers:
+                data = manager.get_data()
+                if isinstance(data, CANONICAL_TYPES):
+                    data = dict(data.items())
+                saved_data.append(data)
+            with metrics.timer("tasks.store.do_save_event_batch.write_processing_cache"):
+                processing.event_processing_store.store_many(saved_data)
+    except Exception:
+        metrics.incr("events.save_event_batch.exception")
+        raise
+
+    finally:
+        # Delete the payloads of discarded events since they won't show up in
+        # post-processing.
+        if discarded:
+            with metrics.timer("tasks.store.do_save_event_batch.delete_cache"):
+                processing.event_processing_store.delete_many(discarded)
+
+        for event, data in loaded:
+            reprocessing2.mark_event_reprocessed(data)
+            attachment_cache.delete(event["cache_key"])
+
+            start_time = event["start_time"]
+            if start_time:
+                metrics.timing(
+                    "events.time-to-process",
+                    time() - start_time,
+                    instance=data["platform"],
+                    tags={
+                        "is_reprocessing2": "true"
+                        if reprocessing2.is_reprocessed_event(data)
+                        else "false",
+                    },
+                )
+
+            time_synthetic_monitoring_event(data, project_id, start_time)
+
+
 def time_synthetic_monitoring_event(
     data: Event, project_id: int, start_time: Optional[int]
 ) -> bool:
@@ -833,6 +1039,22 @@ def save_event_transaction(
     _do_save_event(cache_key, data, start_time, event_id, project_id, **kwargs)
 
 
+@instrumented_task(  # type: ignore
+    name="sentry.tasks.store.save_event_transaction_batch",
+    queue="events.save_event_transaction",
+    time_limit=65,
+    soft_time_limit=60,
+)
+def save_event_transaction_batch(
+    project_id: int, events: Sequence[Mapping[str, Any]], **kwargs: Any
+) -> None:
+    """
+    Saves several transactions of a project at once, see
+    ``_do_save_event_batch``.
+    """
+    _do_save_event_batch(project_id, events)
+
+
 @instrumented_task(  # type: ignore
     name="sentry.tasks.store.save_event_attachments",
     queue="events.save_event_attachments",
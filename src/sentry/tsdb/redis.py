@@ -1,19 +1,22 @@
 import itertools
 import logging
-import random
 import uuid
+from array import array
 from collections import defaultdict, namedtuple
 from functools import reduce
 from hashlib import md5
 from typing import Callable, ContextManager, TypeVar
 
+from django.core.cache import cache
 from django.utils import timezone
 from django.utils.encoding import force_bytes
 from pkg_resources import resource_string
 
 from sentry.tsdb.base import BaseTSDB
+from sentry.utils import metrics
 from sentry.utils.compat import crc32
 from sentry.utils.dates import to_datetime, to_timestamp
+from sentry.utils.hashlib import md5_text
 from sentry.utils.redis import SentryScript, check_cluster_versions, get_cluster_from_options
 from sentry.utils.versioning import Version
 
@@ -114,6 +117,10 @@ class RedisTSDB(BaseTSDB):
         self.prefix = prefix
         self.vnodes = vnodes
         self.enable_frequency_sketches = options.pop("enable_frequency_sketches", False)
+        # Seconds to cache ``get_distinct_counts_union`` results for (0 disables caching.)
+        self.union_cache_ttl = options.pop("union_cache_ttl", 0)
+        # Number of hosts that are queried concurrently while computing a union.
+        self.union_max_concurrency = options.pop("union_max_concurrency", 16)
         super().__init__(**options)
 
     def validate(self):
@@ -168,21 +175,22 @@ class RedisTSDB(BaseTSDB):
         """
         model_key = self.get_model_key(key)
 
-        if isinstance(model_key, int):
-            vnode = model_key % self.vnodes
-        else:
-            vnode = crc32(force_bytes(model_key)) % self.vnodes
-
         return (
             "{prefix}{model}:{epoch}:{vnode}".format(
                 prefix=self.prefix,
                 model=model.value,
                 epoch=self.normalize_to_rollup(timestamp, rollup),
-                vnode=vnode,
+                vnode=self.get_vnode(model_key),
             ),
             self.add_environment_parameter(model_key, environment_id),
         )
 
+    def get_vnode(self, model_key):
+        if isinstance(model_key, int):
+            return model_key % self.vnodes
+        else:
+            return crc32(force_bytes(model_key)) % self.vnodes
+
     def get_model_key(self, key):
         # We specialize integers so that a pure int-map can be optimized by
         # Redis, whereas long strings (say tag values) will store in a more
@@ -283,6 +291,47 @@ class RedisTSDB(BaseTSDB):
         >>>          start=now - timedelta(days=1),
         >>>          end=now)
         """
+        timestamps, counts = self.get_range_series(model, keys, start, end, rollup, environment_ids)
+
+        # Only now, at the edge, turn the columns into ``(timestamp, count)`` pairs.
+        timestamps = [float(ts) for ts in timestamps]
+        return {key: list(zip(timestamps, values)) for key, values in counts.items()}
+
+    def get_sums(
+        self,
+        model,
+        keys,
+        start,
+        end,
+        rollup=None,
+        environment_id=None,
+        use_cache=False,
+        jitter_value=None,
+        tenant_ids=None,
+        referrer_suffix=None,
+    ):
+        _, counts = self.get_range_series(
+            model,
+            keys,
+            start,
+            end,
+            rollup,
+            environment_ids=[environment_id] if environment_id is not None else None,
+        )
+        return {key: sum(values) for key, values in counts.items()}
+
+    def get_range_series(self, model, keys, start, end, rollup=None, environment_ids=None):
+        """
+        Columnar variant of ``get_range``.
+
+        Returns a 2-tuple of ``(timestamps, {key: counts})``, where
+        ``timestamps`` and every ``counts`` are ``array.array`` instances of
+        the same length, one element per rollup bucket in ascending order.
+
+        Bucket and hash keys are computed once per bucket and once per key
+        rather than for every (bucket, key) pair, and all fields that live in
+        the same hash are fetched with a single ``HMGET``.
+        """
         # redis backend doesn't support multiple envs
         if environment_ids is not None and len(environment_ids) > 1:
             raise NotImplementedError
@@ -291,27 +340,37 @@ class RedisTSDB(BaseTSDB):
         self.validate_arguments([model], [environment_id])
 
         rollup, series = self.get_optimal_rollup_series(start, end, rollup)
-        series = [to_datetime(item) for item in series]
+        timestamps = array("q", series)
+        # ``series`` is aligned to ``rollup``, so this matches ``normalize_to_rollup``.
+        buckets = [epoch // rollup for epoch in series]
+
+        # vnode -> [(key, hash_field), ...]
+        fields_by_vnode = defaultdict(list)
+        for key in set(keys):
+            model_key = self.get_model_key(key)
+            fields_by_vnode[self.get_vnode(model_key)].append(
+                (key, self.add_environment_parameter(model_key, environment_id))
+            )
+
+        counts = {key: array("q", bytes(8 * len(series))) for key in keys}
+        prefix = f"{self.prefix}{model.value}"
 
         results = []
         cluster, _ = self.get_cluster(environment_id)
         with cluster.map() as client:
-            for key in keys:
-                for timestamp in series:
-                    hash_key, hash_field = self.make_counter_key(
-                        model, rollup, timestamp, key, environment_id
-                    )
+            for vnode, items in fields_by_vnode.items():
+                fields = [hash_field for _, hash_field in items]
+                for index, bucket in enumerate(buckets):
                     results.append(
-                        (to_timestamp(timestamp), key, client.hget(hash_key, hash_field))
+                        (index, items, client.hmget(f"{prefix}:{bucket}:{vnode}", fields))
                     )
 
-        results_by_key = defaultdict(dict)
-        for epoch, key, count in results:
-            results_by_key[key][epoch] = int(count.value or 0)
+        for index, items, promise in results:
+            for (key, _), value in zip(items, promise.value):
+                if value is not None:
+                    counts[key][index] = int(value)
 
-        for key, points in results_by_key.items():
-            results_by_key[key] = sorted(points.items())
-        return dict(results_by_key)
+        return timestamps, counts
 
     def merge(self, model, destination, sources, timestamp=None, environment_ids=None):
         environment_ids = (set(environment_ids) if environment_ids is not None else set()).union(
@@ -494,17 +553,51 @@ class RedisTSDB(BaseTSDB):
 
         rollup, series = self.get_optimal_rollup_series(start, end, rollup)
 
+        cache_key = None
+        if self.union_cache_ttl:
+            # ``series`` is aligned to the rollup, so every request within the
+            # same rollup bucket shares a cache entry.
+            cache_key = "tsdb:union:{}".format(
+                md5_text(
+                    repr(
+                        (
+                            model.value,
+                            rollup,
+                            series[0],
+                            series[-1],
+                            environment_id,
+                            sorted(repr(key) for key in keys),
+                        )
+                    )
+                ).hexdigest()
+            )
+            result = cache.get(cache_key)
+            if result is not None:
+                metrics.incr("tsdb.distinct_counts_union.cache", tags={"result": "hit"})
+                return result
+            metrics.incr("tsdb.distinct_counts_union.cache", tags={"result": "miss"})
+
+        result = self._get_distinct_counts_union(model, keys, rollup, series, environment_id)
+
+        if cache_key is not None:
+            cache.set(cache_key, result, self.union_cache_ttl)
+
+        return result
+
+    def _get_distinct_counts_union(self, model, keys, rollup, series, environment_id):
         temporary_id = uuid.uuid1().hex
 
         def make_temporary_key(key):
             return f"{self.prefix}{temporary_id}:{key}"
 
-        def expand_key(key):
+        def expand_keys(keys):
             """
-            Return a list containing all keys for each interval in the series for a key.
+            Return a list containing all keys for each interval in the series for the keys.
             """
             return [
-                self.make_key(model, rollup, timestamp, key, environment_id) for timestamp in series
+                self.make_key(model, rollup, timestamp, key, environment_id)
+                for key in keys
+                for timestamp in series
             ]
 
         cluster, _ = self.get_cluster(environment_id)
@@ -517,55 +610,44 @@ class RedisTSDB(BaseTSDB):
             hosts[router.get_host_for_key(key)].add(key)
             return hosts
 
-        def get_partition_aggregate(value):
-            """
-            Fetch the HyperLogLog value (in its raw byte representation) that
-            results from merging all HyperLogLogs at the provided keys.
-            """
-            (host, keys) = value
-            destination = make_temporary_key(f"p:{host}")
-            client = cluster.get_local_client(host)
-            with client.pipeline(transaction=False) as pipeline:
-                pipeline.execute_command(
-                    "PFMERGE",
-                    destination,
-                    *itertools.chain.from_iterable(expand_key(key) for key in keys),
-                )
-                pipeline.get(destination)
-                pipeline.delete(destination)
-                return (host, pipeline.execute()[1])
+        hosts = reduce(map_key_to_host, keys, defaultdict(set))
+
+        # The final reduction is performed on the host that holds the most
+        # keys, so its HyperLogLogs never have to leave the server. If that
+        # host holds *all* keys, a single ``PFCOUNT`` is enough.
+        reduction_host = max(hosts, key=lambda host: len(hosts[host]))
+        reduction_keys = expand_keys(hosts.pop(reduction_host))
+        client = cluster.get_local_client(reduction_host)
+
+        if not hosts:
+            return client.execute_command("PFCOUNT", *reduction_keys)
+
+        # Merge the HyperLogLogs of every other host into a single temporary
+        # key on that host and fetch it (in its raw byte representation), so
+        # only one compact value per host has to be transferred.
+        with cluster.fanout(max_concurrency=self.union_max_concurrency) as c:
+            partitions = {}
+            for host, host_keys in hosts.items():
+                destination = make_temporary_key(f"p:{host}")
+                target = c.target([host])
+                target.execute_command("PFMERGE", destination, *expand_keys(host_keys))
+                partitions[host] = target.get(destination)
+                target.delete(destination)
+
+        aggregates = {
+            make_temporary_key(f"a:{host}"): promise.value[host]
+            for host, promise in partitions.items()
+        }
+        destination = make_temporary_key("a")  # all values will be merged into this key
 
-        def merge_aggregates(values):
-            """
-            Calculate the cardinality of the provided HyperLogLog values.
-            """
-            destination = make_temporary_key("a")  # all values will be merged into this key
-            aggregates = {make_temporary_key(f"a:{host}"): value for host, value in values}
-
-            # Choose a random host to execute the reduction on. (We use a host
-            # here that we've already accessed as part of this process -- this
-            # way, we constrain the choices to only hosts that we know are
-            # running.)
-            client = cluster.get_local_client(random.choice(values)[0])
-            with client.pipeline(transaction=False) as pipeline:
-                pipeline.mset(aggregates)
-                pipeline.execute_command("PFMERGE", destination, *aggregates.keys())
-                pipeline.execute_command("PFCOUNT", destination)
-                pipeline.delete(destination, *aggregates.keys())
-                return pipeline.execute()[2]
-
-        # TODO: This could be optimized to skip the intermediate step for the
-        # host that has the largest number of keys if the final merge and count
-        # is performed on that host. If that host contains *all* keys, the
-        # final reduction could be performed as a single PFCOUNT, skipping the
-        # MSET and PFMERGE operations entirely.
-
-        return merge_aggregates(
-            [
-                get_partition_aggregate(x)
-                for x in reduce(map_key_to_host, keys, defaultdict(set)).items()
-            ]
-        )
+        with client.pipeline(transaction=False) as pipeline:
+            pipeline.mset(aggregates)
+            pipeline.execute_command(
+                "PFMERGE", destination, *itertools.chain(reduction_keys, aggregates.keys())
+            )
+            pipeline.execute_command("PFCOUNT", destination)
+            pipeline.delete(destination, *aggregates.keys())
+            return pipeline.execute()[2]
 
     def merge_distinct_counts(
         self, model, destination, sources, timestamp=None, environment_ids=None
@@ -1,6 +1,6 @@
 import zlib
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar
+from typing import Generic, Optional, TypeVar
 
 import zstandard
 
@@ -87,8 +87,17 @@ class ZlibCodec(Codec[bytes, bytes]):
 
 
 class ZstdCodec(Codec[bytes, bytes]):
+    """
+    Compress/decompress bytes with Zstandard, optionally using a (trained)
+    compression dictionary. The ID of the dictionary is recorded in the frame
+    header of every compressed value.
+    """
+
+    def __init__(self, dictionary: Optional[zstandard.ZstdCompressionDict] = None):
+        self.dictionary = dictionary
+
     def encode(self, value: bytes) -> bytes:
-        return zstandard.ZstdCompressor().compress(value)
+        return zstandard.ZstdCompressor(dict_data=self.dictionary).compress(value)
 
     def decode(self, value: bytes) -> bytes:
-        return zstandard.ZstdDecompressor().decompress(value)
+        return zstandard.ZstdDecompressor(dict_data=self.dictionary).decompress(value)
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from datetime import timedelta
-from typing import Generic, Iterator, Optional, Sequence, Tuple, TypeVar
+from typing import Generic, Iterator, Mapping, Optional, Sequence, Tuple, TypeVar
 
 K = TypeVar("K")
 V = TypeVar("V")
@@ -47,6 +47,19 @@ class KVStorage(ABC, Generic[K, V]):
         """
         raise NotImplementedError
 
+    def set_many(self, items: Mapping[K, V], ttl: Optional[timedelta] = None) -> None:
+        """
+        Set multiple values in the store by their keys, overwriting any data
+        that already existed at those keys.
+
+        This operation is not guaranteed to be atomic and may result in only
+        a subset of items being written if an error occurs.
+        """
+        # This implementation can/should be overridden by concrete subclasses
+        # to improve performance using batched operations where possible.
+        for key, value in items.items():
+            self.set(key, value, ttl)
+
     @abstractmethod
     def delete(self, key: K) -> None:
         """
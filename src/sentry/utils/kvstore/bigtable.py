@@ -182,9 +182,41 @@ class BigtableKVStorage(KVStorage[str, bytes]):
             return self._set(key, value, ttl)
 
     def _set(self, key: str, value: bytes, ttl: Optional[timedelta] = None) -> None:
+        row = self._build_row(self._get_table(), key, value, ttl)
+
+        status = row.commit()
+        if status.code != 0:
+            raise BigtableError(status.code, status.message)
+
+    def set_many(self, items: Mapping[str, bytes], ttl: Optional[timedelta] = None) -> None:
+        """
+        Write several rows with a single ``MutateRows`` request.
+        """
+        try:
+            return self._set_many(items, ttl)
+        except (exceptions.InternalServerError, exceptions.ServiceUnavailable):
+            with self.__table_lock:
+                del self.__table
+            return self._set_many(items, ttl)
+
+    def _set_many(self, items: Mapping[str, bytes], ttl: Optional[timedelta] = None) -> None:
+        table = self._get_table()
+        rows = [self._build_row(table, key, value, ttl) for key, value in items.items()]
+
+        errors = []
+        for status in table.mutate_rows(rows):
+            if status.code != 0:
+                errors.append(BigtableError(status.code, status.message))
+
+        if errors:
+            raise BigtableError(errors)
+
+    def _build_row(
+        self, table: Table, key: str, value: bytes, ttl: Optional[timedelta] = None
+    ) -> Any:
         # XXX: There is a type mismatch here -- ``direct_row`` expects
         # ``bytes`` but we are providing it with ``str``.
-        row = self._get_table().direct_row(key)
+        row = table.direct_row(key)
 
         # Call to delete is just a state mutation, and in this case is just
         # used to clear all columns so the entire row will be replaced.
@@ -242,9 +274,7 @@ class BigtableKVStorage(KVStorage[str, bytes]):
 
         row.set_cell(self.column_family, self.data_column, value, timestamp=ts)
 
-        status = row.commit()
-        if status.code != 0:
-            raise BigtableError(status.code, status.message)
+        return row
 
     def delete(self, key: str) -> None:
         # XXX: There is a type mismatch here -- ``direct_row`` expects
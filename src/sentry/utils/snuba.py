@@ -5,14 +5,26 @@ import logging
 import os
 import re
 import time
-from collections import namedtuple
+from collections import defaultdict, namedtuple
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from copy import deepcopy
+from copy import copy, deepcopy
 from datetime import datetime, timedelta
 from hashlib import sha1
-from typing import Any, Callable, List, Mapping, MutableMapping, Optional, Sequence, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    List,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 from urllib.parse import urlparse
+from uuid import uuid4
 
 import pytz
 import sentry_sdk
@@ -20,10 +32,12 @@ import urllib3
 from dateutil.parser import parse as parse_datetime
 from django.conf import settings
 from django.core.cache import cache
+from redis.exceptions import RedisError
 from sentry_sdk import Hub
-from snuba_sdk import Request
+from snuba_sdk import Condition, Op, Query, Request
 from snuba_sdk.legacy import json_to_snql
 
+from sentry import options
 from sentry.models import (
     Environment,
     Group,
@@ -37,9 +51,10 @@ from sentry.models import (
 from sentry.net.http import connection_from_url
 from sentry.snuba.dataset import Dataset
 from sentry.snuba.events import Columns
-from sentry.snuba.referrer import validate_referrer
-from sentry.utils import json, metrics
+from sentry.snuba.referrer import Referrer, validate_referrer
+from sentry.utils import json, metrics, redis
 from sentry.utils.dates import outside_retention_with_modified_start, to_timestamp
+from sentry.utils.locking.backends.redis import delete_lock
 
 logger = logging.getLogger(__name__)
 
@@ -823,6 +838,251 @@ def get_cache_key(query: SnubaQuery) -> str:
     return f"sqc:{sha1(hashable.encode('utf-8')).hexdigest()}"
 
 
+# A query with its position in a bulk request and its cache key.
+QueryItem = Tuple[int, SnubaQueryBody, Optional[str]]
+
+# Seconds between checks for the result of a query run by another worker.
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+
+
+def _get_lease_key(cache_key: Optional[str]) -> str:
+    return f"{cache_key}:lease"
+
+
+def _get_single_flight_client():
+    return redis.redis_clusters.get(settings.SENTRY_SNUBA_SINGLE_FLIGHT_REDIS_CLUSTER)
+
+
+def _acquire_query_leases(
+    to_query: Sequence[QueryItem], token: str
+) -> Tuple[List[QueryItem], List[QueryItem]]:
+    """
+    Acquires the lease of each query with ``token``, returning the queries
+    this worker has to run and the queries that another worker is already
+    running.
+    """
+    with _get_single_flight_client().pipeline(transaction=False) as pipeline:
+        for _, _, cache_key in to_query:
+            # Leases expire once the query would have timed out.
+            pipeline.set(
+                _get_lease_key(cache_key), token, nx=True, ex=settings.SENTRY_SNUBA_TIMEOUT
+            )
+        acquired = pipeline.execute()
+
+    leased = [item for item, is_acquired in zip(to_query, acquired) if is_acquired]
+    waiting = [item for item, is_acquired in zip(to_query, acquired) if not is_acquired]
+    return leased, waiting
+
+
+def _release_query_leases(leased: Sequence[QueryItem], token: str) -> None:
+    client = _get_single_flight_client()
+    for _, _, cache_key in leased:
+        # A lease that expired may have been acquired by another worker since,
+        # it is only deleted if it still holds ``token``.
+        try:
+            delete_lock(client, (_get_lease_key(cache_key),), (token,))
+        except RedisError:
+            # Leases that cannot be released expire on their own.
+            logger.info("snuba.single-flight.release-failed", exc_info=True)
+
+
+def _wait_for_query_results(
+    waiting: Sequence[QueryItem],
+    referrer: Optional[str],
+    policy: Optional[CachePolicy],
+) -> Tuple[List[Tuple[int, Any]], List[QueryItem]]:
+    """
+    Waits for the results of queries run by other workers, returning the
+    results that were cached in time and the queries this worker has to run
+    itself. Queries whose lease is released without a result, because they
+    failed, are not waited for.
+    """
+    deadline = time.monotonic() + options.get("snuba.single-flight.timeout")
+    # The same query can be waited for at several positions of a bulk request.
+    pending: MutableMapping[Optional[str], List[QueryItem]] = defaultdict(list)
+    for item in waiting:
+        pending[item[2]].append(item)
+    results = []
+    to_query = []
+
+    while True:
+        for cache_key, cached_result in cache.get_many(list(pending)).items():
+            if cached_result is not None:
+                for query_pos, _, _ in pending.pop(cache_key):
+                    metrics.incr(
+                        "snuba.query_cache.coalesced", tags={"referrer": referrer, "result": "hit"}
+                    )
+                    results.append((query_pos, _load_cached_result(cached_result, policy)[0]))
+
+        if not pending or time.monotonic() >= deadline:
+            break
+
+        cache_keys = list(pending)
+        try:
+            with _get_single_flight_client().pipeline(transaction=False) as pipeline:
+                for cache_key in cache_keys:
+                    pipeline.exists(_get_lease_key(cache_key))
+                leases = pipeline.execute()
+        except RedisError:
+            # Stop waiting and run the remaining queries without coalescing.
+            logger.warning("snuba.single-flight.wait-failed", exc_info=True)
+            break
+        for cache_key, lease in zip(cache_keys, leases):
+            if not lease:
+                metrics.incr(
+                    "snuba.query_cache.coalesced",
+                    tags={"referrer": referrer, "result": "released"},
+                )
+                to_query.extend(pending.pop(cache_key))
+
+        if not pending:
+            break
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+
+    for items in pending.values():
+        for item in items:
+            metrics.incr(
+                "snuba.query_cache.coalesced", tags={"referrer": referrer, "result": "timeout"}
+            )
+            to_query.append(item)
+
+    return results, to_query
+
+
+class CachePolicy(NamedTuple):
+    """
+    Caching of the queries of a referrer. Results are served from the cache
+    for up to ``hard_ttl`` seconds, and refreshed in the background once they
+    are older than ``soft_ttl`` seconds. The time range of the queries is
+    widened to ``time_bucket`` seconds, which must divide an hour, so that
+    queries issued within the same bucket share their results.
+
+    Queries over a relative time range get a new cache key with every bucket,
+    so ``soft_ttl`` has to be well below ``time_bucket`` for their results to
+    be refreshed at all.
+    """
+
+    soft_ttl: int
+    hard_ttl: int
+    time_bucket: int
+
+
+_widget_cache_policy = CachePolicy(soft_ttl=60, hard_ttl=300, time_bucket=300)
+
+# Referrers whose queries are cached regardless of `use_cache`, see CachePolicy.
+REFERRER_CACHE_POLICIES: Mapping[str, CachePolicy] = {
+    referrer.value: _widget_cache_policy
+    for referrer in (
+        Referrer.API_DASHBOARDS_BIGNUMBERWIDGET,
+        Referrer.API_DASHBOARDS_TABLEWIDGET,
+        Referrer.API_DASHBOARDS_TOP_EVENTS,
+        Referrer.API_DASHBOARDS_WIDGET_AREA_CHART,
+        Referrer.API_DASHBOARDS_WIDGET_BAR_CHART,
+        Referrer.API_DASHBOARDS_WIDGET_LINE_CHART,
+        Referrer.API_DASHBOARDS_WORLDMAPWIDGET,
+        Referrer.API_ORGANIZATION_EVENT_STATS,
+    )
+}
+
+_cache_refresh_pool = ThreadPoolExecutor(max_workers=4)
+
+
+def get_cache_policy(referrer: Optional[str]) -> Optional[CachePolicy]:
+    if referrer is None or not options.get("snuba.referrer-cache-policies.enabled"):
+        return None
+    return REFERRER_CACHE_POLICIES.get(referrer)
+
+
+def _round_time(value: datetime, time_bucket: int, round_up: bool = False) -> datetime:
+    seconds_past_hour = value.minute * 60 + value.second
+    rounded = value.replace(minute=0, second=0, microsecond=0) + timedelta(
+        seconds=seconds_past_hour // time_bucket * time_bucket
+    )
+    if round_up and rounded != value:
+        rounded += timedelta(seconds=time_bucket)
+    return rounded
+
+
+def _round_query_times(query_params: SnubaQueryBody, time_bucket: int) -> SnubaQueryBody:
+    """
+    Widens the time range of a query to ``time_bucket``, rounding its start
+    down and its end up. The time range of SnQL queries is made of the last
+    top-level ``>=`` and ``<`` conditions on datetimes, which query builders
+    add after the conditions of the search query, see ``resolve_params``.
+    Other conditions on datetimes are left as they are. Legacy queries have
+    their dates rounded.
+    """
+    query, forward, reverse = query_params
+    if isinstance(query, Request):
+        if not isinstance(query.query, Query) or not query.query.where:
+            return query_params
+        where = list(query.query.where)
+        for op, round_up in ((Op.GTE, False), (Op.LT, True)):
+            for index in reversed(range(len(where))):
+                condition = where[index]
+                if (
+                    isinstance(condition, Condition)
+                    and condition.op == op
+                    and isinstance(condition.rhs, datetime)
+                ):
+                    where[index] = Condition(
+                        condition.lhs, op, _round_time(condition.rhs, time_bucket, round_up)
+                    )
+                    break
+        query = copy(query)
+        query.query = query.query.set_where(where)
+    elif "from_date" in query and "to_date" in query:
+        query = {
+            **query,
+            "from_date": _round_time(parse_datetime(query["from_date"]), time_bucket).isoformat(),
+            "to_date": _round_time(
+                parse_datetime(query["to_date"]), time_bucket, round_up=True
+            ).isoformat(),
+        }
+    return query, forward, reverse
+
+
+def _get_result_cache_key(query: SnubaQuery, policy: Optional[CachePolicy]) -> str:
+    cache_key = get_cache_key(query)
+    # Results cached by a policy are stored with the time they were cached at.
+    return cache_key if policy is None else f"{cache_key}:swr"
+
+
+def _set_cached_result(cache_key: str, result: Any, policy: Optional[CachePolicy]) -> None:
+    if policy is None:
+        cache.set(cache_key, json.dumps(result), settings.SENTRY_SNUBA_CACHE_TTL_SECONDS)
+    else:
+        cache.set(
+            cache_key, json.dumps({"cached_at": time.time(), "result": result}), policy.hard_ttl
+        )
+
+
+def _load_cached_result(cached_result: str, policy: Optional[CachePolicy]) -> Tuple[Any, bool]:
+    """
+    Returns a cached result, and whether it is stale and should be refreshed.
+    """
+    data = json.loads(cached_result)
+    if policy is None:
+        return data, False
+    return data["result"], time.time() - data["cached_at"] >= policy.soft_ttl
+
+
+def _refresh_cached_result(
+    item: QueryItem, headers: Mapping[str, str], policy: CachePolicy
+) -> None:
+    # Only one worker refreshes a stale result, until it would be stale again.
+    if not cache.add(f"{item[2]}:refresh", 1, policy.soft_ttl):
+        return
+
+    def refresh() -> None:
+        try:
+            _run_and_cache_queries([item], headers, policy)
+        except Exception:
+            logger.exception("snuba.query_cache.refresh-failed")
+
+    _cache_refresh_pool.submit(refresh)
+
+
 def bulk_raw_query(
     snuba_param_list: Sequence[SnubaQueryParams],
     referrer: Optional[str] = None,
@@ -841,15 +1101,26 @@ def _apply_cache_and_build_results(
     validate_referrer(referrer)
     if referrer:
         headers["referer"] = referrer
+
+    policy = get_cache_policy(referrer)
+    if policy is not None:
+        use_cache = True
+        snuba_param_list = [
+            _round_query_times(query_params, policy.time_bucket)
+            for query_params in snuba_param_list
+        ]
+
     # Store the original position of the query so that we can maintain the order
     query_param_list = list(enumerate(snuba_param_list))
 
     results = []
 
     if use_cache:
-        cache_keys = [get_cache_key(query_params[0]) for _, query_params in query_param_list]
+        cache_keys = [
+            _get_result_cache_key(query_params[0], policy) for _, query_params in query_param_list
+        ]
         cache_data = cache.get_many(cache_keys)
-        to_query: List[Tuple[int, SnubaQueryBody, Optional[str]]] = []
+        to_query: List[QueryItem] = []
         for (query_pos, query_params), cache_key in zip(query_param_list, cache_keys):
             cached_result = cache_data.get(cache_key)
             metric_tags = {"referrer": referrer} if referrer else None
@@ -858,16 +1129,36 @@ def _apply_cache_and_build_results(
                 to_query.append((query_pos, query_params, cache_key))
             else:
                 metrics.incr("snuba.query_cache.hit", tags=metric_tags)
-                results.append((query_pos, json.loads(cached_result)))
+                result, is_stale = _load_cached_result(cached_result, policy)
+                if policy is not None and is_stale:
+                    # Stale results are served while they are refreshed.
+                    metrics.incr("snuba.query_cache.stale", tags=metric_tags)
+                    _refresh_cached_result((query_pos, query_params, cache_key), headers, policy)
+                results.append((query_pos, result))
     else:
         to_query = [(query_pos, query_params, None) for query_pos, query_params in query_param_list]
 
-    if to_query:
-        query_results = _bulk_snuba_query([item[1] for item in to_query], headers)
-        for result, (query_pos, _, cache_key) in zip(query_results, to_query):
-            if cache_key:
-                cache.set(cache_key, json.dumps(result), settings.SENTRY_SNUBA_CACHE_TTL_SECONDS)
-            results.append((query_pos, result))
+    if to_query and use_cache and options.get("snuba.single-flight.enabled"):
+        # Identical queries issued concurrently, such as by the widgets of a
+        # popular dashboard, are only run by the worker holding their lease.
+        lease_token = uuid4().hex
+        try:
+            leased, waiting = _acquire_query_leases(to_query, lease_token)
+        except RedisError:
+            # Queries are run without coalescing when leases are unavailable.
+            logger.warning("snuba.single-flight.acquire-failed", exc_info=True)
+        else:
+            try:
+                results.extend(_run_and_cache_queries(leased, headers, policy))
+            finally:
+                if leased:
+                    _release_query_leases(leased, lease_token)
+            to_query = []
+            if waiting:
+                coalesced_results, to_query = _wait_for_query_results(waiting, referrer, policy)
+                results.extend(coalesced_results)
+
+    results.extend(_run_and_cache_queries(to_query, headers, policy))
 
     # Sort so that we get the results back in the original param list order
     results.sort()
@@ -875,6 +1166,23 @@ def _apply_cache_and_build_results(
     return [result[1] for result in results]
 
 
+def _run_and_cache_queries(
+    to_query: Sequence[QueryItem],
+    headers: Mapping[str, str],
+    policy: Optional[CachePolicy] = None,
+) -> List[Tuple[int, Any]]:
+    if not to_query:
+        return []
+
+    results = []
+    query_results = _bulk_snuba_query([item[1] for item in to_query], headers)
+    for result, (query_pos, _, cache_key) in zip(query_results, to_query):
+        if cache_key:
+            _set_cached_result(cache_key, result, policy)
+        results.append((query_pos, result))
+    return results
+
+
 def _bulk_snuba_query(
     snuba_param_list: Sequence[SnubaQueryBody],
     headers: Mapping[str, str],
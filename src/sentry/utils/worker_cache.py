@@ -0,0 +1,127 @@
+"""
+Process-local cache for lookups that are repeated by every task of a worker,
+such as the rules or service hooks of a project in post-processing.
+
+Values are grouped by the project or organization they belong to, and expire
+after the TTL given to ``enabled``. Saving or deleting a model that a value
+depends on bumps the version of its project or organization in the shared
+cache (see ``sentry.receivers.worker_cache``). Workers check that version at
+most every ``VERSION_CHECK_INTERVAL`` seconds and drop all values of the
+project or organization once it changed.
+"""
+import copy
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, TypeVar
+
+from cachetools import LRUCache
+
+from sentry.utils import metrics
+from sentry.utils.cache import cache
+
+T = TypeVar("T")
+
+# How often the shared version of a project or organization is checked, in seconds.
+VERSION_CHECK_INTERVAL = 5
+VERSION_TTL = 60 * 60 * 24
+
+MAX_SCOPES = 10000
+
+Scope = Tuple[str, int]
+
+
+class _ScopeValues:
+    __slots__ = ("version", "checked_at", "values")
+
+    def __init__(self, version: Optional[str], checked_at: float) -> None:
+        self.version = version
+        self.checked_at = checked_at
+        self.values: Dict[str, Tuple[float, Any]] = {}
+
+
+class WorkerCache:
+    def __init__(self, name: str, max_scopes: int = MAX_SCOPES) -> None:
+        self.name = name
+        self._scopes: LRUCache = LRUCache(maxsize=max_scopes)
+        self._lock = threading.Lock()
+        self._state = threading.local()
+
+    @contextmanager
+    def enabled(self, ttl: int) -> Iterator[None]:
+        """
+        Serve lookups of the current thread from the cache for the duration of
+        the block, keeping fetched values for ``ttl`` seconds. Lookups outside
+        of a block, or within one with a TTL of 0, are not cached.
+
+        Nested blocks use the TTL of the outermost one.
+        """
+        if not ttl or getattr(self._state, "ttl", None) is not None:
+            yield
+            return
+
+        self._state.ttl = ttl
+        try:
+            yield
+        finally:
+            self._state.ttl = None
+
+    def __get_version_key(self, scope: Scope) -> str:
+        return "worker-cache:{}:{}:{}".format(self.name, *scope)
+
+    def get(
+        self, scope: Scope, name: str, fetch: Callable[[], T], key: Optional[str] = None
+    ) -> T:
+        """
+        Returns the value of the lookup ``name`` for ``scope``, a
+        ``("project", id)`` or ``("organization", id)`` pair, calling ``fetch``
+        on a miss. Lookups that have several values within a scope tell them
+        apart by ``key``, which unlike ``name`` is not used as a metric tag.
+
+        Values are handed out as shallow copies, so that callers can set
+        attributes on cached model instances.
+        """
+        ttl = getattr(self._state, "ttl", None)
+        if ttl is None:
+            return fetch()
+
+        now = time.monotonic()
+        with self._lock:
+            scope_values = self._scopes.get(scope)
+
+        if scope_values is None or scope_values.checked_at + VERSION_CHECK_INTERVAL <= now:
+            version = cache.get(self.__get_version_key(scope))
+            if scope_values is None or scope_values.version != version:
+                scope_values = _ScopeValues(version, now)
+                with self._lock:
+                    self._scopes[scope] = scope_values
+            else:
+                scope_values.checked_at = now
+
+        value_key = name if key is None else f"{name}:{key}"
+        cached = scope_values.values.get(value_key)
+        if cached is not None and cached[0] > now:
+            metrics.incr("worker_cache", tags={"cache": self.name, "key": name, "result": "hit"})
+            return copy.copy(cached[1])
+
+        metrics.incr("worker_cache", tags={"cache": self.name, "key": name, "result": "miss"})
+        value = fetch()
+        scope_values.values[value_key] = (now + ttl, value)
+        return copy.copy(value)
+
+    def invalidate(self, scope: Scope) -> None:
+        """
+        Drops the values of ``scope`` in this process, and in all other
+        processes once they check its version again.
+        """
+        with self._lock:
+            self._scopes.pop(scope, None)
+        cache.set(self.__get_version_key(scope), uuid.uuid4().hex, VERSION_TTL)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scopes.clear()
+
+
+post_process_cache = WorkerCache("post_process")
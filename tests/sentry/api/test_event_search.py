@@ -1,7 +1,7 @@
 import datetime
 import os
 from datetime import timedelta
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import pytest
 from django.test import SimpleTestCase
@@ -15,6 +15,7 @@ from sentry.api.event_search import (
     SearchFilter,
     SearchKey,
     SearchValue,
+    SearchVisitor,
     parse_search_query,
 )
 from sentry.constants import MODULE_ROOT
@@ -634,6 +635,51 @@ class ParseSearchQueryBackendTest(SimpleTestCase):
         assert search_filter.value.value == 'a"b'
 
 
+class ParseSearchQueryCacheTest(SimpleTestCase):
+    def test_cached(self):
+        config = SearchConfig()
+        query = "transaction:/api/0/ count():>10 user.email:*@example.com"
+        result = parse_search_query(query, config=config)
+
+        with patch.object(SearchVisitor, "visit") as visit:
+            cached = parse_search_query(query, config=config)
+            assert not visit.called
+
+        assert cached == result
+        assert cached is not result
+
+        cached.append(SearchFilter(SearchKey("foo"), "=", SearchValue("bar")))
+        assert parse_search_query(query, config=config) == result
+
+    def test_keyed_by_config(self):
+        query = "someValue:123"
+        assert parse_search_query(query) == [
+            SearchFilter(key=SearchKey(name="someValue"), operator="=", value=SearchValue("123"))
+        ]
+
+        config = SearchConfig(key_mappings={"target_value": ["someValue"]})
+        assert parse_search_query(query, config=config) == [
+            SearchFilter(key=SearchKey(name="target_value"), operator="=", value=SearchValue("123"))
+        ]
+        assert parse_search_query(query, config_overrides={"free_text_key": "title"}) == [
+            SearchFilter(key=SearchKey(name="someValue"), operator="=", value=SearchValue("123"))
+        ]
+
+    def test_relative_dates_not_cached(self):
+        now = timezone.now()
+        with freeze_time(now):
+            assert parse_search_query("time:-1d")[0].value.raw_value == now - timedelta(days=1)
+        with freeze_time(now + timedelta(hours=1)):
+            assert parse_search_query("time:-1d")[0].value.raw_value == now - timedelta(hours=23)
+
+    def test_builder_not_cached(self):
+        builder = Mock()
+        with patch.object(SearchVisitor, "visit", return_value=[]) as visit:
+            parse_search_query("release:1.0", builder=builder)
+            parse_search_query("release:1.0", builder=builder)
+        assert visit.call_count == 2
+
+
 @pytest.mark.parametrize(
     "raw,result",
     [
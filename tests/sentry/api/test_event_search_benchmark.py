@@ -0,0 +1,79 @@
+import pytest
+
+from sentry.api import event_search
+from sentry.api.event_search import parse_search_query
+from sentry.api.event_search_parser import parse_search_terms
+from sentry.api.issue_search import parse_search_query as parse_issue_search_query
+from sentry.testutils.helpers import override_options
+
+# Queries as issued by dashboard widgets and Discover.
+EVENT_QUERIES = [
+    "",
+    "event.type:error",
+    "event.type:transaction",
+    "!event.type:transaction",
+    "transaction.duration:>5s",
+    "transaction:/api/0/organizations/{organization_slug}/events/",
+    "transaction.op:http.server transaction.status:ok",
+    "has:measurements.lcp event.type:transaction",
+    "count():>100 event.type:error",
+    "p95(transaction.duration):>1s",
+    "failure_rate():>0.05",
+    "browser.name:Chrome os.name:[Windows, macOS]",
+    "environment:production release:backend@23.4.0",
+    'message:"Connection reset by peer" !handled:true',
+    "error.type:TypeError OR error.type:ReferenceError",
+    "(title:*timeout* OR title:*Timeout*) level:fatal",
+    "user.email:*@example.com geo.country_code:US",
+    "http.status_code:[500, 502, 503, 504]",
+    "stack.filename:*/sentry/api/* stack.function:get",
+]
+
+# Queries as issued by the issue stream.
+ISSUE_QUERIES = [
+    "",
+    "is:unresolved",
+    "is:unresolved is:for_review assigned_or_suggested:[me, none]",
+    "is:unresolved level:error",
+    "is:unresolved times_seen:>100",
+    "is:ignored environment:production",
+    "is:unresolved error.type:TypeError",
+    'is:unresolved message:"Connection reset by peer"',
+    "is:unresolved release:backend@23.4.0 !has:assigned",
+    "is:unresolved bookmarks:me",
+]
+
+
+def clear_cache():
+    event_search._parsed_query_cache.clear()
+    event_search._parse_tree.cache_clear()
+    parse_search_terms.cache_clear()
+
+
+@pytest.mark.parametrize(
+    "parse,queries",
+    [(parse_search_query, EVENT_QUERIES), (parse_issue_search_query, ISSUE_QUERIES)],
+    ids=["events", "issues"],
+)
+@pytest.mark.parametrize("cached", [False, True])
+@pytest.mark.parametrize("parser", [False, True], ids=["grammar", "parser"])
+def test_benchmark_parse_search_query(parse, queries, cached, parser, benchmark):
+    """
+    Measures parsing every query of the corpus, either each one for the first
+    time or each one again after it has been cached, with the grammar or the
+    hand-written parser.
+    """
+
+    def setup():
+        clear_cache()
+        if cached:
+            run(parse, queries)
+        return (parse, queries), {}
+
+    with override_options({"api.event-search.hand-written-parser": parser}):
+        benchmark.pedantic(run, setup=setup, rounds=20)
+
+
+def run(parse, queries):
+    for query in queries:
+        parse(query)
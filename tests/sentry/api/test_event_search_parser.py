@@ -0,0 +1,111 @@
+import os
+import random
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from freezegun import freeze_time
+
+from sentry.api import event_search
+from sentry.api.event_search import (
+    SearchConfig,
+    SearchVisitor,
+    default_config,
+    event_search_grammar,
+    parse_search_query,
+)
+from sentry.api.event_search_parser import parse_search_terms, visit_search_terms
+from sentry.api.issue_search import issue_search_config
+from sentry.constants import MODULE_ROOT
+from sentry.testutils.helpers import override_options
+from sentry.utils import json
+
+abs_fixtures_path = os.path.join(MODULE_ROOT, os.pardir, os.pardir, "fixtures/search-syntax")
+
+CONFIGS = [
+    default_config,
+    issue_search_config,
+    SearchConfig.create_from(
+        default_config,
+        allowed_keys={"a", "b", "message", "tags[a]"},
+        key_mappings={"user": ["user.email", "user.id"]},
+        date_keys={"date"},
+        boolean_keys={"handled"},
+        free_text_key="title",
+    ),
+]
+
+# Fragments that random queries are built from, covering every token of the
+# grammar as well as fragments of them.
+FRAGMENTS = [
+    *("a", "b", "tags[a]", "tags[", "[", "]", "(", ")", " ", "  ", "\t", "\n", ":", "!", ","),
+    *('"', '\\"', "\\", " , ", ">", "<", ">=", "<=", "=", "!="),
+    *("count()", "count(", "p95(transaction.duration)", "failure_rate()", "avg(a, b)"),
+    *("count_unique(user)", "last_seen()", "(a,b)", "(a, ,b)", "( a )", "a(b)c"),
+    *("transaction.duration", "times_seen", "timestamp", "date", "handled", "has", "is"),
+    *("has:", "is:", "unresolved", "assigned", "measurements.lcp", "spans.http", "user"),
+    *("1", "0", "-1", "1.5", "10k", "2m", "3b", "5s", "5ms", "3min", "1h", "1hr", "2d", "4wk"),
+    *("12kb", "3mib", "1bit", "50%", "0.5%", "true", "false", "TRUE", "OR", "AND", "or"),
+    *("ORANGE", "-24h", "+3d", "2020-01-01", "2020-01-01T12:30:00", "2020-01-01T12:30:00Z"),
+    *("2020-01-01T12:30:00.123+01:00", "*", "foo*bar", '"hello world"', '"a\\"b"', "[a, b]"),
+    *("[1, 2]", "[1,,2]", "[a,]", '["x y", z]', "[a]]", '"quoted:key"', "é", "%"),
+]
+
+
+def parse_with_grammar(query, config):
+    try:
+        return SearchVisitor(config).visit(event_search_grammar.parse(query))
+    except Exception as e:
+        return type(e), str(e)
+
+
+def parse_with_parser(query, config):
+    try:
+        return visit_search_terms(SearchVisitor(config), parse_search_terms(query))
+    except Exception as e:
+        return type(e), str(e)
+
+
+@freeze_time("2023-05-01 12:00:00")
+class SearchQueryParserTest(SimpleTestCase):
+    """
+    The hand-written parser must produce the same search filters and errors as
+    the grammar for every query.
+    """
+
+    def assert_same_result(self, query):
+        for config in CONFIGS:
+            assert parse_with_parser(query, config) == parse_with_grammar(
+                query, config
+            ), f"Mismatch for query {query!r}"
+
+    def test_fixture_queries(self):
+        for file in os.listdir(abs_fixtures_path):
+            with open(os.path.join(abs_fixtures_path, file)) as fp:
+                for case in json.load(fp):
+                    self.assert_same_result(case["query"])
+
+    def test_random_queries(self):
+        rng = random.Random(0)
+        for _ in range(2000):
+            self.assert_same_result(
+                "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 9)))
+            )
+
+    def test_nested_parens(self):
+        self.assert_same_result("(" * 30 + "a:b" + ")" * 30)
+        self.assert_same_result("(" * 30 + "a:b" + ")" * 29)
+
+    def test_parse_error(self):
+        assert parse_with_parser("a:b (c", default_config) == parse_with_grammar(
+            "a:b (c", default_config
+        )
+
+    def test_parse_search_query(self):
+        event_search._parsed_query_cache.clear()
+        with override_options({"api.event-search.hand-written-parser": True}), patch(
+            "sentry.api.event_search_parser.parse_search_terms", wraps=parse_search_terms
+        ) as parse:
+            assert parse_search_query("tags[a]:b count():>1") == parse_with_grammar(
+                "tags[a]:b count():>1", default_config
+            )
+        assert parse.called
@@ -69,3 +69,34 @@ class BufferTest(TestCase):
         self.buf.process(Group, columns, filters, {"last_seen": the_date}, signal_only=True)
         group.refresh_from_db()
         assert group.times_seen == prev_times_seen
+
+    def test_process_batch(self):
+        group = Group.objects.create(project=Project(id=1))
+        other_group = Group.objects.create(project=Project(id=1))
+        the_date = timezone.now() + timedelta(days=5)
+        release_filters = {"project_id": self.project.id, "release_id": self.release.id}
+        self.buf.process_batch(
+            [
+                (Group, {"times_seen": 1}, {"pk": group.id}, {"last_seen": the_date}, None),
+                (Group, {"times_seen": 3}, {"id": other_group.id}, {"last_seen": the_date}, None),
+                (ReleaseProject, {"new_groups": 1}, release_filters, None, None),
+            ]
+        )
+        group_ = Group.objects.get(id=group.id)
+        assert group_.times_seen == group.times_seen + 1
+        assert group_.last_seen == the_date
+        assert Group.objects.get(id=other_group.id).times_seen == other_group.times_seen + 3
+        assert ReleaseProject.objects.filter(new_groups=1, **release_filters).exists()
+
+    @mock.patch("sentry.buffer.base.buffer_incr_complete")
+    def test_process_batch_sends_signal(self, buffer_incr_complete):
+        group = Group.objects.create(project=Project(id=1))
+        self.buf.process_batch([(Group, {"times_seen": 1}, {"pk": group.id}, None, None)])
+        buffer_incr_complete.send_robust.assert_called_once_with(
+            model=Group,
+            columns={"times_seen": 1},
+            filters={"pk": group.id},
+            extra=None,
+            created=False,
+            sender=Group,
+        )
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import pytest
+from django.utils import timezone
+
+from sentry.buffer.redis import RedisBuffer
+
+ENCODINGS = ("pickle", "msgpack")
+
+# Roughly what ``_process_existing_aggregate`` buffers for every event of an existing group.
+FIELDS = {
+    "f": {"id": 1234567},
+    "e+last_seen": datetime(2017, 5, 3, 6, 6, 6, 123456, tzinfo=timezone.utc),
+    "e+data": {"title": "ValueError: invalid literal", "location": "app/views.py"},
+}
+
+
+def dump_fields(buf):
+    return {k: buf._dump_field(v) for k, v in FIELDS.items()}
+
+
+def load_fields(buf, payload):
+    return {k: buf._load_field(v) for k, v in payload.items()}
+
+
+def bytes_per_key(encoding):
+    return sum(len(v) for v in dump_fields(RedisBuffer(value_encoding=encoding)).values())
+
+
+def test_msgpack_is_smaller():
+    assert bytes_per_key("msgpack") < bytes_per_key("pickle")
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_benchmark_encode(encoding, benchmark):
+    buf = RedisBuffer(value_encoding=encoding)
+    benchmark.extra_info["bytes_per_key"] = bytes_per_key(encoding)
+    benchmark(dump_fields, buf)
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_benchmark_decode(encoding, benchmark):
+    buf = RedisBuffer(value_encoding=encoding)
+    payload = dump_fields(buf)
+    assert load_fields(buf, payload) == FIELDS
+    benchmark(load_fields, buf, payload)
@@ -6,8 +6,8 @@ from django.utils import timezone
 from django.utils.encoding import force_text
 from freezegun import freeze_time
 
-from sentry.buffer.redis import RedisBuffer
-from sentry.models import Group, Project
+from sentry.buffer.redis import MSGPACK_V1, RedisBuffer
+from sentry.models import Group, Project, ProjectOption
 from sentry.testutils import TestCase
 
 
@@ -103,6 +103,36 @@ class RedisBufferTest(TestCase):
         group = Group.objects.get_from_cache(id=self.group.id)
         assert group.times_seen == orig_times_seen + times_seen_incr
 
+    @freeze_time()
+    def test_process_pending_batch_flush(self):
+        self.buf.batch_flush = True
+        group = self.create_group(project=self.project)
+        orig_times_seen = Group.objects.get_from_cache(id=group.id).times_seen
+        last_seen = timezone.now()
+        self.buf.incr(Group, {"times_seen": 2}, {"pk": group.id}, {"last_seen": last_seen})
+        self.buf.incr(Group, {"times_seen": 3}, {"pk": self.group.id}, {"last_seen": last_seen})
+
+        with mock.patch("sentry.buffer.redis.process_incr") as process_incr:
+            self.buf.process_pending()
+        assert not process_incr.apply_async.called
+
+        group = Group.objects.get_from_cache(id=group.id)
+        assert group.times_seen == orig_times_seen + 2
+        assert group.last_seen == last_seen
+        assert Group.objects.get(id=self.group.id).times_seen == self.group.times_seen + 3
+
+        client = self.buf.cluster.get_routing_client()
+        assert client.zrange("b:p", 0, -1) == []
+        assert client.keys("b:k:*") == []
+
+    @mock.patch("sentry.buffer.base.Buffer.process")
+    def test_process_pending_batch_flush_falls_back(self, process):
+        self.buf.batch_flush = True
+        filters = {"project_id": self.project.id, "key": "foo"}
+        self.buf.incr(ProjectOption, {}, filters, signal_only=True)
+        self.buf.process_pending()
+        process.assert_called_once_with(ProjectOption, {}, filters, {}, True)
+
     def test_get(self):
         model = mock.Mock()
         model.__name__ = "Mock"
@@ -149,6 +179,128 @@ class RedisBufferTest(TestCase):
         pending = client.zrange("b:p", 0, -1)
         assert pending == [key.encode("utf-8")]
 
+    def test_incr_local_buffer_coalesces(self):
+        self.buf.local_buffer_window = 60
+        self.buf.local_buffer_size = 3
+        now = datetime(2017, 5, 3, 6, 6, 6, tzinfo=timezone.utc)
+        client = self.buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = "Mock"
+        filters = {"pk": 1}
+        key = self.buf._make_key(model, filters=filters)
+
+        with mock.patch.object(self.buf, "_schedule_local_flush") as schedule:
+            self.buf.incr(model, {"times_seen": 1}, filters, extra={"foo": "bar"})
+            self.buf.incr(model, {"times_seen": 2}, filters, extra={"foo": "baz"})
+        assert schedule.call_count == 1
+        assert client.hgetall(key) == {}
+        assert self.buf.get(model, ["times_seen"], filters=filters) == {"times_seen": 3}
+
+        self.buf.incr(model, {"times_seen": 1}, filters, extra={"datetime": now})
+        result = {force_text(k): v for k, v in client.hgetall(key).items()}
+        assert pickle.loads(result.pop("f")) == filters
+        assert pickle.loads(result.pop("e+foo")) == "baz"
+        assert pickle.loads(result.pop("e+datetime")) == now
+        assert result == {"i+times_seen": b"4", "m": b"unittest.mock.Mock"}
+        assert client.zrange("b:p", 0, -1) == [key.encode("utf-8")]
+        assert self.buf.get(model, ["times_seen"], filters=filters) == {"times_seen": 4}
+
+    def test_flush_local_keeps_signal_only(self):
+        self.buf.local_buffer_window = 60
+        client = self.buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = "Mock"
+        filters = {"pk": 1}
+        key = self.buf._make_key(model, filters=filters)
+
+        with mock.patch.object(self.buf, "_schedule_local_flush"):
+            self.buf.incr(model, {}, filters, signal_only=True)
+            self.buf.incr(model, {"times_seen": 1}, filters)
+        self.buf.flush_local()
+        assert client.hget(key, "s") == b"1"
+        assert client.hget(key, "i+times_seen") == b"1"
+
+    def test_flush_local_restores_entries_on_error(self):
+        self.buf.local_buffer_window = 60
+        client = self.buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = "Mock"
+        filters = {"pk": 1}
+        key = self.buf._make_key(model, filters=filters)
+
+        with mock.patch.object(self.buf, "_schedule_local_flush") as schedule:
+            self.buf.incr(model, {"times_seen": 1}, filters, extra={"foo": "bar"})
+            with mock.patch.object(
+                self.buf.cluster, "get_local_client", side_effect=ConnectionError
+            ):
+                self.buf.flush_local()
+            assert schedule.call_count == 2
+
+            self.buf.incr(model, {"times_seen": 2}, filters, extra={"foo": "baz"})
+        assert client.hgetall(key) == {}
+        assert self.buf.get(model, ["times_seen"], filters=filters) == {"times_seen": 3}
+
+        self.buf.flush_local()
+        assert client.hget(key, "i+times_seen") == b"3"
+        assert pickle.loads(client.hget(key, "e+foo")) == "baz"
+
+    def test_incr_saves_to_redis_msgpack(self):
+        self.buf.value_encoding = "msgpack"
+        now = datetime(2017, 5, 3, 6, 6, 6, tzinfo=timezone.utc)
+        client = self.buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = "Mock"
+        filters = {"pk": 1}
+        key = self.buf._make_key(model, filters=filters)
+        self.buf.incr(model, {"times_seen": 1}, filters, extra={"foo": "bar", "datetime": now})
+        result = {force_text(k): v for k, v in client.hgetall(key).items()}
+
+        assert result["f"].startswith(MSGPACK_V1)
+        assert result["e+foo"].startswith(MSGPACK_V1)
+        assert result["e+datetime"].startswith(MSGPACK_V1)
+        assert self.buf._load_payload(result) == (
+            mock.Mock,
+            {"times_seen": 1},
+            filters,
+            {"foo": "bar", "datetime": now},
+            None,
+        )
+
+    def test_incr_msgpack_falls_back_to_pickle(self):
+        self.buf.value_encoding = "msgpack"
+        client = self.buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = "Mock"
+        filters = {"project": Project(id=1)}
+        key = self.buf._make_key(model, filters=filters)
+        self.buf.incr(model, {"times_seen": 1}, filters)
+        f = client.hget(key, "f")
+        assert not f.startswith(MSGPACK_V1)
+        assert pickle.loads(f) == filters
+
+    def test_dump_field_msgpack_falls_back_to_pickle(self):
+        self.buf.value_encoding = "msgpack"
+        for value in ({"pk": 1}, [1, "a"], 2**63 - 1):
+            assert self.buf._dump_field(value).startswith(MSGPACK_V1)
+            assert self.buf._load_field(self.buf._dump_field(value)) == value
+
+        for value in (2**64, -(2**63) - 1, (1, "a"), {"pk": (1, 2)}):
+            dumped = self.buf._dump_field(value)
+            assert not dumped.startswith(MSGPACK_V1)
+            assert self.buf._load_field(dumped) == value
+
+    @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
+    @mock.patch("sentry.buffer.base.Buffer.process")
+    def test_process_reads_mixed_encodings(self, process):
+        now = datetime(2017, 5, 3, 6, 6, 6, tzinfo=timezone.utc)
+        self.buf.incr(Group, {"times_seen": 1}, {"pk": 1}, extra={"last_seen": now})
+        self.buf.value_encoding = "msgpack"
+        self.buf.incr(Group, {"times_seen": 1}, {"pk": 1}, extra={"foo": "bar"})
+        self.buf.process("foo")
+        process.assert_called_once_with(
+            Group, {"times_seen": 2}, {"pk": 1}, {"last_seen": now, "foo": "bar"}, None
+        )
+
     @mock.patch("sentry.buffer.redis.RedisBuffer._make_key", mock.Mock(return_value="foo"))
     @mock.patch("sentry.buffer.redis.process_incr")
     @mock.patch("sentry.buffer.redis.process_pending")
@@ -36,6 +36,7 @@ from sentry.event_manager import (
     _get_event_instance,
     _save_grouphash_and_group,
     has_pending_commit_resolution,
+    save_events,
 )
 from sentry.eventstore.models import Event
 from sentry.grouping.utils import hash_from_values
@@ -1627,6 +1628,70 @@ class EventManagerTest(TestCase, SnubaTestCase, EventManagerTestMixin, Performan
         # the basic strategy is to simply use the description
         assert spans == [{"hash": hash_values([span["description"]])} for span in data["spans"]]
 
+    def test_save_events(self):
+        def make_transaction(name):
+            return make_event(
+                transaction=name,
+                release="foo-1.0",
+                environment="production",
+                contexts={
+                    "trace": {
+                        "parent_span_id": "bce14471e0e9654d",
+                        "op": "foobar",
+                        "trace_id": "a0fa8803753e40fd8124b21eeb2986b5",
+                        "span_id": "bf5be759039ede9a",
+                    }
+                },
+                spans=[],
+                timestamp=iso_format(before_now(minutes=1)),
+                start_timestamp=iso_format(before_now(minutes=1, seconds=1)),
+                type="transaction",
+            )
+
+        managers = [
+            EventManager(make_transaction("first")),
+            EventManager(make_event(message="error", release="foo-1.0")),
+            EventManager(make_transaction("second")),
+        ]
+        events = save_events(self.project.id, managers)
+
+        assert [event.event_id for event in events] == [
+            manager.get_data()["event_id"] for manager in managers
+        ]
+        assert [event.get_event_type() for event in events] == [
+            "transaction",
+            "default",
+            "transaction",
+        ]
+        assert events[1].group is not None
+        assert [nodestore.get(event.data.id)["transaction"] for event in events[::2]] == [
+            "first",
+            "second",
+        ]
+
+        environment = Environment.objects.get(
+            organization_id=self.project.organization_id, name="production"
+        )
+        assert (
+            ReleaseProjectEnvironment.objects.filter(
+                project=self.project, release__version="foo-1.0", environment=environment
+            ).count()
+            == 1
+        )
+
+    def test_save_events_passes_cache_keys_to_errors(self):
+        managers = [EventManager(make_event(message="error"))]
+        with mock.patch.object(EventManager, "save", autospec=True) as save:
+            save_events(
+                self.project.id, managers, cache_keys=["e:1"], auto_upgrade_grouping=True
+            )
+
+        ((manager, project_id), kwargs) = save.call_args
+        assert manager is managers[0]
+        assert project_id == self.project.id
+        assert kwargs["cache_key"] == "e:1"
+        assert kwargs["auto_upgrade_grouping"] is True
+
     def test_sdk(self):
         manager = EventManager(make_event(**{"sdk": {"name": "sentry-unity", "version": "1.0"}}))
         manager.normalize()
@@ -43,6 +43,20 @@ class EventStorageTest(TestCase):
         assert event.data._node_data is not None
         assert event.data["user"]["id"] == "user1"
 
+    def test_prefetch_nodes(self):
+        event = Event(project_id=self.project.id, event_id="a" * 32)
+        event2 = Event(project_id=self.project.id, event_id="b" * 32, data={"foo": "bar"})
+
+        with mock.patch("sentry.nodestore.prefetch") as prefetch:
+            # Building events does not prefetch their nodes.
+            Event(project_id=self.project.id, event_id="c" * 32)
+            assert not prefetch.called
+
+            self.eventstorage.prefetch_nodes([event, event2], "data")
+
+        # Nodes that already have data are not fetched.
+        prefetch.assert_called_once_with(event.data.id)
+
 
 class ServiceDelegationTest(TestCase, SnubaTestCase):
     def setUp(self):
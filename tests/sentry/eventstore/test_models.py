@@ -1,4 +1,5 @@
 import pickle
+from copy import deepcopy
 from unittest import mock
 
 import pytest
@@ -6,6 +7,8 @@ import pytest
 from sentry import eventstore, nodestore
 from sentry.db.models.fields.node import NodeData, NodeIntegrityFailure
 from sentry.eventstore.models import Event, GroupEvent
+from sentry.grouping.api import get_default_grouping_config_dict
+from sentry.grouping.cache import clear_local_cache
 from sentry.grouping.enhancer import Enhancements
 from sentry.issues.issue_occurrence import IssueOccurrence
 from sentry.issues.occurrence_consumer import process_event_and_issue_occurrence
@@ -14,6 +17,7 @@ from sentry.snuba.dataset import Dataset
 from sentry.testutils import TestCase
 from sentry.testutils.cases import PerformanceIssueTestCase
 from sentry.testutils.helpers.datetime import before_now, iso_format
+from sentry.testutils.helpers.options import override_options
 from sentry.testutils.silo import region_silo_test
 from sentry.utils import snuba
 from tests.sentry.issues.test_utils import OccurrenceTestMixin
@@ -382,6 +386,35 @@ class EventTest(TestCase, PerformanceIssueTestCase):
             v.as_dict()["hash"] for v in variants2.values()
         )
 
+    def test_get_hashes_cache(self):
+        event_data = {
+            "platform": "python",
+            "exception": {
+                "values": [
+                    {
+                        "type": "Hello",
+                        "stacktrace": {"frames": [{"function": "foo"}, {"function": "bar"}]},
+                    }
+                ]
+            },
+        }
+        grouping_config = get_default_grouping_config_dict()
+        clear_local_cache()
+
+        with override_options({"grouping.hash-cache.enabled": True}):
+            event1 = Event(event_id="a" * 32, data=deepcopy(event_data), project_id=self.project.id)
+            hashes = event1.get_hashes(grouping_config)
+
+            event_data["exception"]["values"][0]["stacktrace"]["frames"][0]["vars"] = {"a": 1}
+            event2 = Event(event_id="b" * 32, data=deepcopy(event_data), project_id=self.project.id)
+            with mock.patch.object(Event, "get_sorted_grouping_variants") as get_variants:
+                assert event2.get_hashes(grouping_config) == hashes
+            assert not get_variants.called
+
+            event_data["exception"]["values"][0]["type"] = "World"
+            event3 = Event(event_id="c" * 32, data=deepcopy(event_data), project_id=self.project.id)
+            assert event3.get_hashes(grouping_config) != hashes
+
 
 @region_silo_test
 class EventGroupsTest(TestCase):
@@ -0,0 +1,39 @@
+from sentry.eventstore.processing.base import EventProcessingStore
+from sentry.utils.kvstore.memory import MemoryKVStorage
+
+
+def make_event(event_id, project_id=1):
+    return {"event_id": event_id, "project": project_id, "message": f"event {event_id}"}
+
+
+def test_batch_operations():
+    store = EventProcessingStore(MemoryKVStorage())
+    events = [make_event("a" * 32), make_event("b" * 32), make_event("a" * 32, project_id=2)]
+
+    keys = store.store_many(events)
+    assert keys == [f"e:{'a' * 32}:1", f"e:{'b' * 32}:1", f"e:{'a' * 32}:2"]
+    assert [store.get(key) for key in keys] == events
+
+    unprocessed_keys = store.store_many(events[:1], unprocessed=True)
+    assert unprocessed_keys == [keys[0] + ":u"]
+
+    assert store.get_many([*keys, "e:missing:1"]) == dict(zip(keys, events))
+    assert store.get_many(keys, unprocessed=True) == {keys[0]: events[0]}
+
+    store.delete_many(keys[:2])
+    assert store.get_many(keys) == {keys[2]: events[2]}
+    assert store.get_many(keys, unprocessed=True) == {}
+
+
+def test_store_encoded_many():
+    encoded_inner = MemoryKVStorage()
+    store = EventProcessingStore(MemoryKVStorage(), encoded_inner=encoded_inner)
+    event = make_event("a" * 32)
+
+    (key,) = store.store_encoded_many([(event, b"encoded")])
+    assert encoded_inner.get(key) == b"encoded"
+
+    # Without an encoded view the events themselves are stored.
+    store = EventProcessingStore(MemoryKVStorage())
+    (key,) = store.store_encoded_many([(event, b"encoded")])
+    assert store.get(key) == event
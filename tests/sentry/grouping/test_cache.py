@@ -0,0 +1,53 @@
+from sentry.grouping.api import get_default_grouping_config_dict
+from sentry.grouping.cache import get_grouping_input_digest
+
+
+def _event_data(**kwargs):
+    data = {
+        "platform": "python",
+        "exception": {
+            "values": [
+                {
+                    "type": "ValueError",
+                    "stacktrace": {
+                        "frames": [
+                            {"function": "foo", "vars": {"a": 1}, "pre_context": ["x"]},
+                            {"function": "bar"},
+                        ]
+                    },
+                }
+            ]
+        },
+    }
+    data.update(kwargs)
+    return data
+
+
+def test_digest_ignores_irrelevant_fields():
+    config = get_default_grouping_config_dict()
+    digest = get_grouping_input_digest(_event_data(), config)
+    assert digest is not None
+
+    data = _event_data(message="other", tags=[["foo", "bar"]])
+    data["exception"]["values"][0]["stacktrace"]["frames"][0]["vars"] = {"a": 2}
+    assert get_grouping_input_digest(data, config) == digest
+
+
+def test_digest_covers_grouping_inputs():
+    config = get_default_grouping_config_dict()
+    digest = get_grouping_input_digest(_event_data(), config)
+
+    assert get_grouping_input_digest(_event_data(platform="javascript"), config) != digest
+    assert get_grouping_input_digest(_event_data(), {**config, "enhancements": "x"}) != digest
+
+    data = _event_data()
+    data["exception"]["values"][0]["stacktrace"]["frames"][1]["in_app"] = True
+    assert get_grouping_input_digest(data, config) != digest
+
+
+def test_digest_uncacheable():
+    config = get_default_grouping_config_dict()
+    assert get_grouping_input_digest(_event_data(checksum="a" * 32), config) is None
+    assert get_grouping_input_digest(_event_data(fingerprint=["foo"]), config) is None
+    assert get_grouping_input_digest(_event_data(), {**config, "id": "unknown"}) is None
+    assert get_grouping_input_digest(_event_data(fingerprint=["{{ default }}"]), config) is not None
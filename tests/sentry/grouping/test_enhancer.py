@@ -442,3 +442,61 @@ def test_app_no_matches(frame):
     enhancements = Enhancements.from_config_string("app:no +app")
     enhancements.apply_modifications_to_frame([frame], "native", None)
     assert frame.get("in_app")
+
+
+def test_compiled_rules():
+    enhancements = Enhancements.from_config_string(
+        """
+        family:native function:std::*                   -group
+        [ function:main ] | function:foo                +group
+        function:bar | [ function:abort ]               -group
+        !path:**/vendor/**                              ^-group
+        category:internals                              v+group
+        type:ValueError function:raise*                 -group
+        [ type:ValueError ] | function:baz              +group
+        """
+    )
+    frames = [
+        {"function": "main", "abs_path": "/src/main.c"},
+        {"function": "foo", "abs_path": "/src/vendor/foo.c"},
+        {"function": "std::bar", "abs_path": "/src/vendor/bar.c"},
+        {"function": "bar", "data": {"category": "internals"}},
+        {"function": "abort"},
+        {"function": "raise_error"},
+        {"function": "baz"},
+    ]
+    exception_data = {"type": "ValueError"}
+    match_frames = [create_match_frame(frame, "native") for frame in frames]
+
+    compiled = enhancements._updater_rules
+    expected = [
+        (rule, rule.get_matching_frame_actions(match_frames, "native", exception_data, {}))
+        for rule in compiled.rules
+    ]
+    for _ in range(2):
+        result = compiled.iter_matching_frame_actions(match_frames, "native", exception_data, {})
+        assert list(result) == [(rule, actions) for rule, actions in expected if actions]
+
+    # matcher results are kept per field value across stack traces
+    assert ("function", b"foo") in compiled._masks
+
+
+def test_compiled_rules_modifications():
+    enhancements = Enhancements.from_config_string(
+        """
+        function:foo                                    category=bar
+        category:bar                                    +app
+        app:yes function:foo                            category=baz
+        """
+    )
+    frames = [{"function": "foo"}, {"function": "other"}]
+    enhancements.apply_modifications_to_frame(frames, "native", None)
+
+    assert frames[0]["in_app"]
+    assert frames[0]["data"]["category"] == "baz"
+    assert not frames[1].get("in_app")
+
+
+def test_loads_cached():
+    dumped = Enhancements.from_config_string("function:foo +app").dumps()
+    assert Enhancements.loads(dumped) is Enhancements.loads(dumped)
@@ -0,0 +1,163 @@
+import time
+import uuid
+from datetime import datetime
+from unittest import mock
+
+import msgpack
+import pytest
+from arroyo.backends.kafka import KafkaPayload
+from arroyo.backends.local.backend import LocalBroker
+from arroyo.backends.local.storages.memory import MemoryMessageStorage
+from arroyo.commit import IMMEDIATE
+from arroyo.processing import StreamProcessor
+from arroyo.types import BrokerValue, Message, Partition, Topic
+from django.core.cache import cache
+
+from sentry.event_manager import EventManager
+from sentry.ingest.parallel_consumer import IngestStrategyFactory, decode_message
+from sentry.utils import json
+
+
+@pytest.fixture
+def preprocess_event(monkeypatch):
+    calls = []
+
+    def inner(**kwargs):
+        calls.append(kwargs)
+
+    monkeypatch.setattr("sentry.ingest.ingest_consumer.preprocess_event", inner)
+    return calls
+
+
+def make_message(project, message="hello world"):
+    mgr = EventManager({"message": message, "event_id": uuid.uuid4().hex}, project=project)
+    mgr.normalize()
+    payload = dict(mgr.get_data())
+    return msgpack.packb(
+        {
+            "type": "event",
+            "start_time": time.time(),
+            "event_id": payload["event_id"],
+            "project_id": project.id,
+            "payload": json.dumps(payload),
+        }
+    )
+
+
+def make_factory(**kwargs):
+    kwargs.setdefault("max_batch_size", 2)
+    kwargs.setdefault("max_batch_time", 1.0)
+    kwargs.setdefault("processes", 1)
+    kwargs.setdefault("input_block_size", 16384)
+    kwargs.setdefault("output_block_size", 16384)
+    return IngestStrategyFactory(**kwargs)
+
+
+@pytest.mark.django_db
+def test_decode_message(default_project):
+    value = make_message(default_project)
+    partition = Partition(Topic("ingest-events"), 0)
+    message = Message(BrokerValue(KafkaPayload(None, value, []), partition, 0, datetime.now()))
+
+    decoded = decode_message(message)
+    assert decoded["project_id"] == default_project.id
+    assert "data" not in decoded
+
+    decoded = decode_message(message, parse_payloads=True)
+    assert decoded["project_id"] == default_project.id
+    assert decoded["data"]["logentry"] == {"formatted": "hello world"}
+
+
+@pytest.mark.django_db
+def test_batches_are_committed_after_processing(default_project, task_runner, preprocess_event):
+    partition = Partition(Topic("ingest-events"), 0)
+    commit = mock.Mock()
+    strategy = make_factory().create_with_partitions(commit, {partition: 0})
+
+    for offset in range(3):
+        value = make_message(default_project, message=f"message {offset}")
+        strategy.submit(
+            Message(BrokerValue(KafkaPayload(None, value, []), partition, offset, datetime.now()))
+        )
+        strategy.poll()
+
+    assert len(preprocess_event) == 2
+    assert mock.call({partition: 2}) in commit.mock_calls
+    assert preprocess_event[0]["data"]["logentry"] == {"formatted": "message 0"}
+
+    strategy.close()
+    strategy.join()
+
+    assert len(preprocess_event) == 3
+    assert mock.call({partition: 3}) in commit.mock_calls
+
+
+@pytest.mark.django_db
+def test_batches_are_flushed_by_project(default_project, factories, task_runner, preprocess_event):
+    other_project = factories.create_project(organization=default_project.organization)
+    partition = Partition(Topic("ingest-events"), 0)
+    factory = make_factory(max_batch_size=3)
+    strategy = factory.create_with_partitions(mock.Mock(), {partition: 0})
+
+    with mock.patch.object(
+        factory.worker, "flush_batch", wraps=factory.worker.flush_batch
+    ) as flush_batch:
+        for offset, project in enumerate([default_project, other_project, default_project]):
+            value = make_message(project, message=f"message {offset}")
+            strategy.submit(
+                Message(
+                    BrokerValue(KafkaPayload(None, value, []), partition, offset, datetime.now())
+                )
+            )
+            strategy.poll()
+
+    assert len(preprocess_event) == 3
+    assert [
+        [message["project_id"] for message in call.args[0]] for call in flush_batch.mock_calls
+    ] == [[default_project.id, default_project.id], [other_project.id]]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("parse_payloads", [False, True])
+@pytest.mark.parametrize("processes", [1, 2])
+def test_benchmark_ingest_consumer(
+    processes, parse_payloads, default_project, task_runner, preprocess_event, benchmark
+):
+    """
+    Measures the throughput of the consumer itself, with an in-memory broker
+    and the tasks it dispatches to mocked out. Parsing payloads in the
+    decoding processes only pays off if it beats pickling the parsed events
+    back to the main process.
+    """
+    num_messages = 1000
+    topic = Topic("ingest-events")
+    values = [make_message(default_project) for _ in range(num_messages)]
+
+    def setup():
+        # Forget the event ids seen in the previous round, they would be
+        # skipped as duplicates otherwise.
+        cache.clear()
+
+        broker: LocalBroker[KafkaPayload] = LocalBroker(MemoryMessageStorage())
+        broker.create_topic(topic, partitions=1)
+        producer = broker.get_producer()
+        for value in values:
+            producer.produce(topic, KafkaPayload(None, value, [])).result()
+
+        processor = StreamProcessor(
+            broker.get_consumer("ingest-consumer"),
+            topic,
+            make_factory(
+                max_batch_size=100, processes=processes, parse_payloads=parse_payloads
+            ),
+            IMMEDIATE,
+        )
+        del preprocess_event[:]
+        return (processor,), {}
+
+    def consume(processor):
+        while len(preprocess_event) < num_messages:
+            processor._run_once()
+        processor._shutdown()
+
+    benchmark.pedantic(consume, setup=setup, rounds=5)
@@ -3,18 +3,22 @@ import time
 import uuid
 import zipfile
 from io import BytesIO
+from unittest import mock
 from unittest.mock import Mock
 
 import pytest
 
 from sentry.event_manager import EventManager
+from sentry.eventstore.processing import event_processing_store
 from sentry.ingest.ingest_consumer import (
+    IngestConsumerWorker,
     process_attachment_chunk,
     process_event,
     process_individual_attachment,
     process_userreport,
 )
 from sentry.models import EventAttachment, EventUser, File, UserReport, create_files_from_dif_zip
+from sentry.testutils.helpers import override_options
 from sentry.utils import json
 
 PROGUARD_UUID = "467ade76-6d0b-11ed-a1eb-0242ac120002"
@@ -81,6 +85,128 @@ def test_deduplication_works(default_project, task_runner, preprocess_event):
     }
 
 
+@pytest.mark.django_db
+def test_raw_payload_handoff(default_project, task_runner, preprocess_event):
+    payload = get_normalized_event({"message": "hello world"}, default_project)
+    event_id = payload["event_id"]
+    encoded = json.dumps(payload)
+
+    with override_options({"store.ingest-consumer.raw-payload-handoff": True}), mock.patch.object(
+        event_processing_store, "store", wraps=event_processing_store.store
+    ) as store:
+        process_event(
+            {
+                "payload": encoded,
+                "start_time": time.time() - 3600,
+                "event_id": event_id,
+                "project_id": default_project.id,
+                "remote_addr": "127.0.0.1",
+            },
+            project=default_project,
+        )
+
+    (kwargs,) = preprocess_event
+    assert kwargs["data"] == payload
+    assert event_processing_store.get(kwargs["cache_key"]) == payload
+    if event_processing_store.encoded_inner is not None:
+        assert not store.called
+
+
+@pytest.mark.django_db
+def test_flush_batch_stores_events_at_once(default_project, task_runner, preprocess_event):
+    payloads = [get_normalized_event({"message": f"hello {i}"}, default_project) for i in range(2)]
+    batch = [
+        {
+            "type": "event",
+            "payload": json.dumps(payload),
+            "start_time": time.time() - 3600,
+            "event_id": payload["event_id"],
+            "project_id": default_project.id,
+            "remote_addr": "127.0.0.1",
+        }
+        for payload in payloads
+    ]
+    # Duplicates within a batch are dropped
+    batch.append(dict(batch[0]))
+
+    with override_options(
+        {"store.ingest-consumer.batch-processing-store-writes": True}
+    ), mock.patch.object(
+        event_processing_store, "store_many", wraps=event_processing_store.store_many
+    ) as store_many:
+        IngestConsumerWorker().flush_batch(batch)
+
+    assert store_many.call_count == 1
+    assert [kwargs["data"] for kwargs in preprocess_event] == payloads
+    assert event_processing_store.get_many(
+        [kwargs["cache_key"] for kwargs in preprocess_event]
+    ) == {kwargs["cache_key"]: kwargs["data"] for kwargs in preprocess_event}
+
+
+@pytest.mark.django_db
+def test_flush_batch_saves_transactions_at_once(
+    default_project, task_runner, preprocess_event, save_event_transaction, monkeypatch
+):
+    save_event_transaction_batch = Mock()
+    monkeypatch.setattr(
+        "sentry.ingest.ingest_consumer.save_event_transaction_batch", save_event_transaction_batch
+    )
+    now = datetime.datetime.now()
+    start_time = time.time() - 3600
+    payloads = [
+        get_normalized_event(
+            {
+                "type": "transaction",
+                "timestamp": now.isoformat(),
+                "start_timestamp": now.isoformat(),
+                "spans": [],
+                "contexts": {
+                    "trace": {
+                        "type": "trace",
+                        "op": "foobar",
+                        "trace_id": "a7d67cf796774551a95be6543cacd459",
+                        "span_id": "babaae0d4b7512d9",
+                    }
+                },
+            },
+            default_project,
+        )
+        for _ in range(2)
+    ]
+    batch = [
+        {
+            "type": "event",
+            "payload": json.dumps(payload),
+            "start_time": start_time,
+            "event_id": payload["event_id"],
+            "project_id": default_project.id,
+            "remote_addr": "127.0.0.1",
+        }
+        for payload in payloads
+    ]
+
+    with override_options(
+        {
+            "store.ingest-consumer.batch-processing-store-writes": True,
+            "store.ingest-consumer.batch-save-transactions": True,
+        }
+    ):
+        IngestConsumerWorker().flush_batch(batch)
+
+    assert not save_event_transaction.delay.called
+    save_event_transaction_batch.delay.assert_called_once_with(
+        project_id=default_project.id,
+        events=[
+            {
+                "cache_key": f"e:{payload['event_id']}:{default_project.id}",
+                "start_time": start_time,
+                "event_id": payload["event_id"],
+            }
+            for payload in payloads
+        ],
+    )
+
+
 @pytest.mark.django_db
 def test_transactions_spawn_save_event_transaction(
     default_project,
@@ -469,3 +595,117 @@ def test_individual_attachments_missing_chunks(default_project, factories, monke
     attachments = list(EventAttachment.objects.filter(project_id=project_id, event_id=event_id))
 
     assert not attachments
+
+
+@pytest.mark.django_db
+def test_attachment_chunks_assembled_in_batch(default_project, monkeypatch, django_cache):
+    monkeypatch.setattr("sentry.features.has", lambda *a, **kw: True)
+
+    project_id = default_project.id
+    event_id = uuid.uuid4().hex
+    attachment_id = "ca90fb45-6dd9-40a0-a18f-8693aa621abb"
+    other_event_id = uuid.uuid4().hex
+
+    def make_chunk(event_id, chunk_index, payload):
+        return {
+            "type": "attachment_chunk",
+            "payload": payload,
+            "event_id": event_id,
+            "project_id": project_id,
+            "id": attachment_id,
+            "chunk_index": chunk_index,
+        }
+
+    batch = [
+        make_chunk(event_id, 0, b"Hello "),
+        make_chunk(event_id, 1, b"World!"),
+        # The attachment message for this chunk is not part of the batch
+        make_chunk(other_event_id, 0, b"Bye"),
+        {
+            "type": "attachment",
+            "attachment": {
+                "attachment_type": "event.attachment",
+                "chunks": 2,
+                "content_type": "text/plain",
+                "id": attachment_id,
+                "name": "foo.txt",
+            },
+            "event_id": event_id,
+            "project_id": project_id,
+        },
+    ]
+
+    with mock.patch(
+        "sentry.ingest.ingest_consumer.attachment_cache.set_chunk"
+    ) as set_chunk, mock.patch(
+        "sentry.ingest.ingest_consumer.eventstore.get_event_by_id", return_value=None
+    ):
+        IngestConsumerWorker().flush_batch(batch)
+
+    assert [call.kwargs["key"] for call in set_chunk.call_args_list] == [
+        f"e:{other_event_id}:{project_id}"
+    ]
+
+    (attachment,) = EventAttachment.objects.filter(project_id=project_id, event_id=event_id)
+    file = File.objects.get(id=attachment.file_id)
+    assert file.getfile().read() == b"Hello World!"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("batch_writes", (True, False))
+def test_event_attachment_chunks_assembled_in_batch(
+    default_project, task_runner, batch_writes, monkeypatch, django_cache
+):
+    monkeypatch.setattr("sentry.features.has", lambda *a, **kw: True)
+
+    payload = get_normalized_event({"message": "hello world"}, default_project)
+    event_id = payload["event_id"]
+    attachment_id = "ca90fb45-6dd9-40a0-a18f-8693aa621abb"
+    project_id = default_project.id
+
+    batch = [
+        {
+            "type": "attachment_chunk",
+            "payload": chunk,
+            "event_id": event_id,
+            "project_id": project_id,
+            "id": attachment_id,
+            "chunk_index": chunk_index,
+        }
+        for chunk_index, chunk in enumerate((b"Hello ", b"World!"))
+    ]
+    batch.append(
+        {
+            "type": "event",
+            "payload": json.dumps(payload),
+            "start_time": time.time() - 3600,
+            "event_id": event_id,
+            "project_id": project_id,
+            "remote_addr": "127.0.0.1",
+            "attachments": [
+                {
+                    "id": attachment_id,
+                    "name": "lol.txt",
+                    "content_type": "text/plain",
+                    "attachment_type": "custom.attachment",
+                    "chunks": 2,
+                }
+            ],
+        }
+    )
+
+    with override_options(
+        {"store.ingest-consumer.batch-processing-store-writes": batch_writes}
+    ), mock.patch(
+        "sentry.ingest.ingest_consumer.process_attachment_chunk"
+    ) as process_attachment_chunk, mock.patch(
+        "sentry.ingest.ingest_consumer.metrics.incr"
+    ) as incr, task_runner():
+        IngestConsumerWorker().flush_batch(batch)
+
+    assert not process_attachment_chunk.called
+    incr.assert_any_call("ingest_consumer.attachment_chunks_assembled", amount=2)
+
+    (attachment,) = EventAttachment.objects.filter(project_id=project_id, event_id=event_id)
+    file = File.objects.get(id=attachment.file_id)
+    assert file.getfile().read() == b"Hello World!"
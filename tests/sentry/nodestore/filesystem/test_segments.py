@@ -0,0 +1,156 @@
+import os
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from django.utils import timezone
+
+from sentry.nodestore.filesystem.segments import SEGMENT_SUFFIX, SegmentNodeStorage
+
+
+def segment_files(ns):
+    return sorted(
+        os.path.join(shard.path, name)
+        for shard in ns.shards
+        for name in os.listdir(shard.path)
+        if name.endswith(SEGMENT_SUFFIX)
+    )
+
+
+class TestSegmentNodeStorage:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.ns = SegmentNodeStorage(path=str(tmp_path), shards=1, capacity=16)
+        self.ns.bootstrap()
+
+    def test_overwrite(self):
+        self.ns.set("node_1", {"foo": "a"})
+        self.ns.set("node_1", {"foo": "b"})
+        assert self.ns.get("node_1") == {"foo": "b"}
+        assert len(segment_files(self.ns)) == 1
+
+    def test_rotates_full_segments(self):
+        nodes = {f"node_{i}": {"foo": i} for i in range(50)}
+        for id, data in nodes.items():
+            self.ns.set(id, data)
+
+        assert len(segment_files(self.ns)) > 2
+        assert self.ns.get_multi(list(nodes)) == nodes
+
+    def test_rotates_by_interval(self):
+        self.ns.segment_interval = timedelta(seconds=0)
+        self.ns.set("node_1", {"foo": "a"})
+        self.ns.set("node_1", {"foo": "b"})
+
+        assert len(segment_files(self.ns)) == 2
+        assert self.ns.get("node_1") == {"foo": "b"}
+
+        self.ns.delete("node_1")
+        assert self.ns.get("node_1") is None
+
+    def test_reads_writes_of_other_instances(self, tmp_path):
+        other = SegmentNodeStorage(path=str(tmp_path), shards=1, capacity=16)
+        self.ns.set("node_1", {"foo": "a"})
+        assert other.get("node_1") == {"foo": "a"}
+
+        other.set("node_1", {"foo": "b"})
+        other.set("node_2", {"foo": "c"})
+        assert self.ns.get_multi(["node_1", "node_2"]) == {
+            "node_1": {"foo": "b"},
+            "node_2": {"foo": "c"},
+        }
+
+    def test_shares_shards_between_threads(self, tmp_path):
+        shards = []
+        thread = threading.Thread(
+            target=lambda: shards.append(
+                SegmentNodeStorage(path=str(tmp_path), shards=1, capacity=16).shards[0]
+            )
+        )
+        thread.start()
+        thread.join()
+        assert shards == [self.ns.shards[0]]
+
+    def test_limits_open_segments(self, tmp_path):
+        ns = SegmentNodeStorage(path=str(tmp_path / "limited"), shards=1, max_open_segments=2)
+        ns.bootstrap()
+        ns.segment_interval = timedelta(seconds=0)
+        nodes = {f"node_{i}": {"foo": i} for i in range(5)}
+        for id, data in nodes.items():
+            ns.set(id, data)
+
+        shard = ns.shards[0]
+        assert len(shard.segments) == 5
+        assert ns.get_multi(list(nodes)) == nodes
+        assert len(shard.open_segments) == 2
+        assert sum(segment._fd is not None for segment in shard.segments) == 2
+
+    def test_ttl(self):
+        self.ns.set("node_1", {"foo": "a"}, ttl=timedelta(seconds=30))
+        self.ns.set("node_2", {"foo": "b"})
+        assert self.ns.get("node_1") == {"foo": "a"}
+        if self.ns.cache:
+            self.ns.cache.clear()
+
+        with mock.patch("time.time", return_value=time.time() + 60):
+            assert self.ns.get("node_1") is None
+            assert self.ns.get("node_2") == {"foo": "b"}
+
+    def test_cleanup_drops_old_segments(self):
+        self.ns.segment_interval = timedelta(seconds=0)
+        self.ns.set("node_1", {"foo": "a"})
+        self.ns.set("node_2", {"foo": "b"})
+        self.ns.set("node_3", {"foo": "c"})
+
+        old = segment_files(self.ns)
+        for path in old:
+            os.utime(path, (0, 0))
+        self.ns.set("node_4", {"foo": "d"})
+
+        self.ns.cleanup(timezone.now() - timedelta(days=1))
+
+        assert self.ns.get("node_4") == {"foo": "d"}
+        for id in ("node_1", "node_2", "node_3"):
+            assert self.ns.get(id) is None
+        assert not set(old) & set(segment_files(self.ns))
+
+    def test_cleanup_drops_expired_segments(self):
+        self.ns.segment_interval = timedelta(seconds=0)
+        self.ns.set("node_1", {"foo": "a"}, ttl=timedelta(seconds=30))
+        self.ns.set("node_2", {"foo": "b"}, ttl=timedelta(seconds=30))
+        expired = segment_files(self.ns)
+
+        with mock.patch("time.time", return_value=time.time() + 60):
+            self.ns.set("node_3", {"foo": "c"})
+            self.ns.cleanup(timezone.now() - timedelta(days=1))
+
+        assert self.ns.get("node_3") == {"foo": "c"}
+        assert not set(expired) & set(segment_files(self.ns))
+
+    def test_compaction(self):
+        nodes = {f"node_{i}": {"foo": i} for i in range(10)}
+        for id, data in nodes.items():
+            self.ns.set(id, data)
+            # superseded values are garbage as well
+            self.ns.set(id, data)
+        self.ns.delete_multi([f"node_{i}" for i in range(7)])
+
+        # make the current segments inactive
+        self.ns.segment_interval = timedelta(seconds=0)
+        self.ns.set("node_10", {"foo": 10})
+        sizes = {path: os.path.getsize(path) for path in segment_files(self.ns)}
+
+        self.ns.cleanup(timezone.now() - timedelta(days=1))
+
+        compacted = {path: os.path.getsize(path) for path in segment_files(self.ns)}
+        assert sum(compacted.values()) < sum(sizes.values())
+        assert all(compacted[path] <= sizes[path] for path in compacted)
+        assert self.ns.get_multi(list(nodes) + ["node_10"]) == {
+            **{f"node_{i}": None for i in range(7)},
+            "node_7": {"foo": 7},
+            "node_8": {"foo": 8},
+            "node_9": {"foo": 9},
+            "node_10": {"foo": 10},
+        }
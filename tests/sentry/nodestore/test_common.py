@@ -2,12 +2,26 @@
 Testsuite of backend-independent nodestore tests. Add your backend to the
 `ns` fixture to have it tested.
 """
+import os
+import time
 from contextlib import nullcontext
+from unittest import mock
 
 import pytest
-
+import zstandard
+from django.test import override_settings
+
+from sentry.nodestore.base import NodeMemo
+from sentry.nodestore.compression import (
+    RELOAD_INTERVAL,
+    ZSTD_MAGIC,
+    CompressionDictionaries,
+    get_dictionary_id,
+)
 from sentry.nodestore.django.backend import DjangoNodeStorage
+from sentry.nodestore.filesystem.segments import SegmentNodeStorage
 from sentry.testutils.silo import region_silo_test
+from sentry.utils import json
 from tests.sentry.nodestore.bigtable.test_backend import (
     MockedBigtableNodeStorage,
     get_temporary_bigtable_nodestorage,
@@ -15,14 +29,22 @@ from tests.sentry.nodestore.bigtable.test_backend import (
 
 
 @pytest.fixture(
-    params=["bigtable-mocked", "bigtable-real", pytest.param("django", marks=pytest.mark.django_db)]
+    params=[
+        "bigtable-mocked",
+        "bigtable-real",
+        pytest.param("django", marks=pytest.mark.django_db),
+        "filesystem-segments",
+    ]
 )
-def ns(request):
+def ns(request, tmp_path):
     # backends are returned from context managers to support teardown when required
     backends = {
         "bigtable-mocked": lambda: nullcontext(MockedBigtableNodeStorage(project="test")),
         "bigtable-real": lambda: get_temporary_bigtable_nodestorage(),
         "django": lambda: nullcontext(DjangoNodeStorage()),
+        "filesystem-segments": lambda: nullcontext(
+            SegmentNodeStorage(path=str(tmp_path / "nodestore"))
+        ),
     }
 
     ctx = backends[request.param]()
@@ -97,3 +119,119 @@ def test_set_subkeys(ns):
     ns.delete("node_1")
     assert ns.get("node_1") is None
     assert ns.get("node_1", subkey="other") is None
+
+
+@region_silo_test(stable=True)
+def test_set_subkeys_multi(ns):
+    ns.set("node_2", {"foo": "old"})
+
+    with mock.patch.object(ns, "_set_bytes_multi", wraps=ns._set_bytes_multi) as set_bytes_multi:
+        ns.set_subkeys_multi(
+            {
+                "node_1": {None: {"foo": "a"}, "other": {"foo": "b"}},
+                "node_2": {None: {"foo": "c"}},
+            }
+        )
+        assert set_bytes_multi.call_count == 1
+
+    assert ns.get_multi(["node_1", "node_2"]) == {"node_1": {"foo": "a"}, "node_2": {"foo": "c"}}
+    assert ns.get("node_1", subkey="other") == {"foo": "b"}
+    assert ns.get("node_2", subkey="other") is None
+
+
+@region_silo_test(stable=True)
+def test_local_cache(ns):
+    nodes = [("node_1", {"foo": "a"}), ("node_2", {"foo": "b"}), ("node_3", {"foo": "c"})]
+    for n in nodes:
+        ns.set(n[0], n[1])
+    if ns.cache:
+        ns.cache.clear()
+
+    with ns.local_cache(), mock.patch.object(
+        ns, "_get_bytes_multi", wraps=ns._get_bytes_multi
+    ) as get_bytes_multi:
+        ns.prefetch("node_2")
+        ns.prefetch("node_3")
+        assert ns.get("node_1") == {"foo": "a"}
+        assert get_bytes_multi.call_count == 1
+        assert sorted(get_bytes_multi.call_args[0][0]) == ["node_1", "node_2", "node_3"]
+
+        # every read hands out a fresh copy
+        node = ns.get("node_2")
+        node["foo"] = "mutated"
+        assert ns.get_multi(["node_2", "node_3"]) == {
+            "node_2": {"foo": "b"},
+            "node_3": {"foo": "c"},
+        }
+        assert get_bytes_multi.call_count == 1
+
+        ns.set("node_1", {"foo": "new"})
+        assert ns.get("node_1") == {"foo": "new"}
+        ns.delete("node_3")
+        assert ns.get("node_3") is None
+
+    # outside of the block, prefetching does nothing
+    ns.prefetch("node_1")
+    assert ns._memo is None
+
+
+def test_node_memo_evicts_by_size():
+    memo = NodeMemo(max_bytes=10)
+    memo.set("a", b"12345")
+    memo.set("b", b"12345")
+    assert memo.get_many(["a"]) == {"a": b"12345"}
+
+    # "b" is the least recently used entry now
+    memo.set("c", b"123")
+    assert memo.get_many(["a", "b", "c"]) == {"a": b"12345", "c": b"123"}
+    assert memo.size == 8
+
+    # payloads larger than the memo are never stored
+    memo.set("d", b"12345678901")
+    assert memo.get_many(["d"]) == {}
+
+
+def train_python_dictionary():
+    samples = [
+        json.dumps(
+            {"platform": "python", "sdk": {"name": "sentry.python", "version": f"1.{i}.0"}}
+        ).encode("utf8")
+        for i in range(500)
+    ]
+    return zstandard.train_dictionary(1024, samples)
+
+
+@region_silo_test(stable=True)
+def test_compression_dictionaries(ns, tmp_path):
+    dictionary = train_python_dictionary()
+    CompressionDictionaries(str(tmp_path)).add("python", dictionary)
+
+    with override_settings(SENTRY_NODESTORE_DICTIONARIES_PATH=str(tmp_path)):
+        data = {"platform": "python", "sdk": {"name": "sentry.python", "version": "1.9.0"}}
+        ns.set_subkeys("node_1", {None: data, "other": {"foo": "b"}})
+        ns.set("node_2", {"platform": "javascript"})
+        if ns.cache:
+            ns.cache.clear()
+
+        raw = ns._get_bytes("node_1")
+        assert raw.startswith(ZSTD_MAGIC)
+        assert get_dictionary_id(raw) == dictionary.dict_id()
+        assert ns.get("node_1") == data
+        assert ns.get("node_1", subkey="other") == {"foo": "b"}
+
+        assert ns._get_bytes("node_2") == b'{"platform":"javascript"}'
+        assert ns.get("node_2") == {"platform": "javascript"}
+
+
+def test_compression_dictionaries_reload(tmp_path):
+    dictionaries = CompressionDictionaries(str(tmp_path))
+    assert dictionaries.get_codec_for_platform("python") is None
+
+    dictionary = train_python_dictionary()
+    CompressionDictionaries(str(tmp_path)).add("python", dictionary)
+    assert sorted(os.listdir(tmp_path)) == [f"{dictionary.dict_id()}.dict", "index.json"]
+
+    # changes are only picked up every RELOAD_INTERVAL seconds
+    assert dictionaries.get_codec_for_platform("python") is None
+    with mock.patch("time.monotonic", return_value=time.monotonic() + RELOAD_INTERVAL):
+        assert dictionaries.get_codec_for_platform("python") is not None
@@ -0,0 +1,157 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.utils import timezone
+
+from sentry.models import Rule
+from sentry.rules import frequency_counters
+from sentry.rules.conditions.event_frequency import EventFrequencyCondition
+from sentry.testutils import TestCase
+from sentry.testutils.cases import RuleTestCase
+from sentry.testutils.helpers import override_options
+from sentry.testutils.silo import region_silo_test
+
+
+def start_counting(counter, at):
+    with patch("sentry.rules.frequency_counters.timezone.now", return_value=at):
+        frequency_counters.increment([counter], at)
+
+
+@region_silo_test(stable=True)
+class FrequencyCountersTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now()
+        self.since = self.now - timedelta(minutes=20)
+        start_counting((self.project.id, 1, None), self.since)
+
+    def test_get_counts(self):
+        frequency_counters.increment(
+            [(self.project.id, 1, None), (self.project.id, 2, None)],
+            self.now - timedelta(minutes=5),
+        )
+        frequency_counters.increment([(self.project.id, 1, None)], self.now)
+
+        assert frequency_counters.get_counts(
+            self.project.id, [1, 2, 3], None, self.now - timedelta(minutes=10), self.now
+        ) == {1: 2, 2: 1, 3: 0}
+
+    def test_get_counts_short_interval(self):
+        end = self.now.replace(second=55, microsecond=0)
+        # Outside of the first bucket of the interval.
+        frequency_counters.increment([(self.project.id, 1, None)], end - timedelta(seconds=110))
+        # In the first bucket, which is counted as a whole.
+        frequency_counters.increment([(self.project.id, 1, None)], end - timedelta(seconds=65))
+
+        assert frequency_counters.get_counts(
+            self.project.id, [1], None, end - timedelta(minutes=1), end
+        ) == {1: 1}
+
+    def test_old_buckets_expire(self):
+        client = frequency_counters._get_client()
+        old = self.now - timedelta(hours=2)
+        frequency_counters.increment([(self.project.id, 1, None)], old)
+        frequency_counters.increment([(self.project.id, 1, None)], self.now)
+
+        old_bucket = frequency_counters._get_bucket(old)
+        old_key = frequency_counters._get_group_key(1, None, old_bucket)
+        new_bucket = frequency_counters._get_bucket(self.now)
+        new_key = frequency_counters._get_group_key(1, None, new_bucket)
+
+        # Buckets of a segment are dropped with it, later events do not keep
+        # the segment alive.
+        assert client.hkeys(old_key) == [str(old_bucket)]
+        assert 0 < client.ttl(old_key) <= frequency_counters.KEY_TTL
+        assert str(old_bucket) not in client.hkeys(new_key)
+
+    def test_get_counts_environment(self):
+        start_counting((self.project.id, 1, 10), self.since)
+        frequency_counters.increment([(self.project.id, 1, 10)], self.now)
+
+        start = self.now - timedelta(minutes=10)
+        assert frequency_counters.get_counts(self.project.id, [1], 10, start, self.now) == {1: 1}
+        assert frequency_counters.get_counts(self.project.id, [1], 11, start, self.now) is None
+
+    def test_get_counts_not_covered(self):
+        # Counting started after the start of the interval.
+        assert (
+            frequency_counters.get_counts(
+                self.project.id, [1], None, self.since - timedelta(minutes=5), self.now
+            )
+            is None
+        )
+        # Workers may not have seen the rule yet right after counting started.
+        assert (
+            frequency_counters.get_counts(
+                self.project.id, [1], None, self.since + timedelta(seconds=30), self.now
+            )
+            is None
+        )
+        # The interval is longer than the counters are kept.
+        assert (
+            frequency_counters.get_counts(
+                self.project.id, [1], None, self.now - timedelta(days=1), self.now
+            )
+            is None
+        )
+
+    def test_counting_starts_now(self):
+        # Late events do not move the start of counting into the past.
+        frequency_counters.increment([(self.project.id, 1, 10)], self.now - timedelta(minutes=30))
+
+        assert (
+            frequency_counters.get_counts(
+                self.project.id, [1], 10, self.now - timedelta(minutes=10), self.now
+            )
+            is None
+        )
+
+    def test_get_counted_environment_ids(self):
+        environment = self.create_environment(self.project)
+        Rule.objects.filter(project=self.project).delete()
+        condition = {"id": frequency_counters.FREQUENCY_CONDITION_ID, "value": 10, "interval": "1h"}
+        self.create_project_rule(self.project, condition_data=[condition])
+        self.create_project_rule(self.project, condition_data=[condition]).update(
+            environment_id=environment.id
+        )
+        self.create_project_rule(self.project)
+
+        assert frequency_counters.get_counted_environment_ids(self.project.id) == {
+            None,
+            environment.id,
+        }
+
+
+@region_silo_test(stable=True)
+class EventFrequencyConditionCountersTest(RuleTestCase):
+    rule_cls = EventFrequencyCondition
+
+    def setUp(self):
+        super().setUp()
+        event = self.store_event(data={}, project_id=self.project.id)
+        self.event = event.for_group(event.group)
+        self.condition = self.get_rule(
+            data={"interval": "5m", "value": 2}, rule=Rule(environment_id=None)
+        )
+
+    def test_reads_counters(self):
+        now = timezone.now()
+        counter = (self.project.id, self.event.group_id, None)
+        start_counting(counter, now - timedelta(minutes=30))
+        for _ in range(3):
+            frequency_counters.increment([counter], now)
+
+        with override_options({"rules.frequency-counters.enabled": True}), patch.object(
+            EventFrequencyCondition, "query_hook"
+        ) as query_hook:
+            self.assertPasses(self.condition)
+
+        assert not query_hook.called
+
+    def test_falls_back_to_tsdb(self):
+        with override_options({"rules.frequency-counters.enabled": True}), patch.object(
+            EventFrequencyCondition, "query_hook", return_value=0
+        ) as query_hook:
+            self.assertDoesNotPass(self.condition)
+
+        assert query_hook.called
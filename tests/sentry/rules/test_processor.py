@@ -347,6 +347,78 @@ class RuleProcessorTest(TestCase):
         # mock condition first.
         assert passes.call_count == 0
 
+    def make_processor(self, group_event):
+        return RuleProcessor(
+            group_event,
+            is_new=True,
+            is_regression=True,
+            is_new_group_environment=True,
+            has_reappeared=True,
+        )
+
+    def test_apply_batch(self):
+        other_event = self.store_event(
+            data={"fingerprint": ["other-group"]}, project_id=self.project.id
+        )
+        other_event = next(other_event.build_group_events())
+        assert other_event.group_id != self.group_event.group_id
+        processors = [self.make_processor(self.group_event), self.make_processor(other_event)]
+
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            results = RuleProcessor.apply_batch(processors)
+
+        # The statuses of both groups are fetched, created and fetched again together.
+        status_queries = [
+            q
+            for q in queries.captured_queries
+            if "grouprulestatus" in str(q) and "UPDATE" not in str(q)
+        ]
+        assert len(status_queries) == 3
+        assert [len(list(result)) for result in results] == [1, 1]
+        assert RuleFireHistory.objects.filter(rule=self.rule).count() == 2
+
+        # The rules do not fire again within their frequency.
+        assert [list(result) for result in RuleProcessor.apply_batch(processors)] == [[], []]
+
+    @patch(
+        "sentry.constants._SENTRY_RULES",
+        [
+            "sentry.mail.actions.NotifyEmailAction",
+            "sentry.rules.conditions.event_frequency.EventFrequencyCondition",
+        ],
+    )
+    def test_apply_batch_queries_frequency_once(self):
+        self.rule.update(
+            data={
+                "conditions": [
+                    {
+                        "id": "sentry.rules.conditions.event_frequency.EventFrequencyCondition",
+                        "interval": "1h",
+                        "value": 1,
+                    },
+                ],
+                "actions": [EMAIL_ACTION_DATA],
+            },
+        )
+        other_event = self.store_event(
+            data={"fingerprint": ["other-group"]}, project_id=self.project.id
+        )
+        other_event = next(other_event.build_group_events())
+        processors = [self.make_processor(self.group_event), self.make_processor(other_event)]
+
+        with patch("sentry.rules.processor.rules", init_registry()), patch(
+            "sentry.tsdb.get_sums",
+            return_value={self.group_event.group_id: 2, other_event.group_id: 1},
+        ) as get_sums:
+            results = RuleProcessor.apply_batch(processors)
+
+        assert get_sums.call_count == 1
+        assert set(get_sums.call_args.kwargs["keys"]) == {
+            self.group_event.group_id,
+            other_event.group_id,
+        }
+        assert [len(list(result)) for result in results] == [1, 0]
+
 
 class MockFilterTrue(EventFilter):
     id = "tests.sentry.rules.test_processor.MockFilterTrue"
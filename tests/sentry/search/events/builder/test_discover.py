@@ -12,7 +12,9 @@ from snuba_sdk.orderby import Direction, LimitBy, OrderBy
 from sentry.exceptions import InvalidSearchQuery
 from sentry.search.events import constants
 from sentry.search.events.builder import QueryBuilder
+from sentry.search.events.builder import discover as discover_builder
 from sentry.testutils.cases import TestCase
+from sentry.testutils.helpers import override_options
 from sentry.utils.snuba import Dataset, QueryOutsideRetentionError
 from sentry.utils.validators import INVALID_ID_DETAILS
 
@@ -809,3 +811,59 @@ class QueryBuilderTest(TestCase):
                 query="profile.id:foo",
                 selected_columns=["count()"],
             )
+
+
+class QueryBuilderPlanCacheTest(TestCase):
+    def setUp(self):
+        self.start = datetime.datetime.now(tz=timezone.utc).replace(
+            hour=10, minute=15, second=0, microsecond=0
+        ) - datetime.timedelta(days=2)
+        self.end = self.start + datetime.timedelta(days=1)
+        self.params = {
+            "project_id": [self.project.id],
+            "organization_id": self.organization.id,
+            "start": self.start,
+            "end": self.end,
+        }
+        discover_builder._plan_cache.clear()
+
+    def build_query(self, params, selected_columns, **kwargs):
+        return QueryBuilder(Dataset.Discover, params, selected_columns=selected_columns, **kwargs)
+
+    def test_reuses_plan(self):
+        other_params = {**self.params, "project_id": [self.create_project().id]}
+        kwargs = {
+            "selected_columns": ["transaction", "count()", "p95(transaction.duration)"],
+            "equations": ["count() / 2"],
+            "orderby": ["-count()"],
+            "query": "release:1.2.1",
+        }
+
+        with override_options({"discover.query-builder.plan-cache": True}):
+            self.build_query(self.params, **kwargs)
+            assert len(discover_builder._plan_cache) == 1
+            cached = self.build_query(other_params, **kwargs)
+        uncached = self.build_query(other_params, **kwargs)
+
+        assert cached.get_snql_query().query == uncached.get_snql_query().query
+        assert cached.function_alias_map.keys() == uncached.function_alias_map.keys()
+        assert cached.function_alias_map["count"].instance.name == "count"
+        assert cached.equation_alias_map == uncached.equation_alias_map
+
+    def test_skips_plan_reading_params(self):
+        with override_options({"discover.query-builder.plan-cache": True}):
+            self.build_query(self.params, ["project", "count()"])
+            self.build_query(self.params, ["apdex()"])
+
+        assert len(discover_builder._plan_cache) == 0
+
+    def test_skips_aggregate_conditions(self):
+        with override_options({"discover.query-builder.plan-cache": True}):
+            self.build_query(
+                self.params,
+                ["transaction", "count()"],
+                query="count():>1",
+                use_aggregate_conditions=True,
+            )
+
+        assert len(discover_builder._plan_cache) == 0
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import abc
+import threading
 import time
 from datetime import datetime, timedelta
 from typing import Any
@@ -49,10 +50,11 @@ from sentry.tasks.post_process import (
     ISSUE_OWNERS_PER_PROJECT_PER_MIN_RATELIMIT,
     post_process_group,
     process_event,
+    run_post_process_job,
 )
 from sentry.testutils import SnubaTestCase, TestCase
 from sentry.testutils.cases import BaseTestCase, PerformanceIssueTestCase
-from sentry.testutils.helpers import with_feature
+from sentry.testutils.helpers import override_options, with_feature
 from sentry.testutils.helpers.datetime import before_now, iso_format
 from sentry.testutils.helpers.eventprocessing import write_event_to_cache
 from sentry.testutils.performance_issues.store_transaction import PerfIssueTransactionTestMixin
@@ -1482,6 +1484,56 @@ class SnoozeTestMixin(BasePostProgressGroupMixin):
         ).exists()
 
 
+class RunPostProcessJobTest(TestCase):
+    def run_job(self, pipeline, concurrent_steps):
+        calls = []
+
+        def make_step(name):
+            def step(job):
+                calls.append((name, threading.current_thread().name))
+
+            step.__name__ = name
+            return step
+
+        steps = {name: make_step(name) for name in pipeline}
+        job = {"event": Mock(), "has_alert": False}
+        job["event"].group.issue_type.allow_post_process_group.return_value = True
+
+        with patch(
+            "sentry.tasks.post_process.GENERIC_POST_PROCESS_PIPELINE",
+            [steps[name] for name in pipeline],
+        ), patch(
+            "sentry.tasks.post_process.CONCURRENT_POST_PROCESS_STEPS",
+            {steps[name]: [steps[dep] for dep in deps] for name, deps in concurrent_steps.items()},
+        ):
+            run_post_process_job(job)
+
+        return calls
+
+    def test_sequential_by_default(self):
+        calls = self.run_job(["a", "b", "c"], {"b": []})
+        assert calls == [(name, threading.current_thread().name) for name in ["a", "b", "c"]]
+
+    @override_options({"post-process.concurrent-steps": True})
+    def test_concurrent_steps(self):
+        calls = self.run_job(["a", "b", "c", "d"], {"b": [], "d": ["b"]})
+
+        threads = dict(calls)
+        assert set(threads) == {"a", "b", "c", "d"}
+        assert threads["a"] == threads["c"] == threading.current_thread().name
+        assert threads["b"].startswith("post-process-step")
+        assert threads["d"].startswith("post-process-step")
+        # Steps are complete once the job has run, in order of their dependencies.
+        assert [name for name, _ in calls].index("b") < [name for name, _ in calls].index("d")
+
+    @override_options({"post-process.concurrent-steps": True})
+    def test_concurrent_steps_close_connections(self):
+        with patch("sentry.tasks.post_process.connections") as connections:
+            self.run_job(["a", "b", "c"], {"b": [], "c": []})
+
+        assert connections.close_all.call_count == 2
+
+
 @region_silo_test
 class PostProcessGroupErrorTest(
     TestCase,
@@ -9,10 +9,14 @@ from sentry.event_manager import EventManager, HashDiscarded
 from sentry.plugins.base.v2 import Plugin2
 from sentry.tasks.store import (
     preprocess_event,
+    preprocess_event_from_reprocessing,
+    process_and_save_event,
     process_event,
     save_event,
+    save_event_transaction_batch,
     time_synthetic_monitoring_event,
 )
+from sentry.testutils.helpers import override_options
 
 EVENT_ID = "cc3e6c2bb6b6498097f336d1e6979f4b"
 
@@ -130,6 +134,116 @@ def test_move_to_save_event(
     assert mock_save_event.delay.call_count == 1
 
 
+@pytest.mark.django_db
+def test_move_to_process_and_save_event(
+    default_project, mock_process_event, mock_save_event, mock_symbolicate_event
+):
+    data = {
+        "project": default_project.id,
+        "platform": "python",
+        "logentry": {"formatted": "test"},
+        "event_id": EVENT_ID,
+        "exception": {
+            "values": [{"type": "Error", "stacktrace": {"frames": [{"function": "foo"}]}}]
+        },
+    }
+
+    with mock.patch(
+        "sentry.tasks.store.should_process_for_stacktraces", return_value=True
+    ), mock.patch("sentry.tasks.store.process_and_save_event") as mock_process_and_save_event:
+        with override_options({"store.process-and-save-inline-rate": 1.0}):
+            preprocess_event(cache_key="", data=data)
+
+        assert mock_process_and_save_event.delay.call_count == 1
+        assert mock_process_event.delay.call_count == 0
+
+        with override_options(
+            {
+                "store.process-and-save-inline-rate": 1.0,
+                "store.process-and-save-inline.max-frames": 0,
+            }
+        ):
+            preprocess_event(cache_key="", data=data)
+
+        assert mock_process_and_save_event.delay.call_count == 1
+        assert mock_process_event.delay.call_count == 1
+
+    assert mock_symbolicate_event.delay.call_count == 0
+    assert mock_save_event.delay.call_count == 0
+
+
+@pytest.mark.django_db
+def test_reprocessed_events_skip_process_and_save_event(
+    default_project, mock_process_event, mock_save_event, mock_symbolicate_event
+):
+    data = {
+        "project": default_project.id,
+        "platform": "python",
+        "logentry": {"formatted": "test"},
+        "event_id": EVENT_ID,
+    }
+
+    with mock.patch(
+        "sentry.tasks.store.should_process_for_stacktraces", return_value=True
+    ), mock.patch(
+        "sentry.tasks.store.process_event_from_reprocessing"
+    ) as mock_process_event_from_reprocessing, mock.patch(
+        "sentry.tasks.store.process_and_save_event"
+    ) as mock_process_and_save_event, override_options(
+        {"store.process-and-save-inline-rate": 1.0}
+    ):
+        preprocess_event_from_reprocessing(cache_key="", data=data)
+
+    assert mock_process_and_save_event.delay.call_count == 0
+    assert mock_process_event_from_reprocessing.delay.call_count == 1
+    assert mock_process_event.delay.call_count == 0
+
+
+@pytest.mark.django_db
+def test_process_and_save_event(default_project, mock_event_processing_store, mock_save_event):
+    data = {
+        "project": default_project.id,
+        "platform": "python",
+        "logentry": {"formatted": "test"},
+        "event_id": EVENT_ID,
+    }
+    mock_event_processing_store.get.return_value = data
+
+    with mock.patch("sentry.tasks.store._do_save_event") as mock_do_save_event:
+        process_and_save_event(cache_key="e:1", start_time=1)
+
+    ((_, kwargs),) = mock_do_save_event.call_args_list
+    assert kwargs["cache_key"] == "e:1"
+    assert kwargs["project_id"] == default_project.id
+    assert kwargs["data"]["event_id"] == EVENT_ID
+    assert mock_save_event.delay.call_count == 0
+    assert mock_event_processing_store.store.call_count == 0
+
+
+@pytest.mark.django_db
+def test_save_event_transaction_batch(default_project, mock_event_processing_store):
+    events = [
+        {"cache_key": f"e:{event_id}:1", "start_time": 1, "event_id": event_id}
+        for event_id in ("a" * 32, "b" * 32, "c" * 32)
+    ]
+    mock_event_processing_store.get_many.return_value = {
+        events[0]["cache_key"]: {"type": "transaction", "platform": "python", "event_id": "a" * 32},
+        events[2]["cache_key"]: {"type": "transaction", "platform": "python", "event_id": "c" * 32},
+    }
+
+    with mock.patch("sentry.event_manager.save_events") as mock_save_events:
+        save_event_transaction_batch(project_id=default_project.id, events=events)
+
+    # The event missing from the processing store is skipped.
+    ((project_id, managers), kwargs) = mock_save_events.call_args
+    assert project_id == default_project.id
+    assert [manager.get_data()["event_id"] for manager in managers] == ["a" * 32, "c" * 32]
+    assert kwargs["start_times"] == [1, 1]
+    assert kwargs["cache_keys"] == [events[0]["cache_key"], events[2]["cache_key"]]
+    ((saved_data,), _) = mock_event_processing_store.store_many.call_args
+    assert [data["event_id"] for data in saved_data] == ["a" * 32, "c" * 32]
+
+
 @pytest.mark.django_db
 def test_process_event_mutate_and_save(
     default_project, mock_event_processing_store, mock_save_event, register_plugin
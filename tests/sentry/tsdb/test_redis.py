@@ -80,6 +80,32 @@ class RedisTSDBTest(TestCase):
         result = self.db.get_model_key("我爱啤酒")
         assert result == "26f980fbe1e8a9d3a0123d2049f95f28"
 
+    def test_get_range_series(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC) - timedelta(hours=4)
+        dts = [now + timedelta(hours=i) for i in range(4)]
+        keys = [1, 2, "foo", 1 + self.db.vnodes]
+
+        self.db.incr(TSDBModel.project, 1, dts[0])
+        self.db.incr(TSDBModel.project, 1, dts[2], count=2)
+        self.db.incr(TSDBModel.project, "foo", dts[1], count=5)
+        self.db.incr(TSDBModel.project, 1 + self.db.vnodes, dts[3], count=7)
+        self.db.incr(TSDBModel.project, 2, dts[3], environment_id=1)
+
+        timestamps, counts = self.db.get_range_series(TSDBModel.project, keys, dts[0], dts[-1])
+        assert list(timestamps) == [int(to_timestamp(d)) - int(to_timestamp(d)) % 3600 for d in dts]
+        assert {key: list(values) for key, values in counts.items()} == {
+            1: [1, 0, 2, 0],
+            2: [0, 0, 0, 1],
+            "foo": [0, 5, 0, 0],
+            1 + self.db.vnodes: [0, 0, 0, 7],
+        }
+
+        _, counts = self.db.get_range_series(
+            TSDBModel.project, keys, dts[0], dts[-1], environment_ids=[1]
+        )
+        assert list(counts[2]) == [0, 0, 0, 1]
+        assert list(counts[1]) == [0, 0, 0, 0]
+
     def test_simple(self):
         now = datetime.utcnow().replace(tzinfo=pytz.UTC) - timedelta(hours=4)
         dts = [now + timedelta(hours=i) for i in range(4)]
@@ -326,6 +352,43 @@ class RedisTSDBTest(TestCase):
         )
         assert results == {1: 0, 2: 0}
 
+    def test_distinct_counts_union_across_hosts(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+        model = TSDBModel.users_affected_by_group
+        router = self.db.cluster.get_router()
+
+        keys = list(range(1, 20))
+        assert len({router.get_host_for_key(key) for key in keys}) > 1
+
+        for key in keys:
+            self.db.record(model, key, (f"user-{key}", "shared"), now)
+
+        start = now - timedelta(hours=1)
+        assert self.db.get_distinct_counts_union(model, keys, start, now, rollup=3600) == 20
+        assert self.db.get_distinct_counts_union(model, keys[:1], start, now, rollup=3600) == 2
+
+        # no temporary keys are left behind
+        with self.db.cluster.all() as client:
+            results = client.keys(f"{self.db.prefix}*")
+        assert all(
+            key.decode("utf-8").startswith(f"{self.db.prefix}{model.value}:")
+            for host_keys in results.value.values()
+            for key in host_keys
+        )
+
+    def test_distinct_counts_union_cache(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+        model = TSDBModel.users_affected_by_group
+        start = now - timedelta(hours=1)
+        self.db.union_cache_ttl = 60
+
+        self.db.record(model, 1, ("foo", "bar"), now)
+        assert self.db.get_distinct_counts_union(model, [1, 2], start, now, rollup=3600) == 2
+
+        self.db.record(model, 2, ("baz",), now)
+        assert self.db.get_distinct_counts_union(model, [1, 2], start, now, rollup=3600) == 2
+        assert self.db.get_distinct_counts_union(model, [2], start, now, rollup=3600) == 1
+
     def test_frequency_tables(self):
         now = datetime.utcnow().replace(tzinfo=pytz.UTC)
         model = TSDBModel.frequent_issues_by_project
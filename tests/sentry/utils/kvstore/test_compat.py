@@ -33,3 +33,18 @@ def test_redis_cache_compat() -> None:
     cache_backend.delete("key")
     assert cache_backend.get("key") is None
     assert redis_backend.get("key") is None
+
+
+def test_redis_cache_raw_compat() -> None:
+    redis = Redis(db=6)
+    cache = CommonRedisCache(redis, version=5, prefix="test")
+
+    cache_backend = CacheKVStorage(cache)
+    raw_backend = CacheKVStorage(cache, raw=True)
+
+    raw_backend.set("key", b'{"foo":[1,2,3]}')
+    assert cache_backend.get("key") == {"foo": [1, 2, 3]}
+    assert raw_backend.get("key") == b'{"foo":[1,2,3]}'
+
+    cache_backend.delete("key")
+    assert raw_backend.get("key") is None
@@ -1,4 +1,5 @@
 import pytest
+import zstandard
 
 from sentry.utils.codecs import BytesCodec, JSONCodec, ZlibCodec, ZstdCodec
 
@@ -22,3 +23,14 @@ def test_codec_chaining() -> None:
 
     assert codec.encode([1, 2, 3]) == b"[1,2,3]"
     assert codec.decode(b"[1,2,3]") == [1, 2, 3]
+
+
+def test_zstd_codec_dictionary() -> None:
+    samples = [b'{"sdk":{"name":"sentry.python","version":"1.%d.0"}}' % i for i in range(500)]
+    dictionary = zstandard.train_dictionary(1024, samples)
+    codec = ZstdCodec(dictionary)
+
+    encoded = codec.encode(samples[0])
+    assert zstandard.get_frame_parameters(encoded).dict_id == dictionary.dict_id()
+    assert len(encoded) < len(ZstdCodec().encode(samples[0]))
+    assert codec.decode(encoded) == samples[0]
@@ -4,15 +4,27 @@ from unittest import mock
 
 import pytest
 import pytz
+from django.core.cache import cache
 from django.utils import timezone
+from redis.exceptions import RedisError
+from snuba_sdk import Column, Condition, Entity, Op, Query, Request
 
 from sentry.models import GroupRelease, Project, Release
 from sentry.testutils import TestCase
+from sentry.testutils.helpers import override_options
+from sentry.utils import json
 from sentry.utils.snuba import (
+    CachePolicy,
     Dataset,
     SnubaQueryParams,
     UnqualifiedQueryError,
+    _apply_cache_and_build_results,
+    _get_lease_key,
+    _get_result_cache_key,
+    _get_single_flight_client,
     _prepare_query_params,
+    _round_query_times,
+    get_cache_key,
     get_json_type,
     get_query_params_to_update_for_projects,
     get_snuba_column_name,
@@ -374,3 +386,194 @@ class QuantizeTimeTest(unittest.TestCase):
                 break
 
         assert i != j
+
+
+class SingleFlightTest(TestCase):
+    def setUp(self):
+        self.query = {"dataset": "events", "selected_columns": ["id"], "project": [self.project.id]}
+        self.cache_key = get_cache_key(self.query)
+        self.result = {"data": [{"id": "a"}]}
+        self.client = _get_single_flight_client()
+        self.client.delete(_get_lease_key(self.cache_key))
+        cache.delete(self.cache_key)
+
+    def run_query(self, timeout=5.0):
+        with override_options(
+            {"snuba.single-flight.enabled": True, "snuba.single-flight.timeout": timeout}
+        ):
+            return _apply_cache_and_build_results(
+                [(self.query, lambda x: x, lambda x: x)], use_cache=True
+            )
+
+    @mock.patch("sentry.utils.snuba._bulk_snuba_query")
+    def test_runs_leased_query(self, bulk_snuba_query):
+        bulk_snuba_query.return_value = [self.result]
+
+        assert self.run_query() == [self.result]
+        assert bulk_snuba_query.call_count == 1
+        assert json.loads(cache.get(self.cache_key)) == self.result
+        assert not self.client.exists(_get_lease_key(self.cache_key))
+
+    @mock.patch("sentry.utils.snuba.time.sleep")
+    @mock.patch("sentry.utils.snuba._bulk_snuba_query")
+    def test_waits_for_result(self, bulk_snuba_query, sleep):
+        self.client.set(_get_lease_key(self.cache_key), 1)
+        # The worker holding the lease stores the result while this one waits.
+        sleep.side_effect = lambda _: cache.set(self.cache_key, json.dumps(self.result))
+
+        assert self.run_query() == [self.result]
+        assert sleep.call_count == 1
+        assert not bulk_snuba_query.called
+
+    @mock.patch("sentry.utils.snuba.time.sleep")
+    @mock.patch("sentry.utils.snuba._bulk_snuba_query")
+    def test_runs_query_when_lease_released(self, bulk_snuba_query, sleep):
+        bulk_snuba_query.return_value = [self.result]
+        self.client.set(_get_lease_key(self.cache_key), 1)
+        # The worker holding the lease failed to run the query.
+        sleep.side_effect = lambda _: self.client.delete(_get_lease_key(self.cache_key))
+
+        assert self.run_query() == [self.result]
+        assert bulk_snuba_query.call_count == 1
+
+    @mock.patch("sentry.utils.snuba._bulk_snuba_query")
+    def test_runs_query_after_timeout(self, bulk_snuba_query):
+        bulk_snuba_query.return_value = [self.result]
+        self.client.set(_get_lease_key(self.cache_key), 1)
+
+        assert self.run_query(timeout=0.0) == [self.result]
+        assert bulk_snuba_query.call_count == 1
+
+    @mock.patch("sentry.utils.snuba._bulk_snuba_query")
+    def test_keeps_lease_of_other_worker(self, bulk_snuba_query):
+        lease_key = _get_lease_key(self.cache_key)
+
+        def run_query(*args):
+            # The lease of this worker expired and another worker took it.
+            self.client.set(lease_key, "other")
+            return [self.result]
+
+        bulk_snuba_query.side_effect = run_query
+
+        assert self.run_query() == [self.result]
+        assert self.client.get(lease_key) == "other"
+
+    @mock.patch("sentry.utils.snuba._get_single_flight_client")
+    @mock.patch("sentry.utils.snuba._bulk_snuba_query")
+    def test_runs_query_without_redis(self, bulk_snuba_query, get_single_flight_client):
+        bulk_snuba_query.return_value = [self.result]
+        get_single_flight_client.return_value.pipeline.side_effect = RedisError()
+
+        assert self.run_query() == [self.result]
+        assert bulk_snuba_query.call_count == 1
+
+
+class ReferrerCachePolicyTest(TestCase):
+    referrer = "api.dashboards.tablewidget"
+
+    def setUp(self):
+        self.query = {"dataset": "events", "selected_columns": ["id"], "project": [self.project.id]}
+        self.policy = CachePolicy(soft_ttl=60, hard_ttl=300, time_bucket=60)
+        self.cache_key = _get_result_cache_key(self.query, self.policy)
+        self.result = {"data": [{"id": "a"}]}
+        cache.delete(self.cache_key)
+        cache.delete(f"{self.cache_key}:refresh")
+
+    def run_query(self):
+        with override_options({"snuba.referrer-cache-policies.enabled": True}):
+            return _apply_cache_and_build_results(
+                [(self.query, lambda x: x, lambda x: x)], referrer=self.referrer
+            )
+
+    def cache_result(self, result, age):
+        cached_at = datetime.now().timestamp() - age
+        cache.set(self.cache_key, json.dumps({"cached_at": cached_at, "result": result}))
+
+    @mock.patch("sentry.utils.snuba._bulk_snuba_query")
+    def test_caches_result(self, bulk_snuba_query):
+        bulk_snuba_query.return_value = [self.result]
+
+        assert self.run_query() == [self.result]
+        assert self.run_query() == [self.result]
+        assert bulk_snuba_query.call_count == 1
+
+    @mock.patch("sentry.utils.snuba._cache_refresh_pool")
+    @mock.patch("sentry.utils.snuba._bulk_snuba_query")
+    def test_fresh_result(self, bulk_snuba_query, refresh_pool):
+        self.cache_result(self.result, age=10)
+
+        assert self.run_query() == [self.result]
+        assert not bulk_snuba_query.called
+        assert not refresh_pool.submit.called
+
+    @mock.patch("sentry.utils.snuba._cache_refresh_pool")
+    @mock.patch("sentry.utils.snuba._bulk_snuba_query")
+    def test_stale_result(self, bulk_snuba_query, refresh_pool):
+        bulk_snuba_query.return_value = [{"data": [{"id": "b"}]}]
+        self.cache_result(self.result, age=120)
+
+        assert self.run_query() == [self.result]
+        assert not bulk_snuba_query.called
+        assert refresh_pool.submit.call_count == 1
+
+        # The refresh is only submitted once while the result is stale.
+        assert self.run_query() == [self.result]
+        assert refresh_pool.submit.call_count == 1
+
+        refresh_pool.submit.call_args[0][0]()
+        assert bulk_snuba_query.call_count == 1
+        assert json.loads(cache.get(self.cache_key))["result"] == {"data": [{"id": "b"}]}
+
+    @mock.patch("sentry.utils.snuba._bulk_snuba_query")
+    def test_disabled(self, bulk_snuba_query):
+        bulk_snuba_query.return_value = [self.result]
+        self.cache_result({"data": []}, age=10)
+
+        assert _apply_cache_and_build_results(
+            [(self.query, lambda x: x, lambda x: x)], referrer=self.referrer
+        ) == [self.result]
+        assert bulk_snuba_query.call_count == 1
+
+    def test_round_query_times(self):
+        query = {
+            **self.query,
+            "from_date": "2023-05-01T11:02:13.512000+00:00",
+            "to_date": "2023-05-01T12:02:59+00:00",
+        }
+        rounded, _, _ = _round_query_times((query, None, None), 60)
+        assert rounded["from_date"] == "2023-05-01T11:02:00+00:00"
+        assert rounded["to_date"] == "2023-05-01T12:03:00+00:00"
+
+        rounded, _, _ = _round_query_times((query, None, None), 300)
+        assert rounded["from_date"] == "2023-05-01T11:00:00+00:00"
+        assert rounded["to_date"] == "2023-05-01T12:05:00+00:00"
+
+    def test_round_snql_query_times(self):
+        def at(minute, second=0):
+            return datetime(2023, 5, 1, 12, minute, second, tzinfo=pytz.UTC)
+
+        timestamp = Column("timestamp")
+        request = Request(
+            dataset="events",
+            app_id="default",
+            query=Query(Entity("events")).set_where(
+                [
+                    # Conditions of the search query keep their value.
+                    Condition(timestamp, Op.GT, at(1, 13)),
+                    Condition(timestamp, Op.GTE, at(1, 14)),
+                    Condition(timestamp, Op.GTE, at(0, 13)),
+                    Condition(timestamp, Op.LT, at(2, 13)),
+                    Condition(Column("project_id"), Op.IN, [self.project.id]),
+                ]
+            ),
+        )
+
+        rounded, _, _ = _round_query_times((request, None, None), 60)
+        assert rounded.query.where == [
+            Condition(timestamp, Op.GT, at(1, 13)),
+            Condition(timestamp, Op.GTE, at(1, 14)),
+            Condition(timestamp, Op.GTE, at(0)),
+            Condition(timestamp, Op.LT, at(3)),
+            Condition(Column("project_id"), Op.IN, [self.project.id]),
+        ]
+        assert request.query.where[2] == Condition(timestamp, Op.GTE, at(0, 13))
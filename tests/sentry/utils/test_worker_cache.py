@@ -0,0 +1,79 @@
+from unittest.mock import Mock, patch
+
+from sentry.models import ProjectOwnership
+from sentry.testutils import TestCase
+from sentry.utils.cache import cache
+from sentry.utils.worker_cache import VERSION_CHECK_INTERVAL, WorkerCache, post_process_cache
+
+
+class WorkerCacheTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.worker_cache = WorkerCache("test")
+        self.scope = ("project", self.project.id)
+
+    def test_disabled(self):
+        fetch = Mock(return_value=[1])
+        assert self.worker_cache.get(self.scope, "key", fetch) == [1]
+        with self.worker_cache.enabled(ttl=0):
+            assert self.worker_cache.get(self.scope, "key", fetch) == [1]
+        assert fetch.call_count == 2
+
+    def test_hit(self):
+        fetch = Mock(return_value=[1])
+        with self.worker_cache.enabled(ttl=60):
+            first = self.worker_cache.get(self.scope, "key", fetch)
+            second = self.worker_cache.get(self.scope, "key", fetch)
+
+        assert first == second == [1]
+        # Values are handed out as copies.
+        assert first is not second
+        assert fetch.call_count == 1
+
+    def test_keys(self):
+        with self.worker_cache.enabled(ttl=60), patch(
+            "sentry.utils.worker_cache.metrics.incr"
+        ) as incr:
+            assert self.worker_cache.get(self.scope, "lookup", lambda: 1, key="1") == 1
+            assert self.worker_cache.get(self.scope, "lookup", lambda: 2, key="2") == 2
+            assert self.worker_cache.get(self.scope, "lookup", lambda: 3, key="1") == 1
+
+        assert [call.kwargs["tags"] for call in incr.call_args_list] == [
+            {"cache": "test", "key": "lookup", "result": "miss"},
+            {"cache": "test", "key": "lookup", "result": "miss"},
+            {"cache": "test", "key": "lookup", "result": "hit"},
+        ]
+
+    def test_expiry(self):
+        fetch = Mock(return_value=[1])
+        with self.worker_cache.enabled(ttl=60), patch(
+            "sentry.utils.worker_cache.time.monotonic", return_value=1000
+        ) as monotonic:
+            self.worker_cache.get(self.scope, "key", fetch)
+            monotonic.return_value += 61
+            self.worker_cache.get(self.scope, "key", fetch)
+
+        assert fetch.call_count == 2
+
+    def test_shared_version(self):
+        fetch = Mock(return_value=[1])
+        with self.worker_cache.enabled(ttl=60), patch(
+            "sentry.utils.worker_cache.time.monotonic", return_value=1000
+        ) as monotonic:
+            self.worker_cache.get(self.scope, "key", fetch)
+
+            # Another process invalidates the scope.
+            cache.set(f"worker-cache:test:project:{self.project.id}", "other", 60)
+            self.worker_cache.get(self.scope, "key", fetch)
+            assert fetch.call_count == 1
+
+            monotonic.return_value += VERSION_CHECK_INTERVAL
+            self.worker_cache.get(self.scope, "key", fetch)
+            assert fetch.call_count == 2
+
+    def test_invalidated_on_save(self):
+        post_process_cache.clear()
+        with post_process_cache.enabled(ttl=60):
+            assert ProjectOwnership.get_ownership_cached(self.project.id) is None
+            ownership = ProjectOwnership.objects.create(project_id=self.project.id)
+            assert ProjectOwnership.get_ownership_cached(self.project.id) == ownership